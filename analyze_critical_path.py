@@ -0,0 +1,508 @@
+# Critical Request Chain and Load-Time Estimator Script
+# This script requires Python and Pillow library
+# Install with: pip install Pillow
+
+import os
+import re
+import sys
+import json
+import argparse
+from urllib.parse import urlparse
+
+from PIL import Image
+
+from audit_performance import (find_pages, parse_page, resolve_url, is_render_blocking,
+                               transfer_sizes, write_json_report)
+
+"""
+Builds the critical request chain of every HTML page and estimates First
+Contentful Paint (FCP) and Largest Contentful Paint (LCP) from the local file
+sizes under configurable network profiles.
+
+The chain shows which stylesheets in <head> block rendering, which scripts
+are parser-blocking (no defer/async), and which stylesheets pull in further
+files through @import or url(). The likely LCP element is identified from
+the page's images, and preload / fetchpriority changes are recommended.
+
+The timing model is deliberately simple: every new origin costs DNS, TCP and
+TLS round-trips (unless preconnected), every request costs one round-trip,
+and resources discovered at the same time share the bandwidth.
+"""
+
+DEFAULT_REPORT_FILE = 'critical_path_report.json'
+
+# Network profiles: round-trip time in ms and downlink bandwidth in kbit/s
+NETWORK_PROFILES = {
+    'slow-4g': {'rtt_ms': 150, 'downlink_kbps': 1638.4},
+    'fast-3g': {'rtt_ms': 562.5, 'downlink_kbps': 1474.6},
+    'cable': {'rtt_ms': 28, 'downlink_kbps': 5000},
+}
+
+# Round-trips to open a connection to a new origin (DNS, TCP, TLS)
+CONNECTION_ROUND_TRIPS = 3
+
+# Assumed transfer size of third-party resources that are not available locally
+EXTERNAL_RESOURCE_BYTES = 20 * 1024
+
+# Images smaller than this rendered area are unlikely to be the LCP element
+MIN_LCP_IMAGE_AREA = 150 * 150
+
+# Only the first few images in document order are considered LCP candidates
+LCP_CANDIDATE_IMAGES = 4
+
+# More preconnects than this compete with the page's own connections
+MAX_PRECONNECTS = 4
+
+CSS_IMPORT_PATTERN = re.compile(r'@import\s+(?:url\(\s*)?[\'"]?([^\'")\s;]+)', re.IGNORECASE)
+CSS_URL_PATTERN = re.compile(r'url\(\s*[\'"]?([^\'")]+?)[\'"]?\s*\)', re.IGNORECASE)
+
+
+def css_dependencies(css_path):
+    """
+    List the files a stylesheet references
+
+    Returns:
+        list: (kind, url) tuples where kind is 'import' for @import rules
+              (render-blocking) and 'url' for other url() references
+    """
+    with open(css_path, 'r', encoding='utf-8', errors='replace') as f:
+        content = re.sub(r'/\*.*?\*/', '', f.read(), flags=re.DOTALL)
+
+    dependencies = []
+    imports = set()
+    for match in CSS_IMPORT_PATTERN.finditer(content):
+        imports.add(match.group(1))
+        dependencies.append(('import', match.group(1)))
+    for match in CSS_URL_PATTERN.finditer(content):
+        url = match.group(1).strip()
+        if url.startswith('data:') or url in imports:
+            continue
+        dependencies.append(('url', url))
+    return dependencies
+
+
+def image_dimensions(path):
+    """Intrinsic (width, height) of an image file, or None if it cannot be read"""
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def origin_of(url, default_origin='self'):
+    """Return scheme://host for an absolute URL, or default_origin for relative ones"""
+    parsed = urlparse(url)
+    if parsed.netloc:
+        return f"{parsed.scheme or 'https'}://{parsed.netloc}"
+    return default_origin
+
+
+def _node(url, page_path, site_dir, kind, **extra):
+    """Build a request-chain node with its transfer size"""
+    local_path, is_external = resolve_url(url, page_path, site_dir)
+    node = {'url': url, 'kind': kind, 'origin': origin_of(url) if is_external else 'self', 'children': []}
+    if local_path and os.path.isfile(local_path):
+        node['path'] = os.path.relpath(local_path, site_dir).replace('\\', '/')
+        node['bytes'] = transfer_sizes(local_path)['gzip']
+    else:
+        node['path'] = None
+        node['bytes'] = EXTERNAL_RESOURCE_BYTES if is_external else 0
+        node['missing'] = not is_external
+    node.update(extra)
+    return node
+
+
+def _css_chain(node, css_path, site_dir, visited):
+    """Attach the @import and url() children of a local stylesheet node"""
+    if css_path in visited:
+        return
+    visited.add(css_path)
+    for kind, url in css_dependencies(css_path):
+        child = _node(url, css_path, site_dir, 'stylesheet' if kind == 'import' else 'css-url',
+                      blocking=kind == 'import')
+        node['children'].append(child)
+        if kind == 'import' and child['path']:
+            _css_chain(child, os.path.join(site_dir, child['path']), site_dir, visited)
+
+
+def find_lcp_candidate(images, page_path, site_dir):
+    """
+    Pick the likely LCP image: the largest early, non-lazy image
+
+    Returns:
+        dict or None: The image resource with its rendered 'area', or None
+                      when the page's LCP element is most likely text
+    """
+    best = None
+    for resource in images[:LCP_CANDIDATE_IMAGES]:
+        if resource.get('loading') == 'lazy':
+            continue
+        local_path, _ = resolve_url(resource['url'], page_path, site_dir)
+        intrinsic = image_dimensions(local_path) if local_path and os.path.isfile(local_path) else None
+        try:
+            width = int(resource.get('width') or 0) or (intrinsic[0] if intrinsic else 0)
+            height = int(resource.get('height') or 0) or (intrinsic[1] if intrinsic else 0)
+        except ValueError:
+            continue
+        area = width * height
+        if area >= MIN_LCP_IMAGE_AREA and (best is None or area > best['area']):
+            best = dict(resource, area=area, rendered=(width, height), intrinsic=intrinsic)
+    return best
+
+
+def build_request_chain(page_path, site_dir):
+    """
+    Build the critical request chain of a page
+
+    Returns:
+        dict: The page node with 'children' (blocking stylesheets and scripts,
+              each with their own @import / url() children), the deferred
+              resources, preloads, preconnected origins and the LCP candidate
+    """
+    parser = parse_page(page_path)
+    page = _node(os.path.basename(page_path), page_path, site_dir, 'document')
+    page['path'] = os.path.relpath(page_path, site_dir).replace('\\', '/')
+
+    visited = set()
+    deferred = []
+    preloads = []
+    images = []
+
+    for resource in parser.resources:
+        kind = resource['kind']
+        if kind == 'stylesheet':
+            node = _node(resource['url'], page_path, site_dir, 'stylesheet',
+                         blocking=is_render_blocking(resource), in_head=resource['in_head'])
+            if node['path']:
+                _css_chain(node, os.path.join(site_dir, node['path']), site_dir, visited)
+            (page['children'] if node['blocking'] else deferred).append(node)
+        elif kind == 'script':
+            parser_blocking = not (resource['is_async'] or resource['defer'] or resource['module'])
+            node = _node(resource['url'], page_path, site_dir, 'script', blocking=parser_blocking and resource['in_head'],
+                         parser_blocking=parser_blocking, in_head=resource['in_head'], module=resource['module'])
+            (page['children'] if node['blocking'] else deferred).append(node)
+        elif kind == 'preload':
+            preloads.append(_node(resource['url'], page_path, site_dir, 'preload', as_type=resource.get('as_type', ''),
+                                  fetchpriority=resource.get('fetchpriority', '')))
+        elif kind == 'image':
+            images.append(resource)
+
+    lcp = find_lcp_candidate(images, page_path, site_dir)
+    if lcp is None:
+        # Background images in stylesheets are the remaining image candidates
+        for stylesheet in page['children']:
+            for child in stylesheet['children']:
+                if child['kind'] == 'css-url' and child['path'] and child['path'].lower().endswith(
+                        ('.png', '.jpg', '.jpeg', '.webp', '.avif')):
+                    intrinsic = image_dimensions(os.path.join(site_dir, child['path']))
+                    if intrinsic and intrinsic[0] * intrinsic[1] >= MIN_LCP_IMAGE_AREA:
+                        lcp = {'kind': 'css-background', 'url': child['url'], 'area': intrinsic[0] * intrinsic[1],
+                               'rendered': intrinsic, 'intrinsic': intrinsic, 'loading': '', 'fetchpriority': ''}
+                        break
+            if lcp:
+                break
+
+    if lcp:
+        lcp_node = _node(lcp['url'], page_path, site_dir, 'image', fetchpriority=lcp.get('fetchpriority', ''),
+                         loading=lcp.get('loading', ''), css_background=lcp['kind'] == 'css-background',
+                         rendered=lcp['rendered'], intrinsic=lcp['intrinsic'])
+        lcp_preloads = [p for p in preloads if p['path'] and p['path'] == lcp_node['path']]
+        lcp_node['preloaded'] = bool(lcp_preloads)
+        if any(p['fetchpriority'] == 'high' for p in lcp_preloads):
+            lcp_node['fetchpriority'] = 'high'
+    else:
+        lcp_node = None
+
+    preconnects = sorted({origin_of(url, default_origin=url) for url in parser.preconnects})
+    crossorigin = sorted({origin_of(url, default_origin=url) for url in parser.crossorigin_preconnects})
+
+    return {
+        'page': page,
+        'deferred': deferred,
+        'preloads': preloads,
+        'preconnects': preconnects,
+        'crossorigin_preconnects': crossorigin,
+        'images': images,
+        'lcp': lcp_node,
+    }
+
+
+def _flatten_blocking(nodes):
+    """Yield (depth, node) for blocking nodes; depth increases along @import chains"""
+    stack = [(1, node) for node in nodes]
+    while stack:
+        depth, node = stack.pop(0)
+        if node.get('blocking'):
+            yield depth, node
+            stack.extend((depth + 1, child) for child in node['children'] if child.get('blocking'))
+
+
+def estimate_timings(chain, profile):
+    """
+    Estimate FCP and LCP in milliseconds for one network profile
+
+    Returns:
+        dict: html_ms, fcp_ms, lcp_ms and the LCP image's discovery time
+    """
+    rtt = profile['rtt_ms']
+    bytes_per_ms = profile['downlink_kbps'] * 1000 / 8 / 1000
+    connected = {'self'} | set(chain['preconnects'])
+
+    # Document: connection setup, request round-trip, transfer
+    html_ms = CONNECTION_ROUND_TRIPS * rtt + rtt + chain['page']['bytes'] / bytes_per_ms
+
+    def request_ms(nodes):
+        """Time to fetch nodes discovered together (shared bandwidth)"""
+        if not nodes:
+            return 0.0
+        setup = max((CONNECTION_ROUND_TRIPS * rtt if node['origin'] not in connected else 0) for node in nodes)
+        return setup + rtt + sum(node['bytes'] for node in nodes) / bytes_per_ms
+
+    # Each @import level is discovered only after its parent stylesheet arrives
+    levels = {}
+    for depth, node in _flatten_blocking(chain['page']['children']):
+        levels.setdefault(depth, []).append(node)
+    fcp_ms = html_ms
+    for depth in sorted(levels):
+        fcp_ms += request_ms(levels[depth])
+        connected.update(node['origin'] for node in levels[depth])
+
+    lcp = chain['lcp']
+    if lcp is None:
+        return {'html_ms': round(html_ms), 'fcp_ms': round(fcp_ms), 'lcp_ms': round(fcp_ms), 'lcp_discovery_ms': None}
+
+    # When the LCP image is found: HTML preload scanner, after its stylesheet, or after layout for lazy images
+    if lcp['preloaded'] or (not lcp['css_background'] and lcp['loading'] != 'lazy'):
+        discovery_ms = html_ms
+    else:
+        discovery_ms = fcp_ms
+
+    # Without high priority the image shares bandwidth with everything requested at the same time
+    competing = 0
+    if lcp['fetchpriority'] != 'high' and discovery_ms == html_ms:
+        competing += sum(node['bytes'] for depth, node in _flatten_blocking(chain['page']['children']) if depth == 1)
+    competing += sum(node['bytes'] for node in chain['preloads']
+                     if node['path'] != lcp['path'] and node['as_type'] in ('script', 'style', 'font', 'image'))
+    image_ms = discovery_ms + request_ms([lcp]) + competing / bytes_per_ms
+    lcp_ms = max(fcp_ms, image_ms)
+
+    return {'html_ms': round(html_ms), 'fcp_ms': round(fcp_ms), 'lcp_ms': round(lcp_ms),
+            'lcp_discovery_ms': round(discovery_ms)}
+
+
+def recommendations(chain):
+    """Preload, fetchpriority and blocking-resource recommendations for a page"""
+    advice = []
+    lcp = chain['lcp']
+
+    if lcp:
+        name = lcp['path'] or lcp['url']
+        if lcp['loading'] == 'lazy':
+            advice.append(f"Remove loading=\"lazy\" from the LCP image {name}")
+        if lcp['css_background'] and not lcp['preloaded']:
+            advice.append(f"Preload the LCP background image {name} (<link rel=\"preload\" as=\"image\" fetchpriority=\"high\">)")
+        elif lcp['loading'] == 'lazy' and not lcp['preloaded']:
+            advice.append(f"Preload the LCP image {name} so it is fetched before layout")
+        if lcp['fetchpriority'] != 'high':
+            advice.append(f"Add fetchpriority=\"high\" to the LCP image {name}")
+        if lcp['rendered'] and lcp['intrinsic'] and lcp['intrinsic'][0] > 2 * lcp['rendered'][0]:
+            advice.append(f"LCP image {name} is {lcp['intrinsic'][0]}px wide but rendered at {lcp['rendered'][0]}px; serve a smaller variant")
+
+    for preload in chain['preloads']:
+        if lcp and preload['path'] and preload['path'] == lcp['path']:
+            continue
+        if preload['as_type'] == 'image':
+            advice.append(f"Drop the preload of {preload['path'] or preload['url']}: it is not the LCP image and competes with it")
+        elif preload['as_type'] == 'script':
+            advice.append(f"Drop the preload of {preload['path'] or preload['url']}: the script is not needed for first paint and competes with the LCP image")
+
+    for image in chain['images']:
+        if image.get('fetchpriority') == 'high' and (not lcp or image['url'] != lcp['url']):
+            advice.append(f"Remove fetchpriority=\"high\" from {image['url']}: only the LCP image should be high priority")
+
+    for node in chain['page']['children'] + chain['deferred']:
+        if node['kind'] == 'script' and node.get('parser_blocking'):
+            advice.append(f"Add defer to {node['path'] or node['url']}: it blocks HTML parsing")
+        for child in node['children']:
+            if child['kind'] == 'stylesheet' and child.get('blocking'):
+                advice.append(f"Inline or <link> {child['path'] or child['url']} instead of @import in {node['path'] or node['url']}: it adds a round-trip before first paint")
+
+    blocking_origins = {node['origin'] for depth, node in _flatten_blocking(chain['page']['children'])} - {'self'}
+    for origin in sorted(blocking_origins - set(chain['preconnects'])):
+        advice.append(f"Add <link rel=\"preconnect\" href=\"{origin}\">: render-blocking resources load from it")
+
+    # Preserve order, drop duplicates
+    return list(dict.fromkeys(advice))
+
+
+def derive_resource_hints(page_path, site_dir, early_hints=False):
+    """
+    Derive preconnect, preload and modulepreload hints from a page's request chain
+
+    Args:
+        page_path (str): HTML page
+        site_dir (str): Website root directory
+        early_hints (bool): Also preload stylesheets linked directly in the page.
+                            They are already discovered with the HTML, so this only
+                            pays off when the hints arrive before it (103 Early Hints).
+
+    Returns:
+        list: Hint dicts with 'rel', 'href' (site-root relative for local files)
+              and optional 'as', 'fetchpriority' and 'crossorigin'
+    """
+    chain = build_request_chain(page_path, site_dir)
+
+    def href(node):
+        return '/' + node['path'] if node['path'] else node['url']
+
+    # Origins the page actually fetches from, render-blocking ones first
+    origins = []
+    blocking = [node for depth, node in _flatten_blocking(chain['page']['children'])]
+    for node in blocking + ([chain['lcp']] if chain['lcp'] else []) + chain['deferred']:
+        if node['origin'] != 'self' and node['origin'] not in origins:
+            origins.append(node['origin'])
+    # Declared preconnects without a direct resource (e.g. font files requested by a font stylesheet)
+    for origin in chain['preconnects']:
+        if origin.startswith('http') and origin not in origins:
+            origins.append(origin)
+
+    hints = [{'rel': 'preconnect', 'href': origin, 'crossorigin': origin in chain['crossorigin_preconnects']}
+             for origin in origins[:MAX_PRECONNECTS]]
+
+    lcp = chain['lcp']
+    if lcp and (lcp['path'] or lcp['origin'] != 'self'):
+        hints.append({'rel': 'preload', 'href': href(lcp), 'as': 'image', 'fetchpriority': 'high'})
+
+    for depth, node in _flatten_blocking(chain['page']['children']):
+        if node['kind'] == 'stylesheet' and node['path'] and (depth > 1 or early_hints):
+            hints.append({'rel': 'preload', 'href': href(node), 'as': 'style'})
+
+    for node in chain['page']['children'] + chain['deferred']:
+        if node['kind'] == 'script' and node.get('module') and node['path']:
+            hints.append({'rel': 'modulepreload', 'href': href(node)})
+
+    return hints
+
+
+def format_link_tag(hint, base_url=''):
+    """Render a hint as an HTML <link> tag; base_url is prefixed to local paths"""
+    url = hint['href'] if hint['href'].startswith('http') else base_url + hint['href']
+    tag = f'<link rel="{hint["rel"]}" href="{url}"'
+    if hint.get('as'):
+        tag += f' as="{hint["as"]}"'
+    if hint.get('fetchpriority'):
+        tag += f' fetchpriority="{hint["fetchpriority"]}"'
+    if hint.get('crossorigin'):
+        tag += ' crossorigin'
+    return tag + '>'
+
+
+def format_link_header(hint):
+    """Render a hint as a value for an HTTP Link header"""
+    value = f'<{hint["href"]}>; rel={hint["rel"]}'
+    if hint.get('as'):
+        value += f'; as={hint["as"]}'
+    if hint.get('fetchpriority'):
+        value += f'; fetchpriority={hint["fetchpriority"]}'
+    if hint.get('crossorigin'):
+        value += '; crossorigin'
+    return value
+
+
+def analyze_page(page_path, site_dir, profiles=None):
+    """
+    Analyze one page: request chain, timing estimates and recommendations
+
+    Args:
+        page_path (str): HTML page
+        site_dir (str): Website root directory
+        profiles (dict): Network profiles (default: NETWORK_PROFILES)
+
+    Returns:
+        dict: page, blocking resources, chain, LCP element, estimates per profile, recommendations
+    """
+    profiles = profiles or NETWORK_PROFILES
+    chain = build_request_chain(page_path, site_dir)
+
+    blocking = [{'resource': node['path'] or node['url'], 'kind': node['kind'], 'depth': depth}
+                for depth, node in _flatten_blocking(chain['page']['children'])]
+    parser_blocking = [node['path'] or node['url'] for node in chain['page']['children'] + chain['deferred']
+                       if node['kind'] == 'script' and node.get('parser_blocking')]
+
+    lcp = chain['lcp']
+    return {
+        'page': chain['page']['path'],
+        'render_blocking': blocking,
+        'parser_blocking_scripts': parser_blocking,
+        'chain': chain['page']['children'],
+        'lcp_element': ({'type': 'css-background' if lcp['css_background'] else 'image',
+                         'resource': lcp['path'] or lcp['url'], 'bytes': lcp['bytes']} if lcp else {'type': 'text'}),
+        'preconnects': chain['preconnects'],
+        'estimates': {name: estimate_timings(chain, profile) for name, profile in profiles.items()},
+        'recommendations': recommendations(chain),
+    }
+
+
+def print_chain(nodes, indent=2):
+    """Print a request chain as an indented tree"""
+    for node in nodes:
+        flags = []
+        if node.get('blocking'):
+            flags.append('blocking')
+        if node.get('missing'):
+            flags.append('missing')
+        label = node['path'] or node['url']
+        print(f"{' ' * indent}└─ {label} ({node['bytes']/1024:.1f}KB{', ' + ', '.join(flags) if flags else ''})")
+        print_chain(node['children'], indent + 3)
+
+
+def analyze_site(site_dir, profiles=None, report_path=None):
+    """
+    Analyze the critical request chain of every page and write a JSON report
+
+    Returns:
+        list: Per-page analysis results
+    """
+    report_path = report_path or os.path.join(site_dir, DEFAULT_REPORT_FILE)
+    results = []
+
+    for page_path in find_pages(site_dir):
+        result = analyze_page(page_path, site_dir, profiles)
+        results.append(result)
+
+        print(f"\n{result['page']}")
+        print_chain(result['chain'])
+        lcp = result['lcp_element']
+        print(f"  LCP element: {lcp.get('resource', 'text')}" + (f" ({lcp['type']})" if lcp['type'] != 'text' else ''))
+        for name, estimate in result['estimates'].items():
+            print(f"  {name}: FCP ~{estimate['fcp_ms']/1000:.2f}s, LCP ~{estimate['lcp_ms']/1000:.2f}s")
+        for advice in result['recommendations']:
+            print(f"  → {advice}")
+
+    write_json_report(report_path, {'profiles': profiles or NETWORK_PROFILES, 'pages': results})
+    print(f"\nCritical path report written to: {report_path}")
+    return results
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Critical request chain and FCP/LCP estimates for each page")
+    arg_parser.add_argument('site_dir', nargs='?', default='.', help="Website root directory (default: current directory)")
+    arg_parser.add_argument('--profiles', help="JSON file with network profiles: {name: {rtt_ms, downlink_kbps}}")
+    arg_parser.add_argument('--rtt', type=float, help="Round-trip time in ms for a custom profile")
+    arg_parser.add_argument('--bandwidth', type=float, help="Downlink in kbit/s for a custom profile")
+    arg_parser.add_argument('--report', help=f"JSON report path (default: <site_dir>/{DEFAULT_REPORT_FILE})")
+    args = arg_parser.parse_args()
+
+    if not os.path.isdir(args.site_dir):
+        print(f"Error: '{args.site_dir}' is not a valid directory.")
+        sys.exit(2)
+
+    selected_profiles = None
+    if args.profiles:
+        with open(args.profiles, 'r', encoding='utf-8') as f:
+            selected_profiles = json.load(f)
+    if args.rtt is not None and args.bandwidth is not None:
+        selected_profiles = dict(selected_profiles or {}, custom={'rtt_ms': args.rtt, 'downlink_kbps': args.bandwidth})
+
+    analyze_site(args.site_dir, selected_profiles, args.report)
@@ -0,0 +1,202 @@
+# Animated WebP Conversion Script
+# This script requires Python, Pillow and NumPy
+# Install with: pip install Pillow numpy
+
+import io
+import os
+
+import numpy as np
+from PIL import Image, ImageFile
+
+from atomic_output import atomic_write
+from image_server import fit_image
+
+"""
+Converts animated GIF and APNG files to animated WebP with all frames and
+their timing.
+
+Frames are decoded one at a time and compared with the previous output
+frame using NumPy:
+
+- a frame in which no pixel differs by more than NEAR_IDENTICAL_DIFF (out of
+  255) from the previous one is a duplicate. It is merged into the previous
+  frame by adding its duration, so the animation's timing is unchanged;
+- in the other frames, pixels within that difference are set to exactly the
+  previous frame's values. Only the changed region then differs between
+  frames, and libwebp stores each frame as a sub-frame cropped to that
+  region instead of the whole canvas.
+
+Pillow's animated WebP encoder takes the frames through append_images and
+asks for them in order, so they are produced lazily while it encodes:
+besides the encoder itself, at most three frames (previous, current and the
+one being merged into) are held in memory, however long the animation is.
+Each frame is encoded lossy or lossless, whichever is smaller
+(allow_mixed).
+"""
+
+# Bump when the frame processing or encoder settings change so cached encodes are not reused
+ANIMATION_VERSION = 1
+
+# Formats that can hold an animation
+ANIMATED_EXTENSIONS = ('.gif', '.png')
+
+# Largest per-channel difference (0-255) between frames that counts as unchanged
+NEAR_IDENTICAL_DIFF = 3
+
+# Duration of frames that do not declare one, in milliseconds (what browsers use for GIFs)
+DEFAULT_FRAME_DURATION = 100
+
+# libwebp effort (0-6); animations have many frames, so a middle setting
+ANIMATION_METHOD = 4
+
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+
+def is_animated(path):
+    """Whether an image file has more than one frame (animated GIF or APNG)"""
+    try:
+        with Image.open(path) as img:
+            return bool(getattr(img, 'is_animated', False))
+    except Exception:
+        return False
+
+
+def output_frames(img, resize=None, threshold=NEAR_IDENTICAL_DIFF):
+    """
+    Decode the frames of an animation, merging duplicates and keeping unchanged pixels exact
+
+    Args:
+        img (PIL.Image): Opened animated image
+        resize (tuple): Optional (width, height) box to fit every frame into
+        threshold (int): Largest per-channel difference that counts as unchanged
+
+    Yields:
+        tuple: (RGBA pixel array, duration in ms, changed box (left, top, right, bottom), frames merged into it)
+    """
+    pending = None
+    for index in range(getattr(img, 'n_frames', 1)):
+        img.seek(index)
+        duration = img.info.get('duration')
+        duration = DEFAULT_FRAME_DURATION if duration is None else duration
+        frame = img.convert('RGBA')
+        if resize:
+            frame = fit_image(frame, resize)
+        elif frame.width > 1920:
+            frame = fit_image(frame)
+        pixels = np.array(frame, dtype=np.uint8)
+
+        if pending is None:
+            box = (0, 0, pixels.shape[1], pixels.shape[0])
+        else:
+            previous = pending[0]
+            changed = (np.abs(pixels.astype(np.int16) - previous.astype(np.int16)) > threshold).any(axis=2)
+            if not changed.any():
+                pending[1] += duration
+                pending[3] += 1
+                continue
+            pixels = np.where(changed[..., None], pixels, previous)
+            rows = np.flatnonzero(changed.any(axis=1))
+            columns = np.flatnonzero(changed.any(axis=0))
+            box = (int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1)
+            yield tuple(pending)
+
+        pending = [pixels, duration, box, 0]
+
+    if pending is not None:
+        yield tuple(pending)
+
+
+class _FrameStream:
+    """
+    Output frames after the first, handed to Pillow's encoder as one multi-frame image
+
+    The encoder seeks the frames in order, and each is only created when it is asked for.
+    """
+
+    def __init__(self, frames, count):
+        self._frames = frames
+        self._frame = None
+        self.n_frames = count
+
+    def seek(self, index):
+        self._frame = Image.fromarray(next(self._frames)[0], 'RGBA')
+
+    def __getattr__(self, name):
+        return getattr(self._frame, name)
+
+
+def encode_animation(path, quality=85, resize=None):
+    """
+    Encode an animated GIF or APNG as animated WebP
+
+    The frames are decoded twice: a first pass finds the output frames and
+    their durations, and the second streams them into the encoder.
+
+    Args:
+        path (str): Animated image
+        quality (int): Quality for lossy frames (0-100)
+        resize (tuple): Optional (width, height) box to fit the animation into
+
+    Returns:
+        tuple: (WebP bytes, decision dict in the format of encoder_selection.encode_webp with
+                frame counts, merged frames and the average changed area)
+    """
+    durations = []
+    changed_area = 0.0
+    has_alpha = False
+    with Image.open(path) as img:
+        source_frames = img.n_frames
+        loop = img.info.get('loop', 1)
+        for pixels, duration, box, _ in output_frames(img, resize):
+            durations.append(duration)
+            changed_area += (box[2] - box[0]) * (box[3] - box[1]) / (pixels.shape[0] * pixels.shape[1])
+            has_alpha = has_alpha or bool((pixels[..., 3] < 255).any())
+
+    params = {'lossless': False, 'allow_mixed': True, 'quality': quality, 'alpha_quality': 100,
+              'method': ANIMATION_METHOD}
+    with Image.open(path) as img:
+        frames = output_frames(img, resize)
+        first = Image.fromarray(next(frames)[0], 'RGBA')
+        rest = [_FrameStream(frames, len(durations) - 1)] if len(durations) > 1 else []
+        buffer = io.BytesIO()
+        first.save(buffer, format='WEBP', save_all=True, append_images=rest, duration=durations,
+                   loop=loop, **params)
+
+    merged = source_frames - len(durations)
+    average_area = changed_area / len(durations)
+    decision = {
+        'mode': 'animated',
+        'reason': f"{source_frames} frames, {merged} duplicates merged, "
+                  f"frames change {average_area * 100:.0f}% of the canvas on average",
+        'params': params,
+        'drop_alpha': False,
+        'stats': {'has_alpha': has_alpha},
+        'frames': len(durations),
+        'source_frames': source_frames,
+        'merged_frames': merged,
+        'changed_area': round(average_area, 3),
+    }
+    return buffer.getvalue(), decision
+
+
+if __name__ == "__main__":
+    print("Animated WebP Conversion")
+    print("========================")
+
+    path = input("Enter animated GIF or PNG path: ").strip()
+
+    if not os.path.isfile(path):
+        print(f"Error: '{path}' is not a file.")
+    elif not is_animated(path):
+        print(f"{path} is not animated; convert_to_webp.py converts still images.")
+    else:
+        quality = int(input("Enter quality (0-100, default 85): ") or "85")
+        data, result = encode_animation(path, quality)
+        output_path = os.path.splitext(path)[0] + '.webp'
+        atomic_write(output_path, data)
+        before = os.path.getsize(path)
+        print(f"\n{result['reason']}")
+        print(f"Frames: {result['source_frames']} -> {result['frames']}")
+        print(f"Size: {before/1024:.1f}KB -> {len(data)/1024:.1f}KB "
+              f"({(1 - len(data) / before) * 100:.1f}% reduction, {(before - len(data))/1024:.1f}KB saved)")
+        print(f"Saved: {output_path}")
@@ -0,0 +1,224 @@
+# Shared Artifact Cache
+# This module only requires Python
+
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+from contextlib import closing
+
+"""
+Content-addressed cache for optimization outputs (WebP images, minified
+CSS/JS, precompressed files), shared by every checkout and branch of a site.
+
+Entries are keyed by the SHA-256 of the source bytes together with the
+encoder parameters, so identical inputs are encoded only once no matter
+where they live. Hits are hardlinked (or copied across filesystems) into
+place. The cache has a size cap with least-recently-used eviction; its
+index is an SQLite database, so several processes can use the same cache
+directory at the same time.
+
+Configuration:
+    ALFAX10_CACHE_DIR     Cache directory (default: ~/.cache/alfax10); "off" disables the cache
+    ALFAX10_CACHE_MAX_MB  Size cap in megabytes (default: 2048)
+"""
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'alfax10')
+DEFAULT_MAX_BYTES = 2048 * 1024 * 1024
+
+_default_cache = None
+
+
+def hash_bytes(data):
+    """SHA-256 hex digest of a bytes object"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    """SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """
+    Content-addressed artifact store with LRU eviction
+
+    Args:
+        cache_dir (str): Directory holding the objects and the index database
+        max_bytes (int): Total size of cached objects before LRU eviction starts
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+        self.temp_dir = os.path.join(self.cache_dir, 'tmp')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+        with closing(self._connect()) as db, db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                       'key TEXT PRIMARY KEY, size INTEGER NOT NULL, '
+                       'created REAL NOT NULL, last_access REAL NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+
+    def _connect(self):
+        """Open the index database (waits for other processes' write locks)"""
+        return sqlite3.connect(os.path.join(self.cache_dir, 'index.sqlite'), timeout=60)
+
+    def _object_path(self, key):
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    def key(self, source_hash, stage, params=None):
+        """
+        Build a cache key from the source content hash, the stage and its parameters
+
+        Args:
+            source_hash (str): SHA-256 of the source bytes (see hash_file/hash_bytes)
+            stage (str): Producing stage, e.g. 'webp', 'minify-css', 'gzip'
+            params (dict): Encoder parameters that influence the output
+        """
+        description = json.dumps({'source': source_hash, 'stage': stage, 'params': params or {}}, sort_keys=True)
+        return hash_bytes(description.encode('utf-8'))
+
+    def fetch(self, key, dest_path):
+        """
+        Place a cached artifact at dest_path
+
+        Returns:
+            bool: True on a cache hit, False if the key is not cached
+        """
+        object_path = self._object_path(key)
+        temp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            try:
+                os.link(object_path, temp_path)
+            except FileNotFoundError:
+                self.misses += 1
+                return False
+            except OSError:
+                # Different filesystem or no hardlink support
+                shutil.copyfile(object_path, temp_path)
+            os.replace(temp_path, dest_path)
+        except FileNotFoundError:
+            # Evicted by another process between the checks
+            self.misses += 1
+            return False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        with closing(self._connect()) as db, db:
+            db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+        self.hits += 1
+        return True
+
+    def fetch_bytes(self, key):
+        """
+        Read a cached artifact into memory
+
+        Returns:
+            bytes: The artifact, or None if the key is not cached
+        """
+        try:
+            with open(self._object_path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        with closing(self._connect()) as db, db:
+            db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+        self.hits += 1
+        return data
+
+    def store_bytes(self, key, data):
+        """Add an artifact to the cache from memory"""
+        temp_path = os.path.join(self.temp_dir, uuid.uuid4().hex)
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        self._commit(key, temp_path, len(data))
+
+    def store_file(self, key, path):
+        """Add an artifact to the cache by copying an existing file"""
+        temp_path = os.path.join(self.temp_dir, uuid.uuid4().hex)
+        shutil.copyfile(path, temp_path)
+        self._commit(key, temp_path, os.path.getsize(temp_path))
+
+    def _commit(self, key, temp_path, size):
+        """Atomically move a finished temp file into the store and record it"""
+        object_path = self._object_path(key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        # Objects are never modified after this point; readers only ever link or copy them
+        os.replace(temp_path, object_path)
+        now = time.time()
+        with closing(self._connect()) as db, db:
+            db.execute('INSERT OR REPLACE INTO entries (key, size, created, last_access) VALUES (?, ?, ?, ?)',
+                       (key, size, now, now))
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used artifacts until the cache fits its size cap"""
+        db = self._connect()
+        try:
+            db.isolation_level = None
+            db.execute('BEGIN IMMEDIATE')
+            total = db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total <= self.max_bytes:
+                db.execute('COMMIT')
+                return 0
+
+            removed = 0
+            for key, size in db.execute('SELECT key, size FROM entries ORDER BY last_access').fetchall():
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._object_path(key))
+                except FileNotFoundError:
+                    pass
+                db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                total -= size
+                removed += 1
+            db.execute('COMMIT')
+            return removed
+        except Exception:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+        finally:
+            db.close()
+
+    def stats(self):
+        """Return entry count, total bytes and this process's hit/miss counters"""
+        with closing(self._connect()) as db, db:
+            count, total = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {'entries': count, 'bytes': total, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+
+def get_default_cache():
+    """
+    Return the shared cache configured by the environment (None when disabled)
+    """
+    global _default_cache
+    cache_dir = os.environ.get('ALFAX10_CACHE_DIR', DEFAULT_CACHE_DIR)
+    if cache_dir.lower() in ('off', 'none', '0', ''):
+        return None
+    max_bytes = int(float(os.environ.get('ALFAX10_CACHE_MAX_MB', DEFAULT_MAX_BYTES / 1024 / 1024)) * 1024 * 1024)
+    if _default_cache is None or _default_cache.cache_dir != cache_dir or _default_cache.max_bytes != max_bytes:
+        try:
+            _default_cache = ArtifactCache(cache_dir, max_bytes)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Artifact cache unavailable ({e}); continuing without it.")
+            return None
+    return _default_cache
@@ -0,0 +1,190 @@
+# Crash-Safe Output Module
+# This module only requires Python
+
+import os
+import re
+import json
+import uuid
+from contextlib import contextmanager
+
+from site_scanner import HTML_OUTPUT_DIR, scan_site
+
+"""
+Crash-safe outputs for the optimization steps.
+
+Every file a step writes goes to a temp file next to its destination
+first, is flushed to disk and then renamed over the destination with
+os.replace(), which is atomic. A run that is killed mid-write leaves the
+old file (or none) in place and a stray temp file, never a truncated
+output that later runs would mistake for a finished one.
+
+Long runs also keep a journal in the site root (.optimize_journal.jsonl):
+one JSON line per finished item with its source fingerprint, output and
+report entry, flushed as soon as the item is done. A run that finds a
+journal left by an interrupted run resumes from it: finished items whose
+source has not changed since are skipped and their report entries reused.
+Every run starts by removing the temp files of interrupted writes, also
+when the interrupted run was killed before it journaled anything. The
+journal is deleted when a run completes.
+"""
+
+JOURNAL_NAME = '.optimize_journal.jsonl'
+
+# Temp files are named <destination>.<32 hex digits>.tmp (also used by artifact_cache.py)
+TEMP_FILE = re.compile(r'\.[0-9a-f]{32}\.tmp$')
+
+
+def temp_path_for(path):
+    """Unique temp file path next to a destination path"""
+    return f"{path}.{uuid.uuid4().hex}.tmp"
+
+
+@contextmanager
+def atomic_open(path, mode='w', encoding=None):
+    """
+    Open a file for writing that only replaces path once it is completely written
+
+    If the block raises, the destination is left untouched.
+
+    Args:
+        path (str): Destination file
+        mode (str): 'w' for text or 'wb' for binary
+        encoding (str): Text encoding for text mode
+    """
+    temp_path = temp_path_for(path)
+    try:
+        with open(temp_path, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def atomic_write(path, data, encoding='utf-8'):
+    """Write bytes or text to a file atomically"""
+    if isinstance(data, bytes):
+        with atomic_open(path, 'wb') as f:
+            f.write(data)
+    else:
+        with atomic_open(path, 'w', encoding=encoding) as f:
+            f.write(data)
+
+
+def remove_stale_temp_files(site_dir):
+    """
+    Delete temp files left behind by interrupted writes
+
+    The minified pages in HTML_OUTPUT_DIR, which the site scan skips, are
+    searched too.
+
+    Returns:
+        int: Number of files removed
+    """
+    paths = list(scan_site(site_dir).paths(('.tmp',)))
+    for root, _, files in os.walk(os.path.join(site_dir, HTML_OUTPUT_DIR)):
+        paths.extend(os.path.join(root, name) for name in files)
+
+    removed = 0
+    for path in paths:
+        if TEMP_FILE.search(path):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def _fingerprint(path):
+    """Size and modification time of a source file, to notice changes between runs"""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class RunJournal:
+    """
+    Journal of the items a run has finished, so an interrupted run can resume
+
+    Args:
+        site_dir (str): Website root directory; the journal lives there
+        name (str): Journal file name
+    """
+
+    def __init__(self, site_dir, name=JOURNAL_NAME):
+        self.path = os.path.join(site_dir, name)
+        self._records = {}
+        self._file = None
+        self.resumed = os.path.exists(self.path)
+
+        # Also after a run that was killed before it journaled anything
+        removed = remove_stale_temp_files(site_dir)
+        if removed and not self.resumed:
+            print(f"Removed {removed} partial files of an interrupted run")
+
+        if self.resumed:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The line being written when the run was killed
+                        continue
+                    self._records[(record['stage'], record['source'])] = record
+            print(f"Resuming interrupted run: {len(self._records)} items already done"
+                  f"{f', {removed} partial files removed' if removed else ''}")
+
+    def completed(self, stage, source, output=None):
+        """
+        Look up an item finished by an earlier, interrupted run
+
+        The item only counts as done while its source is unchanged and its output still exists.
+
+        Returns:
+            dict: The item's report entry ({} if none was recorded), or None if it has to be redone
+        """
+        record = self._records.get((stage, os.path.abspath(source)))
+        if record is None:
+            return None
+        try:
+            if record['fingerprint'] != _fingerprint(source):
+                return None
+        except OSError:
+            return None
+        if output and not os.path.exists(output):
+            return None
+        return record.get('entry') or {}
+
+    def record(self, stage, source, output=None, entry=None):
+        """
+        Record a finished item; the line is on disk before this returns
+
+        Args:
+            stage (str): Step name, e.g. 'webp'
+            source (str): Source file of the item
+            output (str): Output file written for it
+            entry (dict): Report entry to reuse when the run is resumed
+        """
+        record = {'stage': stage, 'source': os.path.abspath(source), 'output': output,
+                  'fingerprint': _fingerprint(source), 'entry': entry}
+        self._records[(stage, record['source'])] = record
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Close the journal, keeping it for a later resume"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def finish(self):
+        """Close and delete the journal once the run has completed"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._records = {}
@@ -0,0 +1,367 @@
+# Oversized Image Audit Script
+# This script requires Python, Pillow and NumPy
+# Install with: pip install Pillow numpy
+
+import os
+import re
+import time
+
+from PIL import Image, ImageOps
+
+from artifact_cache import get_default_cache, hash_file
+from atomic_output import atomic_open
+from audit_performance import find_pages, parse_page, resolve_url, write_json_report
+from encoder_selection import SELECTION_VERSION, encode_webp
+
+"""
+Finds images that are shipped at far more pixels than they are displayed at.
+
+For every <img> on every page the rendered width is taken from its sizes
+attribute (the largest slot, with vw units resolved against a desktop
+viewport) or from its width and height attributes, and compared with the
+intrinsic pixels of the file. Images wider than OVERSIZE_FACTOR times their
+largest rendered width are flagged: even a 2x display does not use those
+pixels.
+
+For flagged images right-sized WebP variants are generated for 1x and 2x
+displays (about.png displayed at 450px gets about-450w.webp and
+about-900w.webp), and the pages can be updated to offer them through
+srcset. The report lists the wasted bytes per page: the bytes of the
+shipped file minus those of the 2x variant.
+"""
+
+# Intrinsic width above this multiple of the rendered width is flagged
+OVERSIZE_FACTOR = 2
+
+# Device pixel ratios variants are generated for
+VARIANT_DENSITIES = (1, 2)
+
+# Viewport width used to resolve vw units in sizes (a typical desktop)
+VIEWPORT_WIDTH = 1440
+
+# Root font size used to resolve em/rem units in sizes
+ROOT_FONT_SIZE = 16
+
+RASTER_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif')
+
+# Generated variants are named <stem>-<width>w.webp
+SIZED_VARIANT = re.compile(r'-\d+w$')
+
+REPORT_NAME = 'image_size_report.json'
+
+# Bump when variant encoding changes so cached variants are regenerated
+RIGHT_SIZE_VERSION = 1
+
+
+def is_sized_variant(path):
+    """Whether a file is a right-sized variant generated by this script"""
+    return bool(SIZED_VARIANT.search(os.path.splitext(os.path.basename(path))[0]))
+
+
+def _css_length(value):
+    """Convert a CSS length from a sizes slot or attribute to CSS pixels (None if unknown)"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*(px|vw|em|rem)?\s*', value or '')
+    if not match:
+        return None
+    number = float(match.group(1))
+    unit = match.group(2) or 'px'
+    if unit == 'vw':
+        return number * VIEWPORT_WIDTH / 100
+    if unit in ('em', 'rem'):
+        return number * ROOT_FONT_SIZE
+    return number
+
+
+def sizes_width(sizes):
+    """
+    Largest slot width of a sizes attribute in CSS pixels
+
+    Each comma-separated entry ends with its slot width, e.g.
+    "(max-width: 600px) 100vw, 400px"; calc() and other units are skipped.
+    """
+    widths = []
+    for entry in (sizes or '').split(','):
+        parts = entry.strip().rsplit(None, 1)
+        if parts:
+            width = _css_length(parts[-1])
+            if width:
+                widths.append(width)
+    return max(widths) if widths else None
+
+
+def rendered_width(resource, intrinsic_size):
+    """
+    Widest CSS pixel width an <img> is displayed at, from sizes, width or height
+
+    Args:
+        resource (dict): Image resource from audit_performance.PageParser
+        intrinsic_size (tuple): (width, height) of the image file
+
+    Returns:
+        float: Rendered width in CSS pixels, or None when the page does not declare one
+    """
+    width = sizes_width(resource.get('sizes')) or _css_length(resource.get('width'))
+    if width:
+        return width
+    height = _css_length(resource.get('height'))
+    if height and intrinsic_size[1]:
+        return height * intrinsic_size[0] / intrinsic_size[1]
+    return None
+
+
+def variant_path(image_path, width):
+    """Path of the right-sized variant of an image for a pixel width"""
+    return f"{os.path.splitext(image_path)[0]}-{width}w.webp"
+
+
+def generate_sized_variants(image_path, display_width, quality=85, cache=None):
+    """
+    Write right-sized WebP variants of an image for every density in VARIANT_DENSITIES
+
+    Widths at or above the intrinsic width are skipped.
+
+    Args:
+        image_path (str): Source image
+        display_width (int): Rendered width in CSS pixels
+        quality (int): Quality for lossy encodes (0-100)
+        cache (ArtifactCache): Artifact cache (None or False to disable)
+
+    Returns:
+        list: (pixel width, variant path) pairs, narrowest first
+    """
+    with Image.open(image_path) as img:
+        intrinsic_width, intrinsic_height = img.size
+        widths = sorted({display_width * density for density in VARIANT_DENSITIES
+                         if display_width * density < intrinsic_width})
+        source_mtime = os.path.getmtime(image_path)
+        source_hash = None
+        variants = []
+
+        for width in widths:
+            output_path = variant_path(image_path, width)
+            variants.append((width, output_path))
+            if os.path.exists(output_path) and os.path.getmtime(output_path) >= source_mtime:
+                continue
+
+            cache_key = None
+            if cache:
+                source_hash = source_hash or hash_file(image_path)
+                cache_key = cache.key(source_hash, 'right-size', {
+                    'width': width, 'quality': quality, 'version': RIGHT_SIZE_VERSION,
+                    'selection': SELECTION_VERSION, 'pillow': Image.__version__})
+                if cache.fetch(cache_key, output_path):
+                    continue
+
+            height = max(1, round(intrinsic_height * width / intrinsic_width))
+            resized = ImageOps.exif_transpose(img).resize((width, height), Image.LANCZOS)
+            data, _ = encode_webp(resized, quality, lossy_source=img.format == 'JPEG')
+            with atomic_open(output_path, 'wb') as f:
+                f.write(data)
+            if cache:
+                cache.store_bytes(cache_key, data)
+
+    return variants
+
+
+def find_oversized_images(site_dir, scan=None):
+    """
+    Compare the rendered and intrinsic size of every <img> on every page
+
+    Returns:
+        dict: Page path -> list of image entries (url, path, intrinsic and rendered size, ratio, bytes, oversized)
+    """
+    intrinsic_sizes = {}
+    pages = {}
+    for page in find_pages(site_dir, scan):
+        images = {}
+        for resource in parse_page(page).resources:
+            if resource['kind'] != 'image':
+                continue
+            local_path, external = resolve_url(resource['url'], page, site_dir)
+            if external or not local_path or not local_path.lower().endswith(RASTER_EXTENSIONS) \
+                    or not os.path.isfile(local_path):
+                continue
+
+            if local_path not in intrinsic_sizes:
+                try:
+                    with Image.open(local_path) as img:
+                        intrinsic_sizes[local_path] = ImageOps.exif_transpose(img).size
+                except Exception as e:
+                    print(f"Skipping {local_path} ({e})")
+                    intrinsic_sizes[local_path] = None
+            intrinsic = intrinsic_sizes[local_path]
+            if not intrinsic:
+                continue
+
+            width = rendered_width(resource, intrinsic)
+            if not width:
+                continue
+
+            # An image used several times on a page has to cover its widest use
+            entry = images.get(local_path)
+            if entry and entry['rendered_width'] >= width:
+                continue
+            ratio = intrinsic[0] / width
+            images[local_path] = {
+                'url': resource['url'],
+                'path': local_path,
+                'intrinsic': list(intrinsic),
+                'rendered_width': round(width),
+                'ratio': round(ratio, 2),
+                'bytes': os.path.getsize(local_path),
+                'oversized': ratio > OVERSIZE_FACTOR,
+                # Only plain <img src> tags can be given a srcset; <picture> sources are left alone
+                'rewritable': resource.get('src') == resource['url'],
+            }
+        pages[page] = list(images.values())
+    return pages
+
+
+def add_srcset(page_path, image_url, variants, display_width, site_dir):
+    """
+    Offer right-sized variants through srcset on the <img> tags of a page that load image_url
+
+    Tags that already have a srcset are left unchanged.
+
+    Returns:
+        int: Number of tags updated
+    """
+    with open(page_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    page_dir = os.path.dirname(page_path)
+    absolute = image_url.startswith('/')
+    candidates = []
+    for width, path in variants:
+        url = '/' + os.path.relpath(path, site_dir) if absolute else os.path.relpath(path, page_dir)
+        candidates.append(f"{url.replace(os.sep, '/')} {width}w")
+    srcset = ', '.join(candidates)
+
+    src_pattern = re.compile(r'\ssrc\s*=\s*(["\'])' + re.escape(image_url) + r'\1')
+    updated = 0
+
+    def update(match):
+        nonlocal updated
+        tag = match.group(0)
+        if not src_pattern.search(tag) or re.search(r'\ssrcset\s*=', tag):
+            return tag
+        addition = f' srcset="{srcset}"'
+        if not re.search(r'\ssizes\s*=', tag):
+            # Each tag's own width attribute is its slot size
+            width = re.search(r'\swidth\s*=\s*["\']?(\d+)', tag)
+            addition += f' sizes="{width.group(1) if width else display_width}px"'
+        end = len(tag) - (2 if tag.endswith('/>') else 1)
+        updated += 1
+        return tag[:end].rstrip() + addition + tag[end:]
+
+    new_content = re.sub(r'<img\b[^>]*>', update, content, flags=re.IGNORECASE)
+    if updated:
+        with atomic_open(page_path, 'w', encoding='utf-8') as f:
+            f.write(new_content)
+    return updated
+
+
+def audit_image_sizes(site_dir, generate=True, rewrite=False, quality=85, report_path=None, cache=None, scan=None):
+    """
+    Flag images shipped at more than OVERSIZE_FACTOR times their rendered width
+
+    Args:
+        site_dir (str): Website root directory
+        generate (bool): Write right-sized WebP variants for flagged images
+        rewrite (bool): Add srcset/sizes for the variants to the pages' <img> tags
+        quality (int): Quality of lossy variants (0-100)
+        report_path (str): Where to write the JSON report (default: image_size_report.json in site_dir)
+        cache (ArtifactCache): Artifact cache to consult before encoding (default: shared cache, False to disable)
+        scan (SiteScan): File listing to use instead of scanning site_dir; variants are added to it
+
+    Returns:
+        dict: Report with per-page entries and total wasted bytes
+    """
+    if cache is None:
+        cache = get_default_cache()
+
+    print("\nComparing rendered and intrinsic image sizes...\n")
+    start_time = time.time()
+    pages = find_oversized_images(site_dir, scan)
+
+    # Variants are generated once per image for its widest use on any page
+    widest = {}
+    for images in pages.values():
+        for image in images:
+            if image['oversized']:
+                widest[image['path']] = max(widest.get(image['path'], 0), image['rendered_width'])
+
+    variants = {}
+    if generate:
+        for path, width in sorted(widest.items()):
+            try:
+                variants[path] = generate_sized_variants(path, width, quality, cache)
+            except Exception as e:
+                print(f"Error generating variants of {path}: {e}")
+                continue
+            if scan is not None:
+                for _, output_path in variants[path]:
+                    scan.add(output_path)
+
+    report_pages = []
+    total_wasted = 0
+    for page, images in pages.items():
+        flagged = [image for image in images if image['oversized']]
+        page_wasted = 0
+        for image in flagged:
+            # Bytes beyond what the 2x variant of this page's rendered width needs
+            needed_width = image['rendered_width'] * max(VARIANT_DENSITIES)
+            image_variants = variants.get(image['path'], [])
+            fitting = [path for width, path in image_variants if width >= needed_width]
+            if fitting:
+                needed_bytes = os.path.getsize(fitting[0])
+            else:
+                needed_bytes = image['bytes'] * min(1.0, (needed_width / image['intrinsic'][0]) ** 2)
+            image['wasted_bytes'] = max(0, int(image['bytes'] - needed_bytes))
+            image['variants'] = [{'width': width, 'path': path, 'bytes': os.path.getsize(path)}
+                                 for width, path in image_variants if os.path.exists(path)]
+            page_wasted += image['wasted_bytes']
+
+            if rewrite and image['rewritable'] and image_variants:
+                updated = add_srcset(page, image['url'], image_variants, image['rendered_width'], site_dir)
+                image['srcset_added'] = updated
+
+        total_wasted += page_wasted
+        report_pages.append({'page': page, 'images': len(images), 'oversized': flagged,
+                             'wasted_bytes': page_wasted})
+
+        if flagged:
+            print(f"{page}: {len(flagged)} oversized images, {page_wasted/1024:.1f}KB wasted")
+            for image in flagged:
+                width, height = image['intrinsic']
+                print(f"  - {image['url']}: {width}×{height} shown at {image['rendered_width']}px "
+                      f"({image['ratio']}x), {image['wasted_bytes']/1024:.1f}KB wasted")
+                for variant in image['variants']:
+                    print(f"      {variant['path']} ({variant['bytes']/1024:.1f}KB)")
+                if image.get('srcset_added'):
+                    print(f"      srcset added to {image['srcset_added']} tags")
+
+    print(f"\nChecked {sum(len(images) for images in pages.values())} images on {len(pages)} pages "
+          f"in {time.time() - start_time:.1f} seconds")
+    print(f"Oversized: {len(widest)} images, {total_wasted/1024:.1f}KB wasted across all pages")
+
+    report = {'oversize_factor': OVERSIZE_FACTOR, 'viewport_width': VIEWPORT_WIDTH,
+              'pages': report_pages, 'wasted_bytes': total_wasted}
+    report_path = report_path or os.path.join(site_dir, REPORT_NAME)
+    write_json_report(report_path, report)
+    print(f"Report written to: {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    print("Oversized Image Audit")
+    print("=====================")
+
+    directory = input("Enter website directory path (press Enter for current directory): ") or "."
+
+    if os.path.isdir(directory):
+        generate = input("Generate right-sized variants for oversized images? (y/n, default: y): ").lower() != 'n'
+        rewrite = generate and input("Offer the variants through srcset on the pages? (y/n, default: n): ").lower() == 'y'
+        audit_image_sizes(directory, generate=generate, rewrite=rewrite)
+    else:
+        print(f"Error: '{directory}' is not a valid directory.")
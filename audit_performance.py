@@ -0,0 +1,447 @@
+# Page Weight and Performance Budget Audit Script
+# This script only requires Python (brotli sizes need: pip install brotli)
+
+import os
+import sys
+import json
+import gzip
+import time
+import argparse
+from html.parser import HTMLParser
+from urllib.parse import urlparse, unquote
+
+from atomic_output import atomic_open
+from site_scanner import scan_site
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+"""
+Audits every HTML page of the site against performance budgets.
+
+Each page is parsed, its stylesheets, scripts, images and preloads are
+resolved against the local files, and the page weight is computed as raw,
+gzip and brotli transfer bytes together with the request count, the
+render-blocking resources and the largest images. The numbers are compared
+with the budgets in performance_budgets.json and written to a JSON report.
+The script exits with a nonzero status when a budget is exceeded, so it can
+be used as a CI gate:
+
+    python audit_performance.py . --budgets performance_budgets.json
+"""
+
+DEFAULT_BUDGETS_FILE = 'performance_budgets.json'
+DEFAULT_REPORT_FILE = 'performance_report.json'
+
+# Reference files written by convert_to_webp.py are not site pages
+GENERATED_PAGES = ('image_tags_reference.html', 'structured_data_reference.html', 'seo_meta_tags.html')
+
+RESOURCE_TYPES = {
+    '.css': 'css',
+    '.js': 'js',
+    '.mjs': 'js',
+    '.png': 'image',
+    '.jpg': 'image',
+    '.jpeg': 'image',
+    '.webp': 'image',
+    '.avif': 'image',
+    '.gif': 'image',
+    '.svg': 'image',
+    '.ico': 'image',
+    '.woff': 'font',
+    '.woff2': 'font',
+    '.ttf': 'font',
+    '.otf': 'font',
+    '.html': 'document',
+    '.json': 'other',
+    '.xml': 'other',
+}
+
+# Text formats the server compresses; everything else is sent as-is
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.mjs', '.svg', '.json', '.xml', '.txt', '.ico')
+
+
+def size_summary(bytes_before, bytes_after):
+    """
+    Machine-readable form of the size reductions printed by the optimization steps
+
+    Returns:
+        dict: bytes before and after and the reduction percentage
+    """
+    reduction = (1 - (bytes_after / bytes_before)) * 100 if bytes_before else 0.0
+    return {
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after,
+        'reduction_percent': round(reduction, 1),
+    }
+
+
+def transfer_sizes(path):
+    """
+    Compute the raw, gzip and brotli transfer size of a local file
+
+    Non-text formats are sent uncompressed, so all three sizes are equal.
+    The brotli size is None when the brotli module is not installed.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    raw = len(data)
+    if not path.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+        return {'raw': raw, 'gzip': raw, 'brotli': raw}
+
+    return {
+        'raw': raw,
+        'gzip': len(gzip.compress(data, compresslevel=6)),
+        'brotli': len(brotli.compress(data, quality=11)) if brotli else None,
+    }
+
+
+def parse_srcset(srcset):
+    """Return the URLs listed in a srcset attribute"""
+    urls = []
+    for candidate in srcset.split(','):
+        parts = candidate.strip().split()
+        if parts:
+            urls.append(parts[0])
+    return urls
+
+
+class PageParser(HTMLParser):
+    """
+    Collect the resources an HTML page loads, in document order
+
+    Each resource is a dict with at least 'kind' (stylesheet, script, image,
+    preload, icon), 'url', 'order' and 'in_head'; the remaining keys are the
+    attributes that matter for loading behavior.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.resources = []
+        self.preconnects = []
+        self.crossorigin_preconnects = []
+        self.in_head = False
+        self.in_noscript = False
+        self.in_picture = False
+        self.picture_sources = []
+        self.order = 0
+
+    def _add(self, kind, url, **extra):
+        self.order += 1
+        resource = {'kind': kind, 'url': url, 'order': self.order, 'in_head': self.in_head}
+        resource.update(extra)
+        self.resources.append(resource)
+        return resource
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: (value or '') for name, value in attrs}
+
+        # <noscript> fallbacks are not loaded when JavaScript runs
+        if tag == 'noscript':
+            self.in_noscript = True
+        if self.in_noscript:
+            return
+
+        if tag == 'head':
+            self.in_head = True
+        elif tag == 'body':
+            self.in_head = False
+
+        elif tag == 'link':
+            rel = attrs.get('rel', '').lower().split()
+            href = attrs.get('href', '').strip()
+            if not href:
+                return
+            if 'stylesheet' in rel:
+                self._add('stylesheet', href, media=attrs.get('media', ''),
+                          onload=attrs.get('onload', ''))
+            elif 'preload' in rel or 'modulepreload' in rel:
+                self._add('preload', href, rel=' '.join(rel), as_type=attrs.get('as', ''),
+                          fetchpriority=attrs.get('fetchpriority', ''))
+            elif 'preconnect' in rel or 'dns-prefetch' in rel:
+                self.preconnects.append(href)
+                if 'crossorigin' in attrs:
+                    self.crossorigin_preconnects.append(href)
+            elif 'icon' in rel or 'apple-touch-icon' in rel:
+                self._add('icon', href)
+
+        elif tag == 'script':
+            src = attrs.get('src', '').strip()
+            if src:
+                self._add('script', src, is_async='async' in attrs, defer='defer' in attrs,
+                          module=attrs.get('type', '').lower() == 'module')
+
+        elif tag == 'picture':
+            self.in_picture = True
+            self.picture_sources = []
+
+        elif tag == 'source' and self.in_picture:
+            srcset = parse_srcset(attrs.get('srcset', ''))
+            if srcset:
+                self.picture_sources.append(srcset[0])
+
+        elif tag == 'img':
+            src = attrs.get('src', '').strip()
+            srcset = parse_srcset(attrs.get('srcset', ''))
+            # The browser fetches the first <source> it supports, so count that one
+            if self.in_picture and self.picture_sources:
+                url = self.picture_sources[0]
+            else:
+                url = src or (srcset[0] if srcset else '')
+            if url:
+                self._add('image', url, src=src, width=attrs.get('width', ''),
+                          height=attrs.get('height', ''), sizes=attrs.get('sizes', ''),
+                          loading=attrs.get('loading', ''), fetchpriority=attrs.get('fetchpriority', ''))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == 'noscript':
+            self.in_noscript = False
+        elif tag == 'head':
+            self.in_head = False
+        elif tag == 'picture':
+            self.in_picture = False
+            self.picture_sources = []
+
+
+def parse_page(page_path):
+    """Parse an HTML page and return its PageParser"""
+    with open(page_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    parser = PageParser()
+    parser.feed(content)
+    parser.close()
+    return parser
+
+
+def resolve_url(url, page_path, site_dir, site_url=None):
+    """
+    Map a URL found in a page to a local file path
+
+    Returns:
+        tuple: (local path or None, True if the URL points to another origin)
+    """
+    parsed = urlparse(url)
+    if parsed.scheme in ('data', 'blob', 'mailto', 'tel', 'javascript'):
+        return None, False
+
+    if parsed.scheme or url.startswith('//'):
+        site_host = urlparse(site_url).netloc if site_url else None
+        if not site_host or parsed.netloc != site_host:
+            return None, True
+        local = parsed.path.lstrip('/')
+        return os.path.normpath(os.path.join(site_dir, unquote(local))), False
+
+    if parsed.path.startswith('/'):
+        local = os.path.join(site_dir, unquote(parsed.path.lstrip('/')))
+    else:
+        local = os.path.join(os.path.dirname(page_path), unquote(parsed.path))
+    return os.path.normpath(local), False
+
+
+def is_render_blocking(resource):
+    """Whether a stylesheet or script blocks the first render"""
+    if resource['kind'] == 'stylesheet':
+        # media="print" with an onload swap is the async stylesheet pattern
+        media = resource.get('media', '').strip().lower()
+        return media in ('', 'all', 'screen')
+    if resource['kind'] == 'script':
+        return resource['in_head'] and not (resource['is_async'] or resource['defer'] or resource['module'])
+    return False
+
+
+def find_pages(site_dir, scan=None):
+    """
+    Return all site HTML pages below site_dir, excluding generated reference files
+
+    Args:
+        site_dir (str): Website root directory
+        scan (SiteScan): File listing to use instead of scanning site_dir
+    """
+    scan = scan or scan_site(site_dir)
+    return [path for path in scan.paths(('.html',)) if os.path.basename(path) not in GENERATED_PAGES]
+
+
+def audit_page(page_path, site_dir, site_url=None, largest_images=5):
+    """
+    Compute page weight, request count and render-blocking resources for a page
+
+    Returns:
+        dict: Per-page metrics with the list of resolved resources
+    """
+    parser = parse_page(page_path)
+    page_sizes = transfer_sizes(page_path)
+
+    totals = dict(page_sizes)
+    image_bytes = 0
+    requests = 1
+    external = []
+    missing = []
+    resources = []
+    render_blocking = []
+    seen = set()
+
+    for resource in parser.resources:
+        local_path, is_external = resolve_url(resource['url'], page_path, site_dir, site_url)
+
+        if is_external:
+            if resource['url'] not in seen:
+                seen.add(resource['url'])
+                requests += 1
+                external.append(resource['url'])
+            if is_render_blocking(resource):
+                render_blocking.append(resource['url'])
+            continue
+        if local_path is None or local_path in seen:
+            continue
+        seen.add(local_path)
+        requests += 1
+
+        rel_path = os.path.relpath(local_path, site_dir).replace('\\', '/')
+        if not os.path.isfile(local_path):
+            missing.append(rel_path)
+            continue
+
+        sizes = transfer_sizes(local_path)
+        for key in totals:
+            if totals[key] is not None and sizes[key] is not None:
+                totals[key] += sizes[key]
+            else:
+                totals[key] = None
+
+        resource_type = RESOURCE_TYPES.get(os.path.splitext(local_path)[1].lower(), 'other')
+        if resource_type == 'image':
+            image_bytes += sizes['raw']
+        if is_render_blocking(resource):
+            render_blocking.append(rel_path)
+
+        resources.append({'path': rel_path, 'type': resource_type, 'kind': resource['kind'], 'bytes': sizes})
+
+    images = sorted((r for r in resources if r['type'] == 'image'), key=lambda r: r['bytes']['raw'], reverse=True)
+
+    return {
+        'page': os.path.relpath(page_path, site_dir).replace('\\', '/'),
+        'total_bytes': totals['raw'],
+        'total_gzip_bytes': totals['gzip'],
+        'total_brotli_bytes': totals['brotli'],
+        'requests': requests,
+        'external_requests': len(external),
+        'render_blocking': len(render_blocking),
+        'image_bytes': image_bytes,
+        'largest_image_bytes': images[0]['bytes']['raw'] if images else 0,
+        'render_blocking_resources': render_blocking,
+        'largest_images': [{'path': r['path'], 'bytes': r['bytes']['raw']} for r in images[:largest_images]],
+        'external_resources': external,
+        'missing_resources': missing,
+        'resources': resources,
+    }
+
+
+def load_budgets(budgets_path):
+    """Load budgets: a 'default' section plus optional per-page overrides under 'pages'"""
+    with open(budgets_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_budgets(page_metrics, budgets):
+    """
+    Compare a page's metrics with its budgets
+
+    Returns:
+        list: One dict per exceeded budget with the metric, budget and actual value
+    """
+    page_budgets = dict(budgets.get('default', {}))
+    page_budgets.update(budgets.get('pages', {}).get(page_metrics['page'], {}))
+
+    violations = []
+    for metric, limit in sorted(page_budgets.items()):
+        actual = page_metrics.get(metric)
+        if actual is None or limit is None:
+            continue
+        if actual > limit:
+            violations.append({'metric': metric, 'budget': limit, 'actual': actual})
+    return violations
+
+
+def write_json_report(report_path, data):
+    """Write a JSON report file"""
+    with atomic_open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    return report_path
+
+
+def audit_site(site_dir, budgets_path=None, report_path=None, site_url=None):
+    """
+    Audit all pages of a site against performance budgets
+
+    Args:
+        site_dir (str): Website root directory
+        budgets_path (str): Budget config file (default: performance_budgets.json in site_dir)
+        report_path (str): JSON report to write (default: performance_report.json in site_dir)
+        site_url (str): Public site URL, so absolute links to the site resolve to local files
+
+    Returns:
+        tuple: (report dict, number of budget violations)
+    """
+    budgets_path = budgets_path or os.path.join(site_dir, DEFAULT_BUDGETS_FILE)
+    report_path = report_path or os.path.join(site_dir, DEFAULT_REPORT_FILE)
+    budgets = load_budgets(budgets_path) if os.path.exists(budgets_path) else {}
+    site_url = site_url or budgets.get('site_url')
+
+    if not budgets:
+        print(f"No budgets found at {budgets_path}; reporting metrics only.")
+
+    print(f"\nAuditing pages in {os.path.abspath(site_dir)}...\n")
+
+    pages = []
+    violation_count = 0
+    for page_path in find_pages(site_dir):
+        metrics = audit_page(page_path, site_dir, site_url)
+        metrics['violations'] = check_budgets(metrics, budgets)
+        violation_count += len(metrics['violations'])
+        pages.append(metrics)
+
+        status = "✓" if not metrics['violations'] else "×"
+        brotli_kb = f"{metrics['total_brotli_bytes']/1024:.1f}KB" if metrics['total_brotli_bytes'] is not None else "n/a"
+        print(f"{status} {metrics['page']}: {metrics['total_bytes']/1024:.1f}KB raw, "
+              f"{metrics['total_gzip_bytes']/1024:.1f}KB gzip, {brotli_kb} brotli, "
+              f"{metrics['requests']} requests, {metrics['render_blocking']} render-blocking")
+        for violation in metrics['violations']:
+            print(f"    Budget exceeded: {violation['metric']} = {violation['actual']:,} (budget {violation['budget']:,})")
+        for missing in metrics['missing_resources']:
+            print(f"    Missing file: {missing}")
+
+    report = {
+        'generated': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'site_dir': os.path.abspath(site_dir),
+        'budgets_file': budgets_path if budgets else None,
+        'violations': violation_count,
+        'pages': pages,
+    }
+    write_json_report(report_path, report)
+
+    print(f"\nAudited {len(pages)} pages, {violation_count} budget violations.")
+    print(f"Report written to: {report_path}")
+
+    return report, violation_count
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Audit page weight and request counts against performance budgets")
+    arg_parser.add_argument('site_dir', nargs='?', default='.', help="Website root directory (default: current directory)")
+    arg_parser.add_argument('--budgets', help=f"Budget config file (default: <site_dir>/{DEFAULT_BUDGETS_FILE})")
+    arg_parser.add_argument('--report', help=f"JSON report path (default: <site_dir>/{DEFAULT_REPORT_FILE})")
+    arg_parser.add_argument('--site-url', help="Public site URL used to resolve absolute links")
+    args = arg_parser.parse_args()
+
+    if not os.path.isdir(args.site_dir):
+        print(f"Error: '{args.site_dir}' is not a valid directory.")
+        sys.exit(2)
+
+    _, violations = audit_site(args.site_dir, args.budgets, args.report, args.site_url)
+    sys.exit(1 if violations else 0)
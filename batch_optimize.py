@@ -0,0 +1,349 @@
+# Batch Website Optimization Script
+# This script requires Python, Pillow and NumPy (brotli output needs: pip install brotli)
+# Install with: pip install Pillow numpy
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import convert_to_webp as optimizer
+from audit_performance import GENERATED_PAGES, size_summary, write_json_report
+from build_history import record_run
+from minify_assets import HTML_OUTPUT_DIR, minify_html_file
+from site_scanner import scan_site
+
+"""
+Optimizes many websites in one run on a single shared pool of worker
+processes.
+
+Each site is scanned once and split into small tasks: one per image for
+the WebP conversion, one per stylesheet or script for minification, and
+groups of pages and text files for HTML minification and precompression.
+Precompression of a site starts when its conversion and minification tasks
+are done, so it picks up the minified files.
+
+Tasks are handed to the pool round-robin across sites and only a few are
+in flight at a time, so a site with thousands of images does not hold up
+the others: every site keeps getting a share of the workers and small
+sites finish early. The combined report has per-site byte totals, task
+counts, wall-clock and worker time, and any errors.
+
+    python batch_optimize.py clients/ --workers 8
+    python batch_optimize.py site-a site-b --quality 80
+"""
+
+DEFAULT_REPORT_FILE = 'batch_report.json'
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+MINIFY_EXTENSIONS = ('.css', '.js')
+
+# Pages and text files are grouped into tasks of roughly this many bytes
+TEXT_TASK_BYTES = 512 * 1024
+
+# Tasks in flight per worker; low values keep the interleaving fair
+TASKS_PER_WORKER = 2
+
+
+def find_sites(paths):
+    """
+    Resolve site roots from a list of paths
+
+    A directory with an HTML page at its top level is a site; any other
+    directory is treated as a parent and each subdirectory that is a site is used.
+
+    Returns:
+        list: Site root directories in the given order
+    """
+    def is_site(path):
+        with os.scandir(path) as entries:
+            return any(entry.is_file() and entry.name.lower().endswith('.html') for entry in entries)
+
+    sites = []
+    for path in paths:
+        if not os.path.isdir(path):
+            print(f"Skipping {path} (not a directory)")
+            continue
+        if is_site(path):
+            sites.append(path)
+            continue
+        children = sorted(entry.path for entry in os.scandir(path)
+                          if entry.is_dir() and not entry.name.startswith('.'))
+        found = [child for child in children if is_site(child)]
+        if not found:
+            print(f"Skipping {path} (no site found)")
+        sites.extend(found)
+    return sites
+
+
+def _group_by_size(paths, limit=TEXT_TASK_BYTES):
+    """Split a list of files into groups of roughly limit bytes"""
+    groups = []
+    current = []
+    current_bytes = 0
+    for path in paths:
+        current.append(path)
+        current_bytes += os.path.getsize(path)
+        if current_bytes >= limit:
+            groups.append(current)
+            current = []
+            current_bytes = 0
+    if current:
+        groups.append(current)
+    return groups
+
+
+def plan_site_tasks(site_dir, scan):
+    """
+    Split a site into conversion and minification tasks
+
+    Returns:
+        list: (stage, list of files) tuples
+    """
+    tasks = [('webp', [path]) for path in scan.paths(IMAGE_EXTENSIONS)]
+    tasks += [('minify', [path]) for path in scan.paths(MINIFY_EXTENSIONS)
+              if not path.endswith(('.min.css', '.min.js'))]
+    pages = [path for path in scan.paths(('.html',)) if os.path.basename(path) not in GENERATED_PAGES]
+    tasks += [('minify-html', group) for group in _group_by_size(pages)]
+    return tasks
+
+
+def plan_compression_tasks(site_dir, scan):
+    """Split the text assets of a site, minified pages included, into precompression tasks"""
+    return [('precompress', group) for group in _group_by_size(optimizer.precompress_paths(site_dir, scan))]
+
+
+def run_task(site_dir, stage, scan, quality):
+    """
+    Run one task in a worker process
+
+    Console output of the optimization functions is captured so the logs of
+    parallel tasks do not interleave; lines reporting errors are returned.
+
+    Returns:
+        dict: Size entries, files written, errors and the task's duration
+    """
+    start_time = time.time()
+    report = []
+    log = io.StringIO()
+    inputs = set(scan.paths())
+    error = None
+
+    with contextlib.redirect_stdout(log):
+        try:
+            if stage == 'webp':
+                optimizer.convert_to_webp(site_dir, quality, report=report, scan=scan, journal=False)
+            elif stage == 'minify':
+                optimizer.minify_assets(site_dir, report=report, scan=scan)
+            elif stage == 'minify-html':
+                output_dir = os.path.join(site_dir, HTML_OUTPUT_DIR)
+                for page in scan.paths():
+                    entry = minify_html_file(page, os.path.join(output_dir, os.path.relpath(page, site_dir)))
+                    report.append(dict(stage='minify-html', **entry))
+            elif stage == 'precompress':
+                optimizer.precompress_assets(site_dir, report=report, scan=scan, output_pages=False)
+        except Exception as e:
+            error = f"{stage} failed: {e}"
+
+    errors = [line.strip() for line in log.getvalue().splitlines() if line.lstrip().startswith(('Error', '×'))]
+    if error:
+        errors.append(error)
+    return {
+        'report': report,
+        'outputs': [path for path in scan.paths() if path not in inputs],
+        'errors': errors,
+        'seconds': time.time() - start_time,
+    }
+
+
+class SiteJob:
+    """
+    Progress of one site in a batch
+
+    Args:
+        site_dir (str): Website root directory
+    """
+
+    def __init__(self, site_dir):
+        self.site_dir = site_dir
+        self.name = os.path.basename(os.path.normpath(os.path.abspath(site_dir)))
+        self.scan = scan_site(site_dir)
+        self.pending = deque(plan_site_tasks(site_dir, self.scan))
+        self.phase = 'optimize'
+        self.running = 0
+        self.task_count = 0
+        self.report = []
+        self.errors = []
+        self.worker_seconds = 0.0
+        self.stage_seconds = {}
+        self.start_time = None
+        self.end_time = None
+
+    def next_task(self):
+        """Return the next (stage, files) task of this site, or None if none is ready"""
+        if not self.pending and not self.running and self.phase == 'optimize':
+            # Conversion and minification are done; compress the text files including the minified ones
+            self.phase = 'precompress'
+            self.pending.extend(plan_compression_tasks(self.site_dir, self.scan))
+        if not self.pending:
+            return None
+        if self.start_time is None:
+            self.start_time = time.time()
+        return self.pending.popleft()
+
+    @property
+    def done(self):
+        return self.phase == 'precompress' and not self.pending and not self.running
+
+    def summary(self):
+        """
+        Per-site section of the batch report
+
+        Returns:
+            dict: Byte totals per stage and overall, task counts, timings and errors
+        """
+        stages = {}
+        for entry in self.report:
+            totals = stages.setdefault(entry['stage'], {'files': 0, 'bytes_before': 0, 'bytes_after': 0})
+            totals['files'] += 1
+            totals['bytes_before'] += entry['bytes_before']
+            totals['bytes_after'] += entry['bytes_after']
+        for totals in stages.values():
+            totals.update(size_summary(totals['bytes_before'], totals['bytes_after']))
+
+        # Precompressed copies sit next to their sources, so they are not counted in the site total
+        optimized = [totals for stage, totals in stages.items() if stage not in ('gzip', 'br')]
+        return {
+            'site': self.site_dir,
+            'files_scanned': len(self.scan),
+            'tasks': self.task_count,
+            'files_optimized': sum(totals['files'] for totals in optimized),
+            **size_summary(sum(totals['bytes_before'] for totals in optimized),
+                           sum(totals['bytes_after'] for totals in optimized)),
+            'stages': stages,
+            'wall_seconds': round((self.end_time or time.time()) - (self.start_time or time.time()), 2),
+            'worker_seconds': round(self.worker_seconds, 2),
+            'errors': self.errors,
+        }
+
+
+def batch_optimize(site_dirs, quality=85, workers=None, report_path=None):
+    """
+    Optimize several websites on one shared pool of worker processes
+
+    Args:
+        site_dirs (list): Website root directories
+        quality (int): Quality of WebP images (0-100)
+        workers (int): Number of worker processes (default: one per CPU)
+        report_path (str): Combined JSON report to write (default: batch_report.json in the current directory)
+
+    Returns:
+        dict: Combined report with a section per site
+    """
+    workers = workers or os.cpu_count() or 1
+    report_path = report_path or DEFAULT_REPORT_FILE
+    start_time = time.time()
+
+    jobs = []
+    for site_dir in site_dirs:
+        job = SiteJob(site_dir)
+        jobs.append(job)
+        print(f"{job.name}: {len(job.scan)} files, {len(job.pending)} tasks")
+
+    print(f"\nOptimizing {len(jobs)} sites with {workers} workers...\n")
+    in_flight = {}
+    turn = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # Hand out tasks one site at a time so every site keeps a share of the workers
+            idle_turns = 0
+            while len(in_flight) < workers * TASKS_PER_WORKER and idle_turns < len(jobs):
+                job = jobs[turn % len(jobs)]
+                turn += 1
+                task = job.next_task()
+                if task is None:
+                    idle_turns += 1
+                    continue
+                idle_turns = 0
+                stage, paths = task
+                future = executor.submit(run_task, job.site_dir, stage, job.scan.subset(paths), quality)
+                in_flight[future] = (job, stage)
+                job.running += 1
+                job.task_count += 1
+
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job, stage = in_flight.pop(future)
+                job.running -= 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'report': [], 'outputs': [], 'errors': [f"{stage} failed: {e}"], 'seconds': 0.0}
+
+                job.report.extend(result['report'])
+                job.worker_seconds += result['seconds']
+                # Step times of a batch run are worker time, summed over the site's tasks
+                job.stage_seconds[stage] = job.stage_seconds.get(stage, 0.0) + result['seconds']
+                for path in result['outputs']:
+                    job.scan.add(path)
+                for error in result['errors']:
+                    job.errors.append(error)
+                    print(f"× {job.name}: {error}")
+
+                if job.done and job.end_time is None:
+                    job.end_time = time.time()
+                    summary = job.summary()
+                    print(f"✓ {job.name}: {summary['files_optimized']} files, {summary['bytes_before']:,} bytes → "
+                          f"{summary['bytes_after']:,} bytes ({summary['reduction_percent']}% reduction) "
+                          f"in {summary['wall_seconds']:.1f}s")
+                    record_run(job.site_dir, job.report, job.stage_seconds, 'batch', job.start_time)
+
+    sites = [job.summary() for job in jobs]
+    report = {
+        'generated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'workers': workers,
+        'quality': quality,
+        'wall_seconds': round(time.time() - start_time, 2),
+        'worker_seconds': round(sum(site['worker_seconds'] for site in sites), 2),
+        'sites': sites,
+        'totals': {
+            'sites': len(sites),
+            'files_optimized': sum(site['files_optimized'] for site in sites),
+            **size_summary(sum(site['bytes_before'] for site in sites),
+                           sum(site['bytes_after'] for site in sites)),
+            'errors': sum(len(site['errors']) for site in sites),
+        },
+    }
+    write_json_report(report_path, report)
+
+    totals = report['totals']
+    print(f"\nOptimized {totals['sites']} sites in {report['wall_seconds']:.1f}s "
+          f"({report['worker_seconds']:.1f}s of worker time): {totals['bytes_before']:,} bytes → "
+          f"{totals['bytes_after']:,} bytes ({totals['reduction_percent']}% reduction), {totals['errors']} errors")
+    print(f"Report written to: {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Optimize many websites on one shared worker pool")
+    arg_parser.add_argument('paths', nargs='+',
+                            help="Site directories, or parent directories whose subdirectories are sites")
+    arg_parser.add_argument('--quality', type=int, default=85, help="WebP quality (0-100, default: 85)")
+    arg_parser.add_argument('--workers', type=int, help="Number of worker processes (default: one per CPU)")
+    arg_parser.add_argument('--report', help=f"Combined JSON report path (default: {DEFAULT_REPORT_FILE})")
+    args = arg_parser.parse_args()
+
+    site_dirs = find_sites(args.paths)
+    if not site_dirs:
+        print("Error: no website directories found.")
+        sys.exit(2)
+
+    result = batch_optimize(site_dirs, args.quality, args.workers, args.report)
+    sys.exit(1 if result['totals']['errors'] else 0)
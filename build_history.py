@@ -0,0 +1,295 @@
+# Build History Script
+# This script only requires Python
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import subprocess
+from contextlib import closing
+
+from audit_performance import write_json_report
+
+"""
+Keeps the results of every optimization run in a local SQLite database so
+size and speed regressions can be spotted over time.
+
+Each run stores the size report of its steps (input and output bytes and
+the chosen settings of every asset, and the encode time where known), how
+long each step took, and the git revisions of the site and of these
+scripts. The report compares the latest run with earlier ones and flags:
+
+- assets whose output grew by more than 30% since the last run that
+  produced them, with the settings that changed;
+- steps and individual encodes that got more than twice as slow.
+
+It exits with a nonzero status when there are regressions, so it can be
+used as a CI gate next to audit_performance.py:
+
+    python build_history.py . --runs 10
+"""
+
+HISTORY_NAME = '.optimize_history.sqlite'
+
+# Output growth (fraction) and slowdown (factor) that count as regressions
+SIZE_THRESHOLD = 0.3
+TIME_THRESHOLD = 2.0
+
+# Slowdowns smaller than this many seconds are timing noise
+MIN_SECONDS = 0.5
+
+# Report entry fields stored in their own columns; the rest are the asset's settings
+_ENTRY_FIELDS = ('stage', 'source', 'output', 'bytes_before', 'bytes_after', 'reduction_percent', 'seconds')
+
+
+def connect(site_dir):
+    """Open the history database of a site, creating its tables on first use"""
+    db = sqlite3.connect(os.path.join(site_dir, HISTORY_NAME), timeout=60)
+    db.row_factory = sqlite3.Row
+    db.execute('CREATE TABLE IF NOT EXISTS runs ('
+               'id INTEGER PRIMARY KEY, started REAL NOT NULL, command TEXT NOT NULL, '
+               'site_revision TEXT, tool_revision TEXT, seconds REAL NOT NULL)')
+    db.execute('CREATE TABLE IF NOT EXISTS stages ('
+               'run_id INTEGER NOT NULL, stage TEXT NOT NULL, seconds REAL NOT NULL)')
+    db.execute('CREATE TABLE IF NOT EXISTS assets ('
+               'run_id INTEGER NOT NULL, stage TEXT NOT NULL, source TEXT NOT NULL, output TEXT, '
+               'bytes_before INTEGER NOT NULL, bytes_after INTEGER NOT NULL, seconds REAL, params TEXT)')
+    db.execute('CREATE INDEX IF NOT EXISTS assets_source ON assets (stage, source, run_id)')
+    return db
+
+
+def git_revision(path):
+    """
+    Short git revision of the checkout containing path
+
+    Returns:
+        str: e.g. 'a1b2c3d', with '-dirty' for uncommitted changes, or None outside git
+    """
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=path,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=path,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ('-dirty' if changes else '')
+
+
+class StageTimer:
+    """
+    Wall-clock time per step of a run
+
+    start() ends the running step and starts the next one; stop() ends the last.
+    """
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.seconds = {}
+        self._stage = None
+        self._stage_start = None
+
+    def start(self, stage):
+        self.stop()
+        self._stage = stage
+        self._stage_start = time.time()
+
+    def stop(self):
+        if self._stage is not None:
+            self.seconds[self._stage] = self.seconds.get(self._stage, 0.0) + time.time() - self._stage_start
+            self._stage = None
+
+
+def record_run(site_dir, report, stage_seconds, command, started=None):
+    """
+    Append a run to the site's history
+
+    Args:
+        site_dir (str): Website root directory
+        report (list): Size entries collected from the steps (see the report argument of the steps)
+        stage_seconds (dict): Seconds per step, e.g. StageTimer.seconds
+        command (str): What was run, e.g. 'full' or 'convert'
+        started (float): Start time of the run (default: now minus the step times)
+
+    Returns:
+        int: Id of the recorded run
+    """
+    total_seconds = sum(stage_seconds.values())
+    started = started or time.time() - total_seconds
+    tool_dir = os.path.dirname(os.path.abspath(__file__))
+
+    with closing(connect(site_dir)) as db, db:
+        run_id = db.execute('INSERT INTO runs (started, command, site_revision, tool_revision, seconds) '
+                            'VALUES (?, ?, ?, ?, ?)',
+                            (started, command, git_revision(site_dir), git_revision(tool_dir),
+                             time.time() - started)).lastrowid
+        db.executemany('INSERT INTO stages (run_id, stage, seconds) VALUES (?, ?, ?)',
+                       [(run_id, stage, seconds) for stage, seconds in stage_seconds.items()])
+        db.executemany('INSERT INTO assets (run_id, stage, source, output, bytes_before, bytes_after, seconds, params) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                       [(run_id, entry['stage'], os.path.relpath(entry['source'], site_dir),
+                         os.path.relpath(entry['output'], site_dir) if entry.get('output') else None,
+                         entry['bytes_before'], entry['bytes_after'], entry.get('seconds'),
+                         json.dumps({key: value for key, value in entry.items() if key not in _ENTRY_FIELDS},
+                                    sort_keys=True))
+                        for entry in report])
+    print(f"Run #{run_id} recorded in {os.path.join(site_dir, HISTORY_NAME)}")
+    return run_id
+
+
+def _flatten(params, prefix=''):
+    """Flatten nested settings into dotted keys, e.g. {'settings': {'quality': 85}} -> {'settings.quality': 85}"""
+    flat = {}
+    for key, value in params.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def _changed_settings(previous, current):
+    """Describe the settings that differ between two asset rows"""
+    before = _flatten(json.loads(previous['params'] or '{}'))
+    after = _flatten(json.loads(current['params'] or '{}'))
+    changes = [f"{key}: {before.get(key)} → {after.get(key)}"
+               for key in sorted(set(before) | set(after)) if before.get(key) != after.get(key)]
+    return '; '.join(changes)
+
+
+def find_regressions(db, run_id, size_threshold=SIZE_THRESHOLD, time_threshold=TIME_THRESHOLD):
+    """
+    Compare a run with the runs before it
+
+    Every asset is compared with the last earlier run that produced it, and
+    every step with the last earlier run that timed it.
+
+    Returns:
+        list: Regression dicts with kind ('size', 'asset-time' or 'stage-time'), subject and details
+    """
+    regressions = []
+    for asset in db.execute('SELECT * FROM assets WHERE run_id = ?', (run_id,)).fetchall():
+        previous = db.execute('SELECT * FROM assets WHERE stage = ? AND source = ? AND run_id < ? '
+                              'ORDER BY run_id DESC LIMIT 1', (asset['stage'], asset['source'], run_id)).fetchone()
+        if previous is None:
+            continue
+        subject = f"{asset['stage']} {asset['source']}"
+        if previous['bytes_after'] and asset['bytes_after'] > previous['bytes_after'] * (1 + size_threshold):
+            growth = (asset['bytes_after'] / previous['bytes_after'] - 1) * 100
+            regressions.append({
+                'kind': 'size', 'subject': subject, 'previous_run': previous['run_id'],
+                'before': previous['bytes_after'], 'after': asset['bytes_after'],
+                'details': f"{previous['bytes_after']:,} → {asset['bytes_after']:,} bytes (+{growth:.0f}%)",
+                'settings_changed': _changed_settings(previous, asset),
+            })
+        if previous['seconds'] and asset['seconds'] and asset['seconds'] > previous['seconds'] * time_threshold \
+                and asset['seconds'] - previous['seconds'] >= MIN_SECONDS:
+            regressions.append({
+                'kind': 'asset-time', 'subject': subject, 'previous_run': previous['run_id'],
+                'before': previous['seconds'], 'after': asset['seconds'],
+                'details': f"{previous['seconds']:.2f}s → {asset['seconds']:.2f}s "
+                           f"({asset['seconds'] / previous['seconds']:.1f}x)",
+                'settings_changed': _changed_settings(previous, asset),
+            })
+
+    for stage in db.execute('SELECT * FROM stages WHERE run_id = ?', (run_id,)).fetchall():
+        previous = db.execute('SELECT * FROM stages WHERE stage = ? AND run_id < ? ORDER BY run_id DESC LIMIT 1',
+                              (stage['stage'], run_id)).fetchone()
+        if previous and previous['seconds'] and stage['seconds'] > previous['seconds'] * time_threshold \
+                and stage['seconds'] - previous['seconds'] >= MIN_SECONDS:
+            regressions.append({
+                'kind': 'stage-time', 'subject': stage['stage'], 'previous_run': previous['run_id'],
+                'before': previous['seconds'], 'after': stage['seconds'],
+                'details': f"{previous['seconds']:.1f}s → {stage['seconds']:.1f}s "
+                           f"({stage['seconds'] / previous['seconds']:.1f}x)",
+            })
+    return regressions
+
+
+def history_report(site_dir, runs=10, size_threshold=SIZE_THRESHOLD, time_threshold=TIME_THRESHOLD):
+    """
+    Print the recent runs, step time trends and the regressions of the latest run
+
+    Args:
+        site_dir (str): Website root directory
+        runs (int): Number of recent runs to show
+        size_threshold (float): Output growth that counts as a regression (0.3 = 30%)
+        time_threshold (float): Slowdown factor that counts as a regression
+
+    Returns:
+        dict: The recent runs and the regressions of the latest run
+    """
+    if not os.path.exists(os.path.join(site_dir, HISTORY_NAME)):
+        print(f"No build history in {site_dir} yet.")
+        return {'runs': [], 'regressions': []}
+
+    with closing(connect(site_dir)) as db:
+        recent = db.execute('SELECT * FROM runs ORDER BY id DESC LIMIT ?', (runs,)).fetchall()[::-1]
+        if not recent:
+            print("No runs recorded yet.")
+            return {'runs': [], 'regressions': []}
+
+        summaries = []
+        print(f"\n{'Run':>5}  {'Date':<16}  {'Command':<9}  {'Site':<14}  {'Tool':<14}  "
+              f"{'Assets':>6}  {'Output bytes':>13}  {'Time':>8}")
+        for run in recent:
+            # Precompressed copies are not counted in the output bytes
+            assets = db.execute("SELECT COUNT(*), COALESCE(SUM(bytes_after), 0) FROM assets "
+                                "WHERE run_id = ? AND stage NOT IN ('gzip', 'br')", (run['id'],)).fetchone()
+            stages = {row['stage']: round(row['seconds'], 2)
+                      for row in db.execute('SELECT * FROM stages WHERE run_id = ?', (run['id'],))}
+            summaries.append({'run': run['id'], 'started': time.strftime('%Y-%m-%dT%H:%M:%S',
+                                                                         time.localtime(run['started'])),
+                              'command': run['command'], 'site_revision': run['site_revision'],
+                              'tool_revision': run['tool_revision'], 'assets': assets[0],
+                              'bytes_after': assets[1], 'seconds': round(run['seconds'], 2), 'stages': stages})
+            print(f"{run['id']:>5}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started'])):<16}  "
+                  f"{run['command']:<9}  {run['site_revision'] or '-':<14}  {run['tool_revision'] or '-':<14}  "
+                  f"{assets[0]:>6}  {assets[1]:>13,}  {run['seconds']:>7.1f}s")
+
+        # Step times side by side, oldest run first
+        stage_names = []
+        for summary in summaries:
+            stage_names += [stage for stage in summary['stages'] if stage not in stage_names]
+        if stage_names:
+            print(f"\n{'Step':<16}" + ''.join(f"{'#' + str(summary['run']):>9}" for summary in summaries))
+            for stage in stage_names:
+                print(f"{stage:<16}" + ''.join(
+                    f"{summary['stages'][stage]:>8.1f}s" if stage in summary['stages'] else f"{'-':>9}"
+                    for summary in summaries))
+
+        latest = recent[-1]['id']
+        regressions = find_regressions(db, latest, size_threshold, time_threshold)
+
+    if regressions:
+        print(f"\n⚠️  {len(regressions)} regressions in run #{latest}:")
+        for regression in regressions:
+            print(f"  × [{regression['kind']}] {regression['subject']}: {regression['details']} "
+                  f"(since run #{regression['previous_run']})")
+            if regression.get('settings_changed'):
+                print(f"      settings changed: {regression['settings_changed']}")
+    else:
+        print(f"\n✓ No regressions in run #{latest}")
+    return {'runs': summaries, 'regressions': regressions}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Show optimization run history and flag regressions")
+    arg_parser.add_argument('site_dir', nargs='?', default='.', help="Website root directory (default: current directory)")
+    arg_parser.add_argument('--runs', type=int, default=10, help="Number of recent runs to show (default: 10)")
+    arg_parser.add_argument('--size-threshold', type=float, default=SIZE_THRESHOLD * 100,
+                            help=f"Output growth in percent that counts as a regression (default: {SIZE_THRESHOLD * 100:.0f})")
+    arg_parser.add_argument('--time-threshold', type=float, default=TIME_THRESHOLD,
+                            help=f"Slowdown factor that counts as a regression (default: {TIME_THRESHOLD})")
+    arg_parser.add_argument('--report', help="Also write the history and regressions as a JSON report")
+    args = arg_parser.parse_args()
+
+    if not os.path.isdir(args.site_dir):
+        print(f"Error: '{args.site_dir}' is not a valid directory.")
+        sys.exit(2)
+
+    result = history_report(args.site_dir, args.runs, args.size_threshold / 100, args.time_threshold)
+    if args.report:
+        print(f"Report written to: {write_json_report(args.report, result)}")
+    sys.exit(1 if result['regressions'] else 0)
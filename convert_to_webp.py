@@ -1,17 +1,50 @@
 # PNG/JPG to WebP Conversion Script
-# This script requires Python and Pillow library
-# Install with: pip install Pillow
+# This script requires Python, Pillow and NumPy
+# Install with: pip install Pillow numpy
 
 import os
 import sys
+import gzip
 import time
 import re
 import shutil
-from PIL import Image, ImageOps, ImageFile
+import asyncio
+from PIL import Image, ImageFile
+from animated_webp import ANIMATED_EXTENSIONS, ANIMATION_VERSION, encode_animation, is_animated
+from artifact_cache import get_default_cache, hash_bytes, hash_file
+from atomic_output import RunJournal, atomic_open, atomic_write, temp_path_for
+from encoder_selection import SELECTION_VERSION, describe_decision, encode_webp
+from optimize_png import optimize_png
+from smart_crop import generate_variants
+from dedupe_images import dedupe_images, duplicate_map
+from minify_assets import HTML_OUTPUT_DIR, css_image_set, minify_css_content, minify_html_pages
+from service_worker import generate_service_worker
+from split_scripts import split_script
+from audit_image_sizes import audit_image_sizes
+from image_priority import priorities_by_image, site_image_priorities
+from image_server import fit_image, serve_images
+from audit_performance import audit_site, size_summary, write_json_report
+from local_server import serve_site, benchmark_site
+from analyze_critical_path import analyze_site, derive_resource_hints, format_link_tag, format_link_header
+from audit_performance import find_pages
+from build_history import StageTimer, history_report, record_run
+from site_scanner import scan_site
+from stage_scheduler import Stage, print_schedule, run_stages
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Enable large image handling
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
+# Bump when the built-in CSS/JS minifier changes so cached outputs are not reused
+MINIFIER_VERSION = 1
+
+# Text assets that get precompressed .gz/.br siblings
+PRECOMPRESS_EXTENSIONS = ('.html', '.css', '.js', '.svg', '.json', '.xml', '.txt')
+
 """
 AlfaX10 Website Performance Optimization Tool
 ============================================
@@ -26,6 +59,7 @@ Features:
    - Resize large images to improve loading times
    - Add width and height attributes to prevent layout shifts (CLS)
    - Generate HTML tags with proper dimensions and loading attributes
+   - Losslessly optimize PNGs that have to stay PNG (logos, fallbacks)
 
 2. SEO Optimization:
    - Generate JSON-LD structured data for improved search engine visibility
@@ -43,17 +77,74 @@ Author: Created with GitHub Copilot
 Date: June 30, 2025
 """
 
-def convert_to_webp(source_dir, quality=85, resize=None, lossless=False, output_dir=None):
+def webp_output_path(img_path, source_dir, output_dir=None):
+    """
+    Path of the WebP version of an image: next to it, or at the same relative path in output_dir
+
+    The directories of an output_dir path are created.
+    """
+    if not output_dir:
+        return os.path.splitext(img_path)[0] + '.webp'
+    # Keep the folder structure of the source directory
+    rel_path = os.path.relpath(img_path, source_dir)
+    webp_path = os.path.join(output_dir, os.path.splitext(rel_path)[0] + '.webp')
+    os.makedirs(os.path.dirname(webp_path), exist_ok=True)
+    return webp_path
+
+
+def link_or_copy(source_path, dest_path):
+    """Atomically place a hardlink to source_path at dest_path (a copy across filesystems)"""
+    temp_path = temp_path_for(dest_path)
+    try:
+        try:
+            os.link(source_path, temp_path)
+        except OSError:
+            shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, dest_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def convert_to_webp(source_dir, quality=85, resize=None, lossless=None, output_dir=None, report=None, cache=None,
+                    duplicates=None, scan=None, journal=None, on_output=None):
     """
-    Convert all PNG and JPEG images in a directory (and its subdirectories) to WebP format
+    Convert all PNG, JPEG and GIF images in a directory (and its subdirectories) to WebP format
+    
+    Animated GIFs and PNGs become animated WebPs (see animated_webp.py).
     
     Args:
         source_dir (str): Directory to scan for images
         quality (int): Quality of WebP image (0-100)
         resize (tuple): Optional (width, height) to resize images to
-        lossless (bool): Whether to use lossless compression for PNGs
+        lossless (bool): None chooses lossless, near-lossless or lossy per image from its content
+                         (see encoder_selection.py); True forces lossless for PNGs with transparency,
+                         False forces lossy
         output_dir (str): Optional directory to save optimized images (preserves folder structure)
+        report (list): Optional list that receives a machine-readable size entry per converted image
+        cache (ArtifactCache): Artifact cache to consult before encoding (default: shared cache, False to disable)
+        duplicates (dict): Optional duplicate path -> canonical path map (see dedupe_images.duplicate_map); duplicates are not
+                           encoded but get a hardlink or copy of their canonical image's WebP
+        scan (SiteScan): File listing to use instead of scanning source_dir (see site_scanner.py)
+        journal (RunJournal): Journal of finished images to resume from (default: one kept in source_dir
+                              for this call, False to disable; see atomic_output.py)
+        on_output (callable): Optional function called with the path of every WebP file as soon as it is
+                              written, restored or resumed (see stage_scheduler.py)
     """
+    if cache is None:
+        cache = get_default_cache()
+    duplicates = duplicates or {}
+    owns_journal = journal is None
+    if owns_journal:
+        journal = RunJournal(source_dir)
+    
+    # Encoder parameters that determine the output for a given source image
+    cache_params = {'quality': quality, 'resize': list(resize) if resize else None,
+                    'lossless': lossless, 'selection': SELECTION_VERSION, 'pillow': Image.__version__}
+    
+    # Bytes before and after per encoder mode
+    mode_totals = {}
+    
     # Count success and failures
     success_count = 0
     failure_count = 0
@@ -65,77 +156,147 @@ def convert_to_webp(source_dir, quality=85, resize=None, lossless=False, output_
     start_time = time.time()
     
     # List of image extensions to convert
-    image_extensions = ('.png', '.jpg', '.jpeg')
+    image_extensions = ('.png', '.jpg', '.jpeg', '.gif')
 
-    # Walk through all directories
+    # One scan of the site; the output directory is never read back as input
     print("\nScanning for images...\n")
-    for root, dirs, files in os.walk(source_dir):
-        for file in files:
-            # Check if file has supported image extension
-            if file.lower().endswith(image_extensions):
-                img_path = os.path.join(root, file)
-                webp_path = os.path.splitext(img_path)[0] + '.webp'
-                
-                # Determine output path (original location or custom output dir)
-                if output_dir:
-                    # Get relative path from source directory
-                    rel_path = os.path.relpath(img_path, source_dir)
-                    # Create output path maintaining folder structure
-                    webp_path = os.path.join(output_dir, os.path.splitext(rel_path)[0] + '.webp')
-                    # Create directories if they don't exist
-                    os.makedirs(os.path.dirname(webp_path), exist_ok=True)
-                else:
-                    webp_path = os.path.splitext(img_path)[0] + '.webp'
-                
-                # Skip if WebP already exists
-                if os.path.exists(webp_path):
-                    print(f"Skipping {img_path} (WebP already exists)")
-                    skipped_count += 1
-                    continue
-                
-                try:
-                    # Get original file size
-                    original_size = os.path.getsize(img_path)
-                    total_size_before += original_size
-                    
-                    # Open the image
-                    with Image.open(img_path) as img:
-                        # Handle transparency correctly for PNGs
-                        if img.format == 'PNG' and img.mode in ('RGBA', 'LA'):
-                            # Use lossless for PNGs with transparency if specified
-                            use_lossless = lossless
-                        else:
-                            use_lossless = False
-                            
-                            # Convert palette mode to RGB
-                            if img.mode == 'P':
-                                img = img.convert('RGB')
-                        
-                        # Resize if requested or if image is larger than 1920px width
-                        if resize:
-                            img = ImageOps.contain(img, resize, method=Image.LANCZOS)
-                        elif img.width > 1920:
-                            # Auto-resize large images to 1920px width while preserving aspect ratio
-                            new_height = int((1920 / img.width) * img.height)
-                            img = img.resize((1920, new_height), Image.LANCZOS)
-                            print(f"  Auto-resized from {img.width}×{img.height} to 1920×{new_height}")
-                        
-                        # Save as WebP
-                        img.save(webp_path, 'WEBP', quality=quality, lossless=use_lossless)
-                    
-                    # Get new file size
-                    new_size = os.path.getsize(webp_path)
-                    total_size_after += new_size
+    scan = scan or scan_site(source_dir, exclude=[output_dir])
+    # Duplicates whose WebP is copied from their canonical image once that is converted
+    duplicate_outputs = []
+    for img_path in scan.paths(image_extensions):
+        webp_path = webp_output_path(img_path, source_dir, output_dir)
+        
+        # Only the canonical copy of a duplicated image is encoded
+        if os.path.normpath(img_path) in duplicates:
+            duplicate_outputs.append((img_path, webp_path))
+            continue
+        
+        # Converted before an interrupted run was stopped
+        entry = journal.completed('webp', img_path, webp_path) if journal else None
+        if entry is not None:
+            print(f"Skipping {img_path} (converted before the interruption)")
+            scan.add(webp_path)
+            if report is not None and entry:
+                report.append(entry)
+            if on_output:
+                on_output(webp_path)
+            skipped_count += 1
+            continue
+        
+        # Skip if WebP already exists
+        if os.path.exists(webp_path):
+            print(f"Skipping {img_path} (WebP already exists)")
+            skipped_count += 1
+            continue
+        
+        try:
+            item_start = time.time()
+            
+            # Get original file size
+            original_size = os.path.getsize(img_path)
+            total_size_before += original_size
+            
+            # Animations are encoded frame by frame; their cache entries also depend on the frame processing
+            animated = img_path.lower().endswith(ANIMATED_EXTENSIONS) and is_animated(img_path)
+            params = dict(cache_params, animation=ANIMATION_VERSION) if animated else cache_params
+            
+            # Reuse an identical earlier encode from the shared cache
+            cache_key = cache.key(hash_file(img_path), 'webp', params) if cache else None
+            if cache and cache.fetch(cache_key, webp_path):
+                new_size = os.path.getsize(webp_path)
+                total_size_after += new_size
+                scan.add(webp_path)
+                print(f"Restored from cache: {img_path} -> {webp_path}")
+                entry = dict(stage='webp', source=img_path, output=webp_path, cached=True,
+                             seconds=round(time.time() - item_start, 3), **size_summary(original_size, new_size))
+                if report is not None:
+                    report.append(entry)
+                if journal:
+                    journal.record('webp', img_path, webp_path, entry)
+                if on_output:
+                    on_output(webp_path)
+                success_count += 1
+                continue
+            
+            if animated:
+                # All frames with their timing; duplicate frames are merged
+                webp_data, decision = encode_animation(img_path, quality, resize)
+            else:
+                # Open the image
+                with Image.open(img_path) as img:
+                    source_format = img.format
+                    if lossless is None:
+                        encoder_mode = None
+                    elif lossless and img.format == 'PNG' and img.mode in ('RGBA', 'LA'):
+                        # Forced lossless only applies to PNGs with transparency
+                        encoder_mode = 'lossless'
+                    else:
+                        encoder_mode = 'lossy'
                     
-                    # Calculate size reduction
-                    size_reduction = (1 - (new_size / original_size)) * 100
+                    # Resize if requested or if image is larger than 1920px width
+                    resized = fit_image(img, resize)
+                    if not resize and resized is not img:
+                        print(f"  Auto-resized from {img.width}×{img.height} to {resized.width}×{resized.height}")
+                    img = resized
                     
-                    print(f"Converted: {img_path} -> {webp_path}")
-                    print(f"  Size: {original_size/1024:.1f}KB -> {new_size/1024:.1f}KB ({size_reduction:.1f}% reduction)")
-                    success_count += 1
-                except Exception as e:
-                    print(f"Error converting {img_path}: {e}")
-                    failure_count += 1
+                    # Encode as WebP with the mode chosen from the image content
+                    webp_data, decision = encode_webp(img, quality, encoder_mode, lossy_source=source_format == 'JPEG')
+            
+            # Written before it is cached: storing can evict the entry again when the cache is full
+            atomic_write(webp_path, webp_data)
+            if cache:
+                cache.store_bytes(cache_key, webp_data)
+            
+            # Get new file size
+            new_size = os.path.getsize(webp_path)
+            total_size_after += new_size
+            scan.add(webp_path)
+            
+            # Calculate size reduction
+            size_reduction = (1 - (new_size / original_size)) * 100
+            
+            print(f"Converted: {img_path} -> {webp_path}")
+            print(f"  Encoding: {describe_decision(decision)}")
+            print(f"  Size: {original_size/1024:.1f}KB -> {new_size/1024:.1f}KB ({size_reduction:.1f}% reduction)")
+            entry = dict(stage='webp', source=img_path, output=webp_path, mode=decision['mode'],
+                         reason=decision['reason'], settings=decision['params'],
+                         alpha_dropped=decision['drop_alpha'] and decision['stats']['has_alpha'],
+                         seconds=round(time.time() - item_start, 3), **size_summary(original_size, new_size))
+            if report is not None:
+                report.append(entry)
+            if journal:
+                journal.record('webp', img_path, webp_path, entry)
+            if on_output:
+                on_output(webp_path)
+            totals = mode_totals.setdefault(decision['mode'], [0, 0, 0])
+            totals[0] += 1
+            totals[1] += original_size
+            totals[2] += new_size
+            success_count += 1
+        except Exception as e:
+            print(f"Error converting {img_path}: {e}")
+            failure_count += 1
+    
+    # Pages that reference a duplicate still find a WebP next to it, without a second encode
+    for img_path, webp_path in duplicate_outputs:
+        canonical = duplicates[os.path.normpath(img_path)]
+        canonical_webp = canonical if canonical.lower().endswith('.webp') else \
+            webp_output_path(canonical, source_dir, output_dir)
+        if os.path.exists(webp_path):
+            print(f"Skipping {img_path} (WebP already exists)")
+        elif not os.path.exists(canonical_webp):
+            print(f"Skipping {img_path} (duplicate of {canonical}, which has no WebP)")
+        else:
+            link_or_copy(canonical_webp, webp_path)
+            scan.add(webp_path)
+            print(f"Copied: {canonical_webp} -> {webp_path} (duplicate of {canonical})")
+            if on_output:
+                on_output(webp_path)
+        skipped_count += 1
+    
+    # The run completed, so nothing is left to resume
+    if owns_journal:
+        journal.finish()
     
     # Calculate time taken
     elapsed_time = time.time() - start_time
@@ -144,7 +305,7 @@ def convert_to_webp(source_dir, quality=85, resize=None, lossless=False, output_
     print(f"\nConversion complete in {elapsed_time:.1f} seconds!")
     print(f"Successfully converted: {success_count} images")
     print(f"Failed conversions: {failure_count} images")
-    print(f"Skipped (already exist): {skipped_count} images")
+    print(f"Skipped (already exist or duplicates): {skipped_count} images")
     
     if success_count > 0:
         # Calculate total size reduction
@@ -155,6 +316,9 @@ def convert_to_webp(source_dir, quality=85, resize=None, lossless=False, output_
         avg_reduction = total_reduction / success_count
         print(f"Average reduction per image: {avg_reduction:.1f}%")
     
+    for mode, (count, before, after) in sorted(mode_totals.items()):
+        print(f"  {mode}: {count} images, {before/1024:.1f}KB -> {after/1024:.1f}KB ({(before - after)/1024:.1f}KB saved)")
+    
     return success_count, failure_count, skipped_count
 
 def generate_json_ld(site_url="https://www.alfax10.com"):
@@ -347,7 +511,7 @@ def generate_json_ld(site_url="https://www.alfax10.com"):
     
     # Write the HTML file
     output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "structured_data_reference.html")
-    with open(output_path, "w", encoding="utf-8") as f:
+    with atomic_open(output_path, "w", encoding="utf-8") as f:
         f.write(html_output)
     
     print(f"Structured data reference file created: {output_path}")
@@ -356,9 +520,47 @@ def generate_json_ld(site_url="https://www.alfax10.com"):
     
     return output_path
 
-def generate_htaccess():
+def generate_early_hints(source_dir, scan=None):
+    """
+    Build the .htaccess block that sends each page's resource hints as Link headers
+    
+    Servers and CDNs that support 103 Early Hints forward these Link headers
+    before the HTML is ready, so the fetches start during server think-time.
+    """
+    pages = find_pages(source_dir, scan)
+    basenames = [os.path.basename(page) for page in pages]
+    
+    blocks = []
+    for page in pages:
+        name = os.path.basename(page)
+        # <Files> matches by file name only, so skip names used by several pages
+        if basenames.count(name) > 1:
+            continue
+        hints = derive_resource_hints(page, source_dir, early_hints=True)
+        if not hints:
+            continue
+        blocks.append(f'  <Files "{name}">')
+        for hint in hints:
+            blocks.append(f'    Header add Link "{format_link_header(hint)}"')
+        blocks.append('  </Files>')
+    
+    if not blocks:
+        return ""
+    
+    return ("# Resource hints per page (sent as 103 Early Hints where supported)\n"
+            "<IfModule mod_http2.c>\n"
+            "  H2EarlyHints on\n"
+            "</IfModule>\n"
+            "<IfModule mod_headers.c>\n" + "\n".join(blocks) + "\n</IfModule>\n\n")
+
+def generate_htaccess(source_dir=None, scan=None):
     """
     Generate an optimized .htaccess file with performance and security best practices
+    
+    Args:
+        source_dir (str): Optional website directory; its pages are analyzed to add
+                          per-page preload/preconnect Link headers for Early Hints
+        scan (SiteScan): File listing to use instead of scanning source_dir
     """
     htaccess_content = """# AlfaX10 Optimized .htaccess
 # Generated on {date}
@@ -443,6 +645,11 @@ def generate_htaccess():
   <FilesMatch "\\.(ico|pdf|jpg|jpeg|png|webp|gif|svg|js|css|woff|woff2|ttf|otf)$">
     Header set Cache-Control "public, max-age=31536000, immutable"
   </FilesMatch>
+  
+  # The service worker is revalidated on every check so updates reach visitors
+  <Files "sw.js">
+    Header set Cache-Control "no-cache"
+  </Files>
 </IfModule>
 
 # Enable Keep-Alive
@@ -450,15 +657,16 @@ def generate_htaccess():
   Header set Connection keep-alive
 </IfModule>
 
+{early_hints}
 # Protect against malicious requests
 <IfModule mod_rewrite.c>
   RewriteEngine On
-  RewriteCond %{REQUEST_METHOD} ^(HEAD|TRACE|DELETE|TRACK) [NC]
+  RewriteCond %{{REQUEST_METHOD}} ^(HEAD|TRACE|DELETE|TRACK) [NC]
   RewriteRule ^(.*)$ - [F,L]
-  RewriteCond %{HTTP_USER_AGENT} ^$ [OR]
-  RewriteCond %{HTTP_USER_AGENT} (libwww-perl|wget|python|nikto|curl|scan|java|winhttp) [NC,OR]
-  RewriteCond %{HTTP_USER_AGENT} (winhttp|HTTrack|clshttp|archiver|loader|email|harvest|extract|grab|miner) [NC,OR]
-  RewriteCond %{HTTP_USER_AGENT} (netmechanic|analyzer|spam|spider|indexer|phpcrawl|enigma|php|crawl) [NC]
+  RewriteCond %{{HTTP_USER_AGENT}} ^$ [OR]
+  RewriteCond %{{HTTP_USER_AGENT}} (libwww-perl|wget|python|nikto|curl|scan|java|winhttp) [NC,OR]
+  RewriteCond %{{HTTP_USER_AGENT}} (winhttp|HTTrack|clshttp|archiver|loader|email|harvest|extract|grab|miner) [NC,OR]
+  RewriteCond %{{HTTP_USER_AGENT}} (netmechanic|analyzer|spam|spider|indexer|phpcrawl|enigma|php|crawl) [NC]
   RewriteRule ^.* - [F,L]
 </IfModule>
 
@@ -470,11 +678,12 @@ ServerSignature Off
 """
 
     # Format with current date
-    htaccess_content = htaccess_content.format(date=time.strftime("%Y-%m-%d"))
+    early_hints = generate_early_hints(source_dir, scan) if source_dir else ""
+    htaccess_content = htaccess_content.format(date=time.strftime("%Y-%m-%d"), early_hints=early_hints)
     
     # Write .htaccess file
     output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".htaccess")
-    with open(output_path, "w", encoding="utf-8") as f:
+    with atomic_open(output_path, "w", encoding="utf-8") as f:
         f.write(htaccess_content)
     
     print(f".htaccess file created: {output_path}")
@@ -482,61 +691,93 @@ ServerSignature Off
     print("- Browser caching rules for static assets")
     print("- GZIP compression for text and HTML files")
     print("- Security headers (CSP, HSTS, X-Frame-Options)")
+    if early_hints:
+        print("- Per-page preload/preconnect Link headers for 103 Early Hints")
     print("- Protection against malicious requests")
     print("- Performance optimizations")
     
     return output_path
 
-def generate_html_image_tags(source_dir):
+def generate_html_image_tags(source_dir, scan=None, rewrite=False, page_priorities=None, items=None):
     """
     Scan for images and generate HTML tags with proper width and height attributes
+    
+    Args:
+        source_dir (str): Directory to scan for images
+        scan (SiteScan): File listing to use instead of scanning source_dir
+        rewrite (bool): Also write loading/fetchpriority into the <img> tags of the pages
+        page_priorities (dict): Decisions of image_priority.site_image_priorities to use instead of reading the pages
+        items (iterable): Images still being written (e.g. WebP files as they are converted); their tags
+                          are made as they arrive and the reference is written when the iterable ends
     """
     print("\nGenerating HTML image tags with proper dimensions...\n")
     
     # List of image extensions to process
     image_extensions = ('.png', '.jpg', '.jpeg', '.webp')
     
-    # Store image information
-    image_data = []
+    # Image information by path
+    image_data = {}
+    
+    # Images of the site listing (converted WebP files included)
+    scan = scan or scan_site(source_dir)
     
-    # Walk through all directories
-    for root, dirs, files in os.walk(source_dir):
-        for file in files:
-            # Check if file has supported image extension
-            if file.lower().endswith(image_extensions):
-                img_path = os.path.join(root, file)
+    # Lazy, eager or high priority from where each image appears on the pages (see image_priority.py)
+    if page_priorities is None:
+        page_priorities = site_image_priorities(source_dir, scan, rewrite=rewrite)
+        if rewrite:
+            print(f"Loading priorities written into the <img> tags of {len(page_priorities)} pages")
+    priorities = priorities_by_image(page_priorities, source_dir)
+    
+    def add_image(img_path):
+        if img_path in image_data or not img_path.lower().endswith(image_extensions):
+            return
+        
+        # Make path relative to source directory
+        rel_path = os.path.relpath(img_path, source_dir)
+        # Fix path format for web URLs (forward slashes)
+        web_path = rel_path.replace('\\', '/')
+        
+        try:
+            # Open the image to get dimensions
+            with Image.open(img_path) as img:
+                width, height = img.size
+                alt_text = os.path.splitext(os.path.basename(img_path))[0].replace('_', ' ').replace('-', ' ').title()
                 
-                # Make path relative to source directory
-                rel_path = os.path.relpath(img_path, source_dir)
-                # Fix path format for web URLs (forward slashes)
-                web_path = rel_path.replace('\\', '/')
+                # Images no page shows on its first screen are lazy loaded
+                priority, reason = priorities.get(os.path.splitext(os.path.abspath(img_path))[0],
+                                                  ('lazy', 'not above the fold on any page'))
                 
-                try:
-                    # Open the image to get dimensions
-                    with Image.open(img_path) as img:
-                        width, height = img.size
-                        alt_text = os.path.splitext(os.path.basename(img_path))[0].replace('_', ' ').replace('-', ' ').title()
-                        
-                        # Determine if image should be lazy loaded (anything not in first screen)
-                        # Simple heuristic: logo and hero images are not lazy loaded
-                        is_critical = 'logo' in img_path.lower() or 'hero' in img_path.lower()
-                        
-                        # Store the image data
-                        image_data.append({
-                            'path': web_path,
-                            'width': width,
-                            'height': height,
-                            'alt': alt_text,
-                            'is_critical': is_critical
-                        })
-                        
-                except Exception as e:
-                    print(f"Error processing {img_path}: {e}")
+                # Store the image data
+                image_data[img_path] = {
+                    'path': web_path,
+                    'width': width,
+                    'height': height,
+                    'alt': alt_text,
+                    'priority': priority,
+                    'reason': reason
+                }
+                
+        except Exception as e:
+            print(f"Error processing {img_path}: {e}")
+            image_data[img_path] = None
+    
+    # Images already listed, then the ones still being written as they arrive
+    for img_path in scan.paths(image_extensions):
+        add_image(img_path)
+    for img_path in items or ():
+        add_image(img_path)
+    for img_path in scan.paths(image_extensions):
+        add_image(img_path)
+    
+    # Entries in the order of the listing
+    order = {path: index for index, path in enumerate(scan.paths(image_extensions))}
+    image_data = [image_data[path] for path in sorted(image_data, key=lambda path: order.get(path, len(order)))
+                  if image_data[path]]
     
     # Create HTML file with the image tags
     html_output_path = os.path.join(source_dir, 'image_tags_reference.html')
     
-    with open(html_output_path, 'w') as f:
+    with atomic_open(html_output_path, 'w') as f:
         f.write('<!DOCTYPE html>\n<html lang="en">\n<head>\n')
         f.write('    <meta charset="UTF-8">\n')
         f.write('    <meta name="viewport" content="width=device-width, initial-scale=1.0">\n')
@@ -567,12 +808,13 @@ def generate_html_image_tags(source_dir):
             
             # HTML tag for copying
             html_tag = f'<img src="{img["path"]}" alt="{img["alt"]}" width="{img["width"]}" height="{img["height"]}"'
-            if not img["is_critical"]:
+            if img["priority"] == 'lazy':
                 html_tag += ' loading="lazy"'
-            if img["is_critical"]:
+            if img["priority"] == 'high':
                 html_tag += ' fetchpriority="high"'
             html_tag += '>'
             
+            f.write(f'        <p>Loading: {img["priority"]} ({img["reason"]})</p>\n')
             f.write('        <p>HTML Tag:</p>\n')
             f.write(f'        <pre>{html_tag}</pre>\n')
             f.write('    </div>\n\n')
@@ -583,112 +825,142 @@ def generate_html_image_tags(source_dir):
     print(f"This file contains proper image tags for {len(image_data)} images with correct dimensions.")
     print("Use these tags to prevent layout shifts and improve Core Web Vitals.")
 
-def minify_assets(source_dir):
+def minify_assets(source_dir, report=None, cache=None, scan=None, image_sets=True, kinds=('css', 'js', 'html')):
     """
     Create minified versions of CSS and JS files in the provided directory
+    
+    Args:
+        source_dir (str): Directory to scan for CSS and JS files
+        report (list): Optional list that receives a machine-readable size entry per minified file
+        cache (ArtifactCache): Artifact cache to consult before minifying JS and for generated image variants
+                               (default: shared cache, False to disable)
+        scan (SiteScan): File listing to use instead of scanning source_dir
+        image_sets (bool): Rewrite PNG/JPEG background images in CSS to image-set() with their AVIF/WebP
+                           versions and 1x/2x variants (see minify_assets.css_image_set)
+        kinds (tuple): Which of 'css', 'js' and 'html' to minify
     """
-    print("\nMinifying CSS and JS assets...\n")
+    if cache is None:
+        cache = get_default_cache()
+    
+    if 'css' in kinds or 'js' in kinds:
+        print("\nMinifying CSS and JS assets...\n")
     
     css_count = 0
     js_count = 0
     total_original_size = 0
     total_minified_size = 0
     
-    # Walk through directories
-    for root, dirs, files in os.walk(source_dir):
-        for file in files:
-            if file.endswith('.css') and not file.endswith('.min.css'):
-                file_path = os.path.join(root, file)
-                minified_path = os.path.join(root, os.path.splitext(file)[0] + '.min.css')
+    # Minified outputs (.min.css/.min.js) are in the listing but never minified again
+    scan = scan or scan_site(source_dir)
+    for file_path in scan.paths(tuple('.' + kind for kind in kinds if kind in ('css', 'js'))):
+        root, file = os.path.split(file_path)
+        if file.endswith('.css') and not file.endswith('.min.css'):
+            minified_path = os.path.join(root, os.path.splitext(file)[0] + '.min.css')
+            
+            try:
+                # Read original file
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
                 
-                try:
-                    # Read original file
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    # Get original size
-                    original_size = len(content)
-                    total_original_size += original_size
-                    
-                    # Basic CSS minification
-                    # Remove comments
-                    content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
-                    # Remove whitespace
-                    content = re.sub(r'\s+', ' ', content)
-                    # Remove spaces around operators
-                    content = re.sub(r'\s*([{};,:])\s*', r'\1', content)
-                    # Remove unnecessary spaces
-                    content = re.sub(r'\s+', ' ', content)
-                    # Remove leading and trailing whitespace
-                    content = content.strip()
-                    
-                    # Get minified size
-                    minified_size = len(content)
-                    total_minified_size += minified_size
-                    
-                    # Write minified file
-                    with open(minified_path, 'w', encoding='utf-8') as f:
-                        f.write(content)
-                    
-                    # Calculate reduction
-                    reduction = (1 - (minified_size / original_size)) * 100
-                    
-                    print(f"Minified CSS: {file} → {os.path.basename(minified_path)}")
-                    print(f"  Size: {original_size/1024:.1f}KB → {minified_size/1024:.1f}KB ({reduction:.1f}% reduction)")
-                    
-                    css_count += 1
-                    
-                except Exception as e:
-                    print(f"Error minifying {file}: {e}")
+                # Get original size
+                original_size = len(content)
+                total_original_size += original_size
+                
+                # Minify and offer background images as image-set() in one pass over the tokens.
+                # Not cached: the output depends on which WebP/AVIF versions and variants exist.
+                image_set = css_image_set(file_path, source_dir, cache=cache) if image_sets else None
+                content, rewritten = minify_css_content(content, image_set)
+                
+                # Get minified size
+                minified_size = len(content)
+                total_minified_size += minified_size
+                
+                atomic_write(minified_path, content)
+                scan.add(minified_path)
+                
+                # Calculate reduction
+                reduction = (1 - (minified_size / original_size)) * 100
+                
+                print(f"Minified CSS: {file} → {os.path.basename(minified_path)}")
+                print(f"  Size: {original_size/1024:.1f}KB → {minified_size/1024:.1f}KB ({reduction:.1f}% reduction)")
+                if rewritten:
+                    print(f"  Background images offered as image-set(): {rewritten}")
+                if report is not None:
+                    report.append(dict(stage='minify', source=file_path, output=minified_path,
+                                       **size_summary(original_size, minified_size)))
+                
+                css_count += 1
+                
+            except Exception as e:
+                print(f"Error minifying {file}: {e}")
+        
+        elif file.endswith('.js') and not file.endswith('.min.js'):
+            minified_path = os.path.join(root, os.path.splitext(file)[0] + '.min.js')
             
-            elif file.endswith('.js') and not file.endswith('.min.js'):
-                file_path = os.path.join(root, file)
-                minified_path = os.path.join(root, os.path.splitext(file)[0] + '.min.js')
+            try:
+                # Read original file
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
                 
-                try:
-                    # Read original file
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    # Get original size
-                    original_size = len(content)
-                    total_original_size += original_size
-                    
-                    # Basic JS minification
-                    # Remove single-line comments
-                    content = re.sub(r'//.*?\\n', '\\n', content)
-                    # Remove multi-line comments
-                    content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
-                    # Remove whitespace around operators
-                    content = re.sub(r'\s+([=+\-*/&|<>!?:;,(){}\\[\\]])\s+', r'\1', content)
-                    # Collapse multiple whitespace
-                    content = re.sub(r'\s+', ' ', content)
-                    # Remove unnecessary whitespace
-                    content = re.sub(r';\s+', ';', content)
-                    content = re.sub(r'{\s+', '{', content)
-                    content = re.sub(r'\s+}', '}', content)
-                    # Remove leading and trailing whitespace
-                    content = content.strip()
-                    
-                    # Get minified size
-                    minified_size = len(content)
+                # Get original size
+                original_size = len(content)
+                total_original_size += original_size
+                
+                # Reuse an identical earlier minification from the shared cache
+                cache_key = cache.key(hash_bytes(content.encode('utf-8')), 'minify-js',
+                                      {'minifier': MINIFIER_VERSION}) if cache else None
+                if cache and cache.fetch(cache_key, minified_path):
+                    with open(minified_path, 'r', encoding='utf-8') as f:
+                        minified_size = len(f.read())
                     total_minified_size += minified_size
-                    
-                    # Write minified file
-                    with open(minified_path, 'w', encoding='utf-8') as f:
-                        f.write(content)
-                    
-                    # Calculate reduction
-                    reduction = (1 - (minified_size / original_size)) * 100
-                    
-                    print(f"Minified JS: {file} → {os.path.basename(minified_path)}")
-                    print(f"  Size: {original_size/1024:.1f}KB → {minified_size/1024:.1f}KB ({reduction:.1f}% reduction)")
-                    
+                    scan.add(minified_path)
+                    print(f"Restored from cache: {file} → {os.path.basename(minified_path)}")
+                    if report is not None:
+                        report.append(dict(stage='minify', source=file_path, output=minified_path, cached=True,
+                                           **size_summary(original_size, minified_size)))
                     js_count += 1
-                    
-                except Exception as e:
-                    print(f"Error minifying {file}: {e}")
-    
+                    continue
+                
+                # Basic JS minification
+                # Remove single-line comments
+                content = re.sub(r'//.*?\\n', '\\n', content)
+                # Remove multi-line comments
+                content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
+                # Remove whitespace around operators
+                content = re.sub(r'\s+([=+\-*/&|<>!?:;,(){}\\[\\]])\s+', r'\1', content)
+                # Collapse multiple whitespace
+                content = re.sub(r'\s+', ' ', content)
+                # Remove unnecessary whitespace
+                content = re.sub(r';\s+', ';', content)
+                content = re.sub(r'{\s+', '{', content)
+                content = re.sub(r'\s+}', '}', content)
+                # Remove leading and trailing whitespace
+                content = content.strip()
+                
+                # Get minified size
+                minified_size = len(content)
+                total_minified_size += minified_size
+                
+                # Write minified file, then share it through the cache when enabled
+                atomic_write(minified_path, content)
+                if cache:
+                    cache.store_bytes(cache_key, content.encode('utf-8'))
+                scan.add(minified_path)
+                
+                # Calculate reduction
+                reduction = (1 - (minified_size / original_size)) * 100
+                
+                print(f"Minified JS: {file} → {os.path.basename(minified_path)}")
+                print(f"  Size: {original_size/1024:.1f}KB → {minified_size/1024:.1f}KB ({reduction:.1f}% reduction)")
+                if report is not None:
+                    report.append(dict(stage='minify', source=file_path, output=minified_path,
+                                       **size_summary(original_size, minified_size)))
+                
+                js_count += 1
+                
+            except Exception as e:
+                print(f"Error minifying {file}: {e}")
+
     # Print summary
     if css_count > 0 or js_count > 0:
         print(f"\nMinification complete!")
@@ -698,15 +970,129 @@ def minify_assets(source_dir):
         if total_original_size > 0:
             total_reduction = (1 - (total_minified_size / total_original_size)) * 100
             print(f"Total size reduction: {total_original_size/1024:.1f}KB → {total_minified_size/1024:.1f}KB ({total_reduction:.1f}% reduction)")
-    else:
+    elif 'css' in kinds or 'js' in kinds:
         print("No CSS or JS files found to minify.")
     
-    return css_count + js_count
+    # HTML pages keep their names, so they are written to a separate output directory
+    html_count = 0
+    if 'html' in kinds:
+        print()
+        html_count = minify_html_pages(source_dir, report=report, scan=scan)
+    
+    return css_count + js_count + html_count
+
+def precompress_paths(source_dir, scan):
+    """
+    Text files to precompress: those of the site listing and the minified pages
+    
+    The minified pages in HTML_OUTPUT_DIR are what gets deployed, but the site
+    scan skips that directory so it is never read as a source; it is listed here.
+    
+    Returns:
+        list: Paths in listing order, then the minified pages
+    """
+    paths = scan.paths(PRECOMPRESS_EXTENSIONS)
+    for root, dirs, files in os.walk(os.path.join(source_dir, HTML_OUTPUT_DIR)):
+        dirs.sort()
+        paths += [os.path.join(root, file) for file in sorted(files) if file.lower().endswith(PRECOMPRESS_EXTENSIONS)]
+    return paths
 
-def generate_seo_meta_tags(site_title, site_description, site_url):
+def precompress_assets(source_dir, report=None, cache=None, scan=None, output_pages=True):
+    """
+    Write precompressed .gz (and .br, if brotli is installed) siblings for text assets
+    
+    Servers serve these instead of compressing on every request. Up-to-date
+    siblings are skipped and identical content is taken from the artifact cache.
+    
+    Args:
+        source_dir (str): Directory to scan for HTML, CSS, JS and other text files
+        report (list): Optional list that receives a machine-readable size entry per compressed file
+        cache (ArtifactCache): Artifact cache to consult before compressing (default: shared cache, False to disable)
+        scan (SiteScan): File listing to use instead of scanning source_dir
+        output_pages (bool): Also compress the minified pages in HTML_OUTPUT_DIR (see precompress_paths);
+                             off when the listing already holds the files to compress, e.g. a batch task
+    """
+    if cache is None:
+        cache = get_default_cache()
+    
+    print("\nPrecompressing text assets...\n")
+    scan = scan or scan_site(source_dir)
+    
+    encoders = {'.gz': ('gzip', lambda data: gzip.compress(data, compresslevel=9, mtime=0))}
+    if brotli is not None:
+        encoders['.br'] = ('br', lambda data: brotli.compress(data, quality=11))
+    else:
+        print("brotli is not installed (pip install brotli); writing .gz files only.")
+    
+    compressed_count = 0
+    skipped_count = 0
+    total_original_size = 0
+    total_compressed_size = 0
+    
+    for file_path in precompress_paths(source_dir, scan) if output_pages else scan.paths(PRECOMPRESS_EXTENSIONS):
+        source_mtime = os.path.getmtime(file_path)
+        data = None
+        
+        for suffix, (encoding, compress) in encoders.items():
+            output_path = file_path + suffix
+            if os.path.exists(output_path) and os.path.getmtime(output_path) >= source_mtime:
+                skipped_count += 1
+                continue
+            
+            try:
+                if data is None:
+                    with open(file_path, 'rb') as f:
+                        data = f.read()
+                
+                cache_key = cache.key(hash_bytes(data), encoding) if cache else None
+                if not (cache and cache.fetch(cache_key, output_path)):
+                    compressed = compress(data)
+                    atomic_write(output_path, compressed)
+                    if cache:
+                        cache.store_bytes(cache_key, compressed)
+                
+                compressed_size = os.path.getsize(output_path)
+                total_original_size += len(data)
+                total_compressed_size += compressed_size
+                compressed_count += 1
+                if report is not None:
+                    report.append(dict(stage=encoding, source=file_path, output=output_path,
+                                       **size_summary(len(data), compressed_size)))
+            except Exception as e:
+                print(f"Error compressing {file_path}: {e}")
+
+    if compressed_count > 0:
+        total_reduction = (1 - (total_compressed_size / total_original_size)) * 100 if total_original_size else 0
+        print(f"Precompressed {compressed_count} files ({skipped_count} already up to date)")
+        print(f"Total size: {total_original_size/1024:.1f}KB → {total_compressed_size/1024:.1f}KB ({total_reduction:.1f}% reduction)")
+    else:
+        print(f"No text assets needed compression ({skipped_count} already up to date).")
+    
+    return compressed_count
+
+def generate_seo_meta_tags(site_title, site_description, site_url, source_dir=None, page="index.html"):
     """
     Generate SEO meta tags for the website
+    
+    Args:
+        site_title (str): Page title
+        site_description (str): Page description
+        site_url (str): Public site URL without trailing slash
+        source_dir (str): Optional website directory; resource hints are derived from its page
+        page (str): Page (relative to source_dir) whose LCP image, render-blocking CSS
+                    and origins determine the preload and preconnect tags
     """
+    # Resource hints derived from the page's critical request chain
+    hints = []
+    page_path = os.path.join(source_dir, page) if source_dir else None
+    if page_path and os.path.exists(page_path):
+        hints = derive_resource_hints(page_path, source_dir)
+    else:
+        print("No page to analyze; preload and preconnect tags are omitted.")
+    
+    preconnect_tags = "\n".join(format_link_tag(hint, site_url) for hint in hints if hint['rel'] == 'preconnect')
+    preload_tags = "\n".join(format_link_tag(hint, site_url) for hint in hints if hint['rel'] != 'preconnect')
+    
     seo_tags = f"""<!-- SEO Meta Tags -->
 <meta name="title" content="{site_title}">
 <meta name="description" content="{site_description}">
@@ -729,18 +1115,15 @@ def generate_seo_meta_tags(site_title, site_description, site_url):
 <link rel="canonical" href="{site_url}">
 
 <!-- Preconnect to required origins -->
-<link rel="preconnect" href="https://fonts.googleapis.com">
-<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
+{preconnect_tags}
 
 <!-- Preload critical assets -->
-<link rel="preload" href="{site_url}/assets/hero1.webp" as="image" fetchpriority="high">
-<link rel="preload" href="{site_url}/styles.css" as="style">
-<link rel="preload" href="{site_url}/scripts.js" as="script">
+{preload_tags}
 """
     
     # Write to a file
     output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "seo_meta_tags.html")
-    with open(output_path, "w", encoding="utf-8") as f:
+    with atomic_open(output_path, "w", encoding="utf-8") as f:
         f.write(seo_tags)
     
     print(f"\nSEO meta tags file created: {output_path}")
@@ -748,6 +1131,97 @@ def generate_seo_meta_tags(site_title, site_description, site_url):
     
     return output_path
 
+def full_optimization_stages(source_dir, quality=85, site_url="https://www.alfax10.com", resize=(1920, 1080),
+                             lossless=None, output_dir=None, report=None, scan=None, journal=None):
+    """
+    The steps of the full optimization as stages with the resources they read and write
+    
+    The list is in the order of a sequential run; stage_scheduler.run_stages() runs the
+    stages that do not touch each other's files at the same time. Image tags are made
+    for each WebP file as soon as it is converted.
+    
+    Args:
+        source_dir (str): Website root directory
+        quality (int): Quality of WebP images and variants (1-100)
+        site_url (str): Public site URL without trailing slash
+        resize (tuple): Box large images are fitted into
+        lossless (bool): Encoder mode of the WebP conversion (None chooses per image)
+        output_dir (str): Optional directory for the WebP images
+        report (list): List that receives the size entries of every step
+        scan (SiteScan): Listing of the site shared by all stages
+        journal (RunJournal): Journal of the WebP conversion
+    
+    Returns:
+        list: stage_scheduler.Stage objects
+    """
+    site_title = "AlfaX10 - Mobile Apps, Websites & Custom Software"
+    site_description = "AlfaX10 specializes in mobile app development, website design, and custom software solutions"
+    scripts_path = os.path.join(source_dir, "scripts.js")
+    
+    # Results handed from one stage to the next
+    shared = {}
+    
+    def webp(emit=None):
+        duplicate_groups = dedupe_images(source_dir, scan=scan)
+        convert_to_webp(source_dir, quality, resize, lossless, output_dir, report=report,
+                        duplicates=duplicate_map(duplicate_groups), scan=scan, journal=journal, on_output=emit)
+    
+    def image_priorities():
+        shared['priorities'] = site_image_priorities(source_dir, scan, rewrite=True)
+        print(f"Loading priorities written into the <img> tags of {len(shared['priorities'])} pages")
+    
+    def html_tags(items=None):
+        generate_html_image_tags(source_dir, scan=scan, page_priorities=shared['priorities'], items=items)
+    
+    def split_scripts():
+        if os.path.exists(scripts_path):
+            split_script(scripts_path, rewrite_pages=True, site_dir=source_dir, scan=scan)
+        else:
+            print("No scripts.js to split.")
+    
+    stages = [Stage('webp', webp, inputs=('images',), outputs=('webp',))]
+    if output_dir:
+        # Tags for the images in the output directory, which is scanned once the conversion is done
+        stages.append(Stage('html-tags', lambda: generate_html_image_tags(output_dir),
+                            inputs=('webp',), outputs=('tags-reference',)))
+    else:
+        stages += [
+            Stage('image-priorities', image_priorities, inputs=('pages', 'images'), outputs=('pages', 'priorities')),
+            Stage('html-tags', html_tags, inputs=('priorities', 'images', 'webp'), outputs=('tags-reference',),
+                  stream='webp'),
+        ]
+    stages += [
+        # JSON-LD, .htaccess and the SEO tags are written next to these scripts, i.e. in the site root
+        Stage('json-ld', lambda: generate_json_ld(site_url), outputs=('structured-data',)),
+        Stage('htaccess', lambda: generate_htaccess(source_dir, scan=scan), inputs=('pages',), outputs=('htaccess',)),
+        Stage('minify-css', lambda: minify_assets(source_dir, report=report, scan=scan, kinds=('css',)),
+              inputs=('css', 'images', 'webp'), outputs=('min-css', 'variants')),
+        Stage('minify-js', lambda: minify_assets(source_dir, report=report, scan=scan, kinds=('js',)),
+              inputs=('js',), outputs=('min-js',)),
+        Stage('seo', lambda: generate_seo_meta_tags(site_title, site_description, site_url, source_dir),
+              inputs=('pages',), outputs=('seo-tags',)),
+        # Rewrites PNGs in place, so it waits for every stage reading the images
+        Stage('png', lambda: optimize_png(source_dir, report=report, scan=scan),
+              inputs=('images',), outputs=('images',)),
+        Stage('smart-crop', lambda: generate_variants(source_dir, quality=quality, report=report, scan=scan),
+              inputs=('images', 'webp'), outputs=('variants',)),
+        Stage('image-sizes', lambda: audit_image_sizes(source_dir, generate=True, rewrite=True, quality=quality,
+                                                       scan=scan),
+              inputs=('pages', 'images', 'webp'), outputs=('pages', 'variants')),
+        Stage('split-scripts', split_scripts, inputs=('js', 'pages'), outputs=('js', 'pages')),
+        Stage('service-worker', lambda: generate_service_worker(source_dir, scan=scan),
+              inputs=('pages', 'images', 'webp', 'variants', 'css', 'js', 'min-css', 'min-js'),
+              outputs=('pages', 'service-worker')),
+        # After every stage that rewrites pages, so the deployable copies in dist/ have all their changes
+        Stage('minify-html', lambda: minify_assets(source_dir, report=report, scan=scan, kinds=('html',)),
+              inputs=('pages', 'tags-reference', 'structured-data', 'seo-tags'), outputs=('min-pages',)),
+        Stage('precompress', lambda: precompress_assets(source_dir, report=report, scan=scan),
+              inputs=('pages', 'css', 'js', 'min-css', 'min-js', 'min-pages', 'tags-reference', 'structured-data',
+                      'seo-tags', 'service-worker'),
+              outputs=('precompressed',)),
+    ]
+    return stages
+
 if __name__ == "__main__":
     source_directory = "."  # Current directory
     
@@ -755,12 +1229,25 @@ if __name__ == "__main__":
     print("=====================================")
     print("🚀 This tool helps optimize your website for better performance, SEO, and PageSpeed scores")
     print("✅ Features:")
-    print("  - Convert PNG/JPEG to WebP format for better compression")
+    print("  - Convert PNG/JPEG/GIF to WebP format for better compression, keeping animations")
     print("  - Generate HTML image tags with proper width/height attributes")
     print("  - Auto-resize large images to improve loading times")
+    print("  - Losslessly optimize PNG files that must stay PNG")
+    print("  - Generate smart-cropped card and thumbnail variants at their display size")
+    print("  - Find duplicate images and encode each picture only once")
+    print("  - Audit page weight and request counts against performance budgets")
+    print("  - Serve the site locally with the .htaccess caching/compression rules and load-test it")
+    print("  - Resize and encode images on demand with a memory and disk cache")
+    print("  - Analyze critical request chains and estimate FCP/LCP per page")
     print("  - Create JSON-LD structured data for better SEO")
     print("  - Generate optimized .htaccess with caching and security headers")
-    print("  - Minify CSS and JS files for faster loading")
+    print("  - Minify CSS, JS and HTML files for faster loading")
+    print("  - Precompress text assets (gzip/brotli) for the server")
+    print("  - Generate a service worker that precaches the site for repeat visits")
+    print("  - Split scripts.js into a small critical chunk and lazily loaded chunks")
+    print("  - Find images shipped far larger than displayed and generate right-sized variants")
+    print("  - Keep a history of every run and flag size and speed regressions")
+    print("  - Run independent steps of the full optimization concurrently and report the critical path")
     print("  - Create SEO meta tags for better search engine visibility")
     print()
     
@@ -776,14 +1263,26 @@ if __name__ == "__main__":
         print("2. Generate HTML image tags reference")
         print("3. Generate JSON-LD structured data (SEO)")
         print("4. Generate .htaccess file with performance and security settings")
-        print("5. Minify CSS and JS files")
+        print("5. Minify CSS, JS and HTML files")
         print("6. Generate SEO meta tags")
-        print("7. Full website optimization (options 1, 2, 3, 4, 5)")
-        print("8. Exit")
+        print("7. Full website optimization (options 1, 2, 3, 4, 5, 8, 13, 14, 15, 16, 17, 18)")
+        print("8. Optimize PNG files (lossless)")
+        print("9. Audit page weight against performance budgets")
+        print("10. Serve site locally with .htaccess rules")
+        print("11. Load-test local server (cold and warm cache)")
+        print("12. Analyze critical request chains (FCP/LCP estimates)")
+        print("13. Precompress text assets (gzip/brotli)")
+        print("14. Generate smart-cropped card/thumbnail variants")
+        print("15. Find duplicate images")
+        print("16. Generate service worker (precache for repeat visits)")
+        print("17. Split scripts.js into critical and lazy chunks")
+        print("18. Audit oversized images and generate right-sized variants")
+        print("19. Show build history and regressions")
+        print("20. Exit")
         
-        choice = input("\nEnter your choice (1-8): ")
+        choice = input("\nEnter your choice (1-20): ")
         
-        if choice == "8":
+        if choice == "20":
             print("Exiting program.")
             sys.exit(0)
             
@@ -813,22 +1312,30 @@ if __name__ == "__main__":
                 except ValueError:
                     print("Invalid dimensions, images will not be resized")
             
-            # Ask about lossless mode for PNGs
-            lossless_option = input("Use lossless compression for PNGs? (y/n, default: n): ").lower()
-            lossless = lossless_option == 'y'
+            # Encoder mode: chosen per image unless the user overrides it
+            lossless = None
+            auto_option = input("Choose lossless, near-lossless or lossy per image from its content? (y/n, default: y): ").lower()
+            if auto_option == 'n':
+                lossless_option = input("Use lossless compression for PNGs? (y/n, default: n): ").lower()
+                lossless = lossless_option == 'y'
             
             # Confirm before proceeding
             print(f"\nAbout to scan '{os.path.abspath(source_directory)}' for images to convert.")
             print(f"Quality: {quality}")
             if resize_dimensions:
                 print(f"Resize to maximum dimensions: {resize_dimensions}")
-            print(f"Lossless compression for PNGs: {'Yes' if lossless else 'No'}")
+            print(f"Lossless compression for PNGs: {'Per image' if lossless is None else 'Yes' if lossless else 'No'}")
             
             confirm = input("\nProceed with conversion? (y/n): ")
             
             if confirm.lower() == 'y':
                 try:
-                    convert_to_webp(source_directory, quality, resize_dimensions, lossless)
+                    size_report = []
+                    timer = StageTimer()
+                    timer.start('webp')
+                    convert_to_webp(source_directory, quality, resize_dimensions, lossless, report=size_report)
+                    timer.stop()
+                    record_run(source_directory, size_report, timer.seconds, 'convert', timer.start_time)
                 except KeyboardInterrupt:
                     print("\nOperation cancelled by user.")
                     continue
@@ -839,7 +1346,8 @@ if __name__ == "__main__":
         if choice in ["2", "4"]:  # Generate HTML tags
             try:
                 print("\nGenerating HTML image tags reference file...")
-                generate_html_image_tags(source_directory)
+                rewrite = input("Write loading/fetchpriority into the pages' <img> tags? (y/n, default: n): ").lower() == 'y'
+                generate_html_image_tags(source_directory, rewrite=rewrite)
             except KeyboardInterrupt:
                 print("\nOperation cancelled by user.")
                 continue
@@ -880,7 +1388,7 @@ if __name__ == "__main__":
         if choice == "4":
             try:
                 print("\nGenerating .htaccess file with performance and security settings...")
-                output_path = generate_htaccess()
+                output_path = generate_htaccess(source_directory)
                 
                 print("\nReview the .htaccess file and upload it to your web server.")
                 print("WARNING: Test the .htaccess file in a staging environment first to ensure it doesn't break your site.")
@@ -891,8 +1399,13 @@ if __name__ == "__main__":
         # Handle CSS and JS minification
         if choice == "5":
             try:
-                print("\nMinifying CSS and JS files...")
-                minify_assets(source_directory)
+                print("\nMinifying CSS, JS and HTML files...")
+                size_report = []
+                timer = StageTimer()
+                timer.start('minify')
+                minify_assets(source_directory, report=size_report)
+                timer.stop()
+                record_run(source_directory, size_report, timer.seconds, 'minify', timer.start_time)
             except KeyboardInterrupt:
                 print("\nOperation cancelled by user.")
                 continue
@@ -914,7 +1427,7 @@ if __name__ == "__main__":
                 
                 # Generate SEO meta tags
                 print("\nGenerating SEO meta tags...")
-                output_path = generate_seo_meta_tags(site_title, site_description, site_url)
+                output_path = generate_seo_meta_tags(site_title, site_description, site_url, source_directory)
                 
                 # Ask if the user wants to open the file
                 open_file = input("\nWould you like to open the generated file? (y/n): ").lower()
@@ -932,12 +1445,159 @@ if __name__ == "__main__":
                 print(f"\nAn error occurred while generating SEO meta tags: {e}")
                 continue
         
+        # Handle lossless PNG optimization
+        if choice == "8":
+            try:
+                print("\nOptimizing PNG files...")
+                optimize_png(source_directory)
+            except KeyboardInterrupt:
+                print("\nOperation cancelled by user.")
+                continue
+            except Exception as e:
+                print(f"\nAn error occurred while optimizing PNG files: {e}")
+                continue
+        
+        # Handle performance budget audit
+        if choice == "9":
+            try:
+                print("\nAuditing page weight against performance budgets...")
+                audit_site(source_directory)
+            except KeyboardInterrupt:
+                print("\nOperation cancelled by user.")
+                continue
+            except Exception as e:
+                print(f"\nAn error occurred while auditing pages: {e}")
+                continue
+        
+        # Handle local server
+        if choice == "10":
+            try:
+                port = int(input("\nEnter port (default 8000): ") or "8000")
+                resize_images = input("Resize images on demand under /img/ (e.g. /img/assets/about.png?w=640&fmt=webp)? (y/n, default: n): ").lower() == 'y'
+                if resize_images:
+                    asyncio.run(serve_images(source_directory, port=port))
+                else:
+                    asyncio.run(serve_site(source_directory, port=port))
+            except KeyboardInterrupt:
+                print("\nServer stopped.")
+            except Exception as e:
+                print(f"\nAn error occurred while serving the site: {e}")
+                continue
+        
+        # Handle local load test
+        if choice == "11":
+            try:
+                connections = int(input("\nEnter number of keep-alive connections (default 8): ") or "8")
+                total_requests = int(input("Enter number of requests per run (default 1000): ") or "1000")
+                asyncio.run(benchmark_site(source_directory, connections, total_requests))
+            except KeyboardInterrupt:
+                print("\nOperation cancelled by user.")
+                continue
+            except Exception as e:
+                print(f"\nAn error occurred during the load test: {e}")
+                continue
+        
+        # Handle critical request chain analysis
+        if choice == "12":
+            try:
+                print("\nAnalyzing critical request chains...")
+                analyze_site(source_directory)
+            except KeyboardInterrupt:
+                print("\nOperation cancelled by user.")
+                continue
+            except Exception as e:
+                print(f"\nAn error occurred while analyzing pages: {e}")
+                continue
+        
+        # Handle precompression
+        if choice == "13":
+            try:
+                precompress_assets(source_directory)
+            except KeyboardInterrupt:
+                print("\nOperation cancelled by user.")
+                continue
+            except Exception as e:
+                print(f"\nAn error occurred while precompressing assets: {e}")
+                continue
+        
+        # Handle smart-cropped variants
+        if choice == "14":
+            try:
+                quality = int(input("\nEnter WebP quality (1-100, default 85): ") or "85")
+                quality = max(1, min(100, quality))
+                generate_variants(source_directory, quality=quality)
+            except KeyboardInterrupt:
+                print("\nOperation cancelled by user.")
+                continue
+            except Exception as e:
+                print(f"\nAn error occurred while generating variants: {e}")
+                continue
+        
+        # Handle duplicate image detection
+        if choice == "15":
+            try:
+                rewrite = input("\nPoint references to duplicates at the canonical image? (y/n, default: n): ").lower() == 'y'
+                dedupe_images(source_directory, rewrite=rewrite)
+            except KeyboardInterrupt:
+                print("\nOperation cancelled by user.")
+                continue
+            except Exception as e:
+                print(f"\nAn error occurred while looking for duplicate images: {e}")
+                continue
+        
+        # Handle service worker generation
+        if choice == "16":
+            try:
+                generate_service_worker(source_directory)
+            except KeyboardInterrupt:
+                print("\nOperation cancelled by user.")
+                continue
+            except Exception as e:
+                print(f"\nAn error occurred while generating the service worker: {e}")
+                continue
+        
+        # Handle code splitting
+        if choice == "17":
+            try:
+                rewrite = input("\nPoint pages at the critical chunk where safe? (y/n, default: y): ").lower() != 'n'
+                split_script(os.path.join(source_directory, "scripts.js"), rewrite_pages=rewrite, site_dir=source_directory)
+            except KeyboardInterrupt:
+                print("\nOperation cancelled by user.")
+                continue
+            except Exception as e:
+                print(f"\nAn error occurred while splitting scripts.js: {e}")
+                continue
+        
+        # Handle oversized image audit
+        if choice == "18":
+            try:
+                generate = input("\nGenerate right-sized variants for oversized images? (y/n, default: y): ").lower() != 'n'
+                rewrite = generate and input("Offer the variants through srcset on the pages? (y/n, default: n): ").lower() == 'y'
+                audit_image_sizes(source_directory, generate=generate, rewrite=rewrite)
+            except KeyboardInterrupt:
+                print("\nOperation cancelled by user.")
+                continue
+            except Exception as e:
+                print(f"\nAn error occurred while auditing image sizes: {e}")
+                continue
+        
+        # Handle build history report
+        if choice == "19":
+            try:
+                history_report(source_directory)
+            except KeyboardInterrupt:
+                print("\nOperation cancelled by user.")
+                continue
+            except Exception as e:
+                print(f"\nAn error occurred while reading the build history: {e}")
+                continue
+        
         # Handle full website optimization
         if choice == "7":
             try:
                 print("\n🚀 Starting full website optimization...\n")
                 
-                # 1. Ask for quality and resize settings for WebP conversion
+                # Ask for quality and resize settings for WebP conversion
                 quality = int(input("\nEnter WebP quality (1-100, default 85): ") or "85")
                 quality = max(1, min(100, quality))
                 
@@ -953,38 +1613,57 @@ if __name__ == "__main__":
                 resize_dimensions = (1920, 1080)
                 print("\nLarge images will be resized to maximum width of 1920px while preserving aspect ratio.")
                 
-                # Ask about lossless mode for PNGs
-                lossless = True
-                print("PNGs with transparency will use lossless compression to preserve quality.")
+                # Lossless, near-lossless or lossy is chosen per image from its content
+                lossless = None
+                print("Each image is encoded lossless, near-lossless or lossy depending on its content.")
                 
-                # 2. Convert images to WebP
-                print("\nStep 1: Converting images to WebP format...")
-                convert_to_webp(source_directory, quality, resize_dimensions, lossless, output_directory)
+                # Per-file size entries from every step, written as a JSON report at the end
+                size_report = []
                 
-                # 3. Generate HTML image tags reference
-                print("\nStep 2: Generating HTML image tags with proper dimensions...")
-                generate_html_image_tags(source_directory if not output_directory else output_directory)
+                # Images finished by an interrupted earlier run are not converted again
+                run_journal = RunJournal(source_directory)
                 
-                # 4. Generate JSON-LD structured data
-                print("\nStep 3: Generating JSON-LD structured data...")
+                # Asked before any step starts, so the steps can run without stopping for input
                 site_url = input("\nEnter your website URL (default: https://www.alfax10.com): ").strip() or "https://www.alfax10.com"
                 if site_url.endswith("/"):
                     site_url = site_url[:-1]
-                generate_json_ld(site_url)
                 
-                # 5. Generate .htaccess file
-                print("\nStep 4: Generating .htaccess file...")
-                generate_htaccess()
+                # Time per step, recorded in the build history with the size report
+                timer = StageTimer()
+                timer.start('scan')
                 
-                # 6. Minify CSS and JS files
-                print("\nStep 5: Minifying CSS and JS files...")
-                minify_assets(source_directory)
+                # Every step works from one listing of the site; outputs are registered as they are written
+                site_scan = scan_site(source_directory, exclude=[output_directory])
+                print(f"\nScanned {len(site_scan)} files in {site_scan.directory_count} directories "
+                      f"in {site_scan.elapsed:.2f} seconds ({site_scan.ignored_count} ignored entries skipped)")
+                timer.stop()
                 
-                # 7. Generate SEO meta tags
-                print("\nStep 6: Generating SEO meta tags...")
-                site_title = "AlfaX10 - Mobile Apps, Websites & Custom Software"
-                site_description = "AlfaX10 specializes in mobile app development, website design, and custom software solutions"
-                generate_seo_meta_tags(site_title, site_description, site_url)
+                # Steps that do not touch each other's files run at the same time (see stage_scheduler.py)
+                print("\nRunning the optimization steps; independent steps run concurrently...\n")
+                stages = full_optimization_stages(source_directory, quality, site_url, resize_dimensions, lossless,
+                                                  output_directory, report=size_report, scan=site_scan,
+                                                  journal=run_journal)
+                stage_results = run_stages(stages)
+                print_schedule(stages, stage_results)
+                for name, result in stage_results.items():
+                    if result['start'] is not None:
+                        timer.seconds[name] = result['seconds']
+                
+                cache = get_default_cache()
+                if cache:
+                    cache_stats = cache.stats()
+                    print(f"\nArtifact cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                          f"{cache_stats['entries']} entries ({cache_stats['bytes']/1024/1024:.1f}MB)")
+                
+                report_path = write_json_report(os.path.join(source_directory, "optimization_report.json"), size_report)
+                print(f"\nSize report written to: {report_path}")
+                record_run(source_directory, size_report, timer.seconds, 'full', timer.start_time)
+                failed = [name for name, result in stage_results.items() if result['status'] != 'done']
+                if failed:
+                    # Finished images stay in the journal so the next run resumes from them
+                    print(f"\n⚠️  Steps not completed: {', '.join(failed)}")
+                else:
+                    run_journal.finish()
                 
                 print("\n✅ Full website optimization complete!")
                 print("Review the generated files and implement the changes on your website.")
@@ -996,11 +1675,11 @@ if __name__ == "__main__":
                 print(f"\nAn error occurred during full website optimization: {e}")
                 continue
         
-        if choice not in ["1", "2", "3", "4", "5", "6", "7", "8"]:
-            print("\nInvalid choice. Please enter a number between 1 and 8.")
+        if choice not in ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "11", "12", "13", "14", "15", "16", "17", "18", "19", "20"]:
+            print("\nInvalid choice. Please enter a number between 1 and 20.")
             
         # Ask if user wants to perform another operation
-        if choice in ["1", "2", "3", "4", "5", "6", "7"]:
+        if choice in ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "11", "12", "13", "14", "15", "16", "17", "18", "19"]:
             another = input("\nWould you like to perform another operation? (y/n): ")
             if another.lower() != 'y':
                 print("\nThank you for using the AlfaX10 Website Optimization Tool!")
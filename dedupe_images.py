@@ -0,0 +1,358 @@
+# Duplicate Image Detection Script
+# This script requires Python, Pillow and NumPy
+# Install with: pip install Pillow numpy
+
+import os
+import re
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from artifact_cache import hash_file
+from atomic_output import atomic_open
+from audit_image_sizes import is_sized_variant
+from audit_performance import GENERATED_PAGES, write_json_report
+from site_scanner import scan_site
+from smart_crop import is_variant
+
+"""
+Finds exact and near-duplicate images across the site (the same picture
+saved in two folders, or once as PNG and once as WebP) so each one is
+encoded and deployed only once.
+
+Every image gets a SHA-256 content hash and two 64-bit perceptual hashes:
+a difference hash (dHash, brightness gradients of a 9x8 copy) and a DCT
+hash (pHash, low frequencies of a 32x32 copy). Perceptual hashes are
+indexed in a BK-tree so near-duplicates are found without comparing every
+pair. Each group gets a canonical file (the largest version); references
+to the other copies can be pointed at it.
+"""
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif')
+
+# Extensions convert_to_webp() turns into a .webp sibling
+CONVERTIBLE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+# Text files whose image references can be rewritten
+REFERENCE_EXTENSIONS = ('.html', '.css', '.js')
+
+# Maximum Hamming distances (out of 64 bits) for two images to count as the same picture
+PHASH_THRESHOLD = 6
+DHASH_THRESHOLD = 10
+
+REPORT_NAME = 'duplicate_images_report.json'
+
+
+def _bits_to_int(bits):
+    """Pack a boolean array into an integer"""
+    return int(''.join('1' if bit else '0' for bit in bits.ravel()), 2)
+
+
+def dhash(img, hash_size=8):
+    """
+    Difference hash: whether each pixel is brighter than its right neighbour
+
+    Args:
+        img (PIL.Image): Source image
+        hash_size (int): Hash is hash_size * hash_size bits
+    """
+    small = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II matrix"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def phash(img, hash_size=8):
+    """
+    DCT hash: whether each low-frequency coefficient is above the median
+
+    Args:
+        img (PIL.Image): Source image
+        hash_size (int): Hash is hash_size * hash_size bits
+    """
+    small = img.convert('L').resize((32, 32), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.float64)
+    dct = _DCT_32 @ pixels @ _DCT_32.T
+    low = dct[:hash_size, :hash_size].ravel()
+    # The DC term only reflects overall brightness
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def hamming(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree for Hamming-distance range queries over hashes
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        """Insert a hash with an attached item"""
+        if self.root is None:
+            self.root = (value, item, {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, item, {})
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Return (distance, item) for every stored hash within radius of value"""
+        if self.root is None:
+            return []
+        matches = []
+        stack = [self.root]
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                matches.append((distance, item))
+            # Triangle inequality: only subtrees in [d - r, d + r] can match
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return matches
+
+
+def find_images(source_dir, scan=None):
+    """Return all image files below source_dir (from scan when given), except generated variants"""
+    scan = scan or scan_site(source_dir)
+    # Crops and right-sized copies resemble their master on purpose
+    return [path for path in scan.paths(IMAGE_EXTENSIONS) if not (is_variant(path) or is_sized_variant(path))]
+
+
+def _canonical_sort_key(entry):
+    """Largest image first, then lossless sources over WebP, then the shortest path"""
+    width, height = entry['dimensions']
+    return (-(width * height), entry['path'].lower().endswith('.webp'), len(entry['path']), entry['path'])
+
+
+def find_duplicates(source_dir, phash_threshold=PHASH_THRESHOLD, dhash_threshold=DHASH_THRESHOLD, scan=None):
+    """
+    Group exact and near-duplicate images
+
+    Args:
+        source_dir (str): Directory to scan for images
+        phash_threshold (int): Maximum pHash Hamming distance for near-duplicates
+        dhash_threshold (int): Maximum dHash Hamming distance for near-duplicates
+        scan (SiteScan): File listing to use instead of scanning source_dir
+
+    Returns:
+        tuple: (list of groups, list of files that could not be hashed)
+    """
+    entries = []
+    unreadable = []
+    for path in find_images(source_dir, scan):
+        if os.path.getsize(path) == 0:
+            unreadable.append({'path': path, 'error': 'empty file'})
+            continue
+        try:
+            with Image.open(path) as img:
+                img = ImageOps.exif_transpose(img)
+                # Flatten transparency onto white so hashes follow what is displayed
+                if 'A' in img.getbands() or 'transparency' in img.info:
+                    rgba = img.convert('RGBA')
+                    img = Image.new('RGB', rgba.size, 'white')
+                    img.paste(rgba, mask=rgba.getchannel('A'))
+                entries.append({
+                    'path': path,
+                    'sha256': hash_file(path),
+                    'dhash': dhash(img),
+                    'phash': phash(img),
+                    'dimensions': img.size,
+                    'bytes': os.path.getsize(path),
+                })
+        except Exception as e:
+            unreadable.append({'path': path, 'error': str(e)})
+
+    # Union-find over entry indexes
+    parent = list(range(len(entries)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    def union(a, b):
+        parent[find(a)] = find(b)
+
+    tree = BKTree()
+    for index, entry in enumerate(entries):
+        for distance, other in tree.search(entry['phash'], phash_threshold):
+            if entries[other]['sha256'] == entry['sha256'] or \
+                    hamming(entries[other]['dhash'], entry['dhash']) <= dhash_threshold:
+                union(index, other)
+        tree.add(entry['phash'], index)
+
+    clusters = {}
+    for index in range(len(entries)):
+        clusters.setdefault(find(index), []).append(entries[index])
+
+    groups = []
+    for members in clusters.values():
+        if len(members) < 2:
+            continue
+        members.sort(key=_canonical_sort_key)
+        canonical = members[0]
+        groups.append({
+            'canonical': canonical['path'],
+            'exact': len({member['sha256'] for member in members}) == 1,
+            'duplicates': [{
+                'path': member['path'],
+                'exact': member['sha256'] == canonical['sha256'],
+                'phash_distance': hamming(member['phash'], canonical['phash']),
+                'dhash_distance': hamming(member['dhash'], canonical['dhash']),
+                'dimensions': list(member['dimensions']),
+                'bytes': member['bytes'],
+            } for member in members[1:]],
+        })
+
+    groups.sort(key=lambda group: group['canonical'])
+    return groups, unreadable
+
+
+def duplicate_map(groups):
+    """Map every duplicate path to its canonical path"""
+    return {os.path.normpath(duplicate['path']): os.path.normpath(group['canonical'])
+            for group in groups for duplicate in group['duplicates']}
+
+
+def _reference_map(groups):
+    """Duplicate file -> canonical file, including the WebP siblings convert_to_webp() creates"""
+    mapping = {}
+    for duplicate, canonical in duplicate_map(groups).items():
+        mapping[duplicate] = canonical
+        duplicate_stem, duplicate_ext = os.path.splitext(duplicate)
+        canonical_stem, canonical_ext = os.path.splitext(canonical)
+        if duplicate_ext.lower() in CONVERTIBLE_EXTENSIONS:
+            canonical_webp = canonical if canonical_ext.lower() == '.webp' else canonical_stem + '.webp'
+            if canonical_ext.lower() in CONVERTIBLE_EXTENSIONS + ('.webp',):
+                mapping[duplicate_stem + '.webp'] = canonical_webp
+    return mapping
+
+
+def rewrite_references(source_dir, groups, scan=None):
+    """
+    Point HTML, CSS and JS references to duplicate images at their canonical file
+
+    Args:
+        source_dir (str): Website root directory
+        groups (list): Groups returned by find_duplicates()
+        scan (SiteScan): File listing to use instead of scanning source_dir
+
+    Returns:
+        int: Number of references rewritten
+    """
+    mapping = _reference_map(groups)
+    if not mapping:
+        return 0
+
+    scan = scan or scan_site(source_dir)
+    rewritten = 0
+    for file_path in scan.paths(REFERENCE_EXTENSIONS):
+        if os.path.basename(file_path) in GENERATED_PAGES:
+            continue
+        root = os.path.dirname(file_path)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        # Both page-relative and site-root-relative spellings of each duplicate
+        replacements = {}
+        for duplicate, canonical in mapping.items():
+            relative = os.path.relpath(duplicate, root).replace(os.sep, '/')
+            absolute = '/' + os.path.relpath(duplicate, source_dir).replace(os.sep, '/')
+            replacements[relative] = os.path.relpath(canonical, root).replace(os.sep, '/')
+            replacements[absolute] = '/' + os.path.relpath(canonical, source_dir).replace(os.sep, '/')
+
+        pattern = re.compile(r'(?<=["\'(=\s,])(' + '|'.join(
+            re.escape(reference) for reference in sorted(replacements, key=len, reverse=True)
+        ) + r')(?=["\')\s?#,])')
+        new_content, count = pattern.subn(lambda match: replacements[match.group(1)], content)
+
+        if count:
+            with atomic_open(file_path, 'w', encoding='utf-8') as f:
+                f.write(new_content)
+            print(f"Rewrote {count} image references in {file_path}")
+            rewritten += count
+
+    return rewritten
+
+
+def dedupe_images(source_dir, rewrite=False, report_path=None, scan=None):
+    """
+    Find duplicate images, report each group and optionally rewrite references
+
+    Args:
+        source_dir (str): Website root directory
+        rewrite (bool): Point references to duplicates at the canonical file
+        report_path (str): Where to write the JSON report (default: duplicate_images_report.json in source_dir)
+        scan (SiteScan): File listing to use instead of scanning source_dir
+
+    Returns:
+        list: Duplicate groups
+    """
+    print("\nHashing images...\n")
+    start_time = time.time()
+    scan = scan or scan_site(source_dir)
+    groups, unreadable = find_duplicates(source_dir, scan=scan)
+
+    for group in groups:
+        kind = "exact duplicates" if group['exact'] else "near-duplicates"
+        print(f"{group['canonical']} ({kind}):")
+        for duplicate in group['duplicates']:
+            match = "identical" if duplicate['exact'] else \
+                f"pHash distance {duplicate['phash_distance']}, dHash distance {duplicate['dhash_distance']}"
+            print(f"  - {duplicate['path']} ({duplicate['bytes']/1024:.1f}KB, {match})")
+
+    for entry in unreadable:
+        print(f"Skipped {entry['path']} ({entry['error']})")
+
+    duplicate_bytes = sum(duplicate['bytes'] for group in groups for duplicate in group['duplicates'])
+    print(f"\nFound {len(groups)} duplicate groups in {time.time() - start_time:.1f} seconds")
+    if groups:
+        print(f"Duplicates account for {duplicate_bytes/1024:.1f}KB of source images")
+
+    report_path = report_path or os.path.join(source_dir, REPORT_NAME)
+    write_json_report(report_path, {'groups': groups, 'unreadable': unreadable, 'duplicate_bytes': duplicate_bytes})
+    print(f"Report written to: {report_path}")
+
+    if rewrite and groups:
+        rewritten = rewrite_references(source_dir, groups, scan)
+        print(f"Rewrote {rewritten} references to canonical images")
+
+    return groups
+
+
+if __name__ == "__main__":
+    print("Duplicate Image Finder")
+    print("======================")
+
+    directory = input("Enter website directory path (press Enter for current directory): ") or "."
+
+    if os.path.isdir(directory):
+        rewrite = input("Point references to duplicates at the canonical image? (y/n, default: n): ").lower() == 'y'
+        dedupe_images(directory, rewrite=rewrite)
+    else:
+        print(f"Error: '{directory}' is not a valid directory.")
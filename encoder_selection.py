@@ -0,0 +1,294 @@
+# WebP Encoder Selection Script
+# This script requires Python, Pillow and NumPy
+# Install with: pip install Pillow numpy
+
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+"""
+Chooses how each image is encoded to WebP from what it contains.
+
+A handful of NumPy statistics describe the pixels: the number of distinct
+colors, the share of neighbouring pixels that are identical (flat areas),
+the density of luminance edges, the density of saturated color edges and
+whether the alpha channel is used at all. From these the image is encoded
+as:
+
+- lossless: logos, icons and flat graphics with few colors, and
+  transparent images that are almost entirely flat (logos with
+  anti-aliased edges), where lossy artifacts around edges are visible;
+- near-lossless: screenshots and illustrations with large flat areas but
+  many colors (gradients, anti-aliasing). The low bits of pixels away from
+  edges are rounded off before a lossless encode, so edges and text stay
+  exact while smooth areas compress better;
+- lossy: photos, with method 6 and an alpha quality that depends on
+  whether the transparency is a hard cut-out or soft.
+
+An alpha channel that is fully opaque is dropped before encoding. Lossless
+and near-lossless are only kept while they stay within a size ratio of a
+lossy encode of the same pixels, and sources that are already lossy (JPEG)
+are never encoded losslessly, since that would only preserve their
+artifacts at a higher cost.
+
+Pillow does not expose libwebp's near_lossless and use_sharp_yuv options,
+so near-lossless is done by the preprocessing above, and photos with many
+saturated color edges (where sharp YUV would avoid chroma bleeding) get a
+slightly higher quality instead.
+"""
+
+# Bump when the thresholds or encoder settings change so cached encodes are not reused
+SELECTION_VERSION = 2
+
+# Pixels sampled for the color count on large images
+MAX_SAMPLED_PIXELS = 1_000_000
+
+# Images with at most this many colors are palette graphics
+PALETTE_COLORS = 256
+
+# Flat graphics: at most this many colors and at least this share of identical neighbours
+GRAPHIC_COLORS = 4096
+GRAPHIC_FLAT_FRACTION = 0.5
+
+# Logos: transparent images with at least this share of identical neighbours, whatever their color count
+# (anti-aliased edges against the transparency add thousands of colors)
+LOGO_FLAT_FRACTION = 0.85
+
+# Screenshots and illustrations: many colors but at least this share of identical neighbours
+NEAR_LOSSLESS_FLAT_FRACTION = 0.3
+
+# Low bits rounded off in smooth areas for near-lossless (libwebp's near_lossless=60 is about 2 bits)
+NEAR_LOSSLESS_BITS = 2
+
+# Luminance difference (0-255) between neighbours that counts as an edge
+EDGE_THRESHOLD = 32
+
+# Share of pixels on saturated color edges above which a photo gets the sharp-YUV quality boost
+CHROMA_EDGE_FRACTION = 0.02
+SHARP_YUV_QUALITY_BOOST = 5
+
+# Soft transparency (shadows, feathered edges) is encoded with this alpha quality
+SOFT_ALPHA_QUALITY = 90
+
+# Above this many pixels lossy encodes use method 5 instead of 6 to bound encoding time
+LARGE_IMAGE_PIXELS = 4_000_000
+
+# Above this many pixels lossless encodes use a lower effort (lossless method 6 is very slow)
+LARGE_LOSSLESS_PIXELS = 1_000_000
+
+# Lossless and near-lossless results larger than this multiple of the lossy result are replaced by it.
+# Logos and flat graphics get a wide margin: lossy artifacts on their edges are visible even when smaller
+LOSSLESS_MAX_RATIO = 4.0
+NEAR_LOSSLESS_MAX_RATIO = 1.5
+
+
+def image_statistics(img):
+    """
+    Compute the content statistics used to choose the encoder
+
+    Args:
+        img (PIL.Image): Image to analyze
+
+    Returns:
+        dict: Color count, flat and edge fractions and alpha usage
+    """
+    has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+    rgba = np.asarray(img.convert('RGBA'))
+    alpha = rgba[..., 3]
+    alpha_used = bool(alpha.min() < 255)
+    alpha_binary = bool(np.isin(alpha, (0, 255)).all()) if alpha_used else True
+
+    # Distinct RGBA values, counted on an evenly strided sample of large images
+    packed = rgba.view(np.uint32).reshape(-1)
+    if packed.size > MAX_SAMPLED_PIXELS:
+        packed = packed[::packed.size // MAX_SAMPLED_PIXELS + 1]
+    unique_colors = int(np.unique(packed).size)
+
+    # Identical horizontal and vertical neighbours
+    pixels = rgba.view(np.uint32)[..., 0]
+    same_x = pixels[:, 1:] == pixels[:, :-1]
+    same_y = pixels[1:, :] == pixels[:-1, :]
+    pairs = same_x.size + same_y.size
+    flat_fraction = float((same_x.sum() + same_y.sum()) / pairs) if pairs else 1.0
+
+    # Luminance edges, and edges between saturated colors where 4:2:0 chroma subsampling bleeds
+    rgb = rgba[..., :3].astype(np.int32)
+    luma = (rgb @ np.array([77, 150, 29], dtype=np.int32)) >> 8
+    edges = np.zeros(luma.shape, dtype=bool)
+    edges[:, 1:] |= np.abs(luma[:, 1:] - luma[:, :-1]) > EDGE_THRESHOLD
+    edges[1:, :] |= np.abs(luma[1:, :] - luma[:-1, :]) > EDGE_THRESHOLD
+    saturated = (rgb.max(axis=2) - rgb.min(axis=2)) > 96
+    visible = alpha > 0
+
+    return {
+        'pixels': int(luma.size),
+        'has_alpha': has_alpha,
+        'alpha_used': alpha_used,
+        'alpha_binary': alpha_binary,
+        'unique_colors': unique_colors,
+        'flat_fraction': round(flat_fraction, 4),
+        'edge_density': round(float((edges & visible).mean()), 4),
+        'chroma_edge_density': round(float((edges & saturated & visible).mean()), 4),
+    }
+
+
+def lossy_params(stats, quality=85):
+    """Pillow save parameters for a lossy encode of an image with the given statistics"""
+    return {
+        'lossless': False,
+        'quality': quality,
+        'method': 6 if stats['pixels'] <= LARGE_IMAGE_PIXELS else 5,
+        # Hard cut-outs compress to almost nothing losslessly; soft alpha tolerates loss
+        'alpha_quality': 100 if stats['alpha_binary'] else SOFT_ALPHA_QUALITY,
+    }
+
+
+def lossless_params(stats):
+    """Pillow save parameters for a lossless encode; quality is the compression effort"""
+    if stats['pixels'] <= LARGE_LOSSLESS_PIXELS:
+        return {'lossless': True, 'quality': 100, 'method': 6}
+    return {'lossless': True, 'quality': 80, 'method': 4}
+
+
+def choose_encoding(stats, quality=85, lossy_source=False):
+    """
+    Choose the encoder mode and settings from image statistics
+
+    Args:
+        stats (dict): Statistics returned by image_statistics()
+        quality (int): Quality for lossy encodes (0-100)
+        lossy_source (bool): The pixels come from a lossy format such as JPEG
+
+    Returns:
+        dict: mode ('lossless', 'near-lossless' or 'lossy'), reason, and the Pillow save parameters
+    """
+    colors = stats['unique_colors']
+    flat = stats['flat_fraction']
+
+    if lossy_source:
+        mode, reason = 'lossy', f"lossy source, {colors} colors"
+    elif colors <= PALETTE_COLORS:
+        mode, reason = 'lossless', f"palette graphic, {colors} colors"
+    elif colors <= GRAPHIC_COLORS and flat >= GRAPHIC_FLAT_FRACTION:
+        mode, reason = 'lossless', f"flat graphic, {colors} colors, {flat:.0%} flat"
+    elif stats['alpha_used'] and flat >= LOGO_FLAT_FRACTION:
+        mode, reason = 'lossless', f"logo, {colors} colors, {flat:.0%} flat on transparency"
+    elif flat >= NEAR_LOSSLESS_FLAT_FRACTION:
+        mode, reason = 'near-lossless', f"screenshot or illustration, {colors} colors, {flat:.0%} flat"
+    else:
+        mode, reason = 'lossy', f"photographic, {colors} colors, {flat:.0%} flat"
+
+    if mode != 'lossy':
+        params = lossless_params(stats)
+    else:
+        # Stands in for libwebp's sharp YUV, which Pillow does not expose
+        if stats['chroma_edge_density'] > CHROMA_EDGE_FRACTION:
+            quality = min(100, quality + SHARP_YUV_QUALITY_BOOST)
+            reason += ", saturated color edges"
+        params = lossy_params(stats, quality)
+
+    return {
+        'mode': mode,
+        'reason': reason,
+        'drop_alpha': not stats['alpha_used'],
+        'params': params,
+    }
+
+
+def near_lossless(img, bits=NEAR_LOSSLESS_BITS):
+    """
+    Round the low bits of pixels away from edges so a lossless encode compresses better
+
+    Args:
+        img (PIL.Image): RGB or RGBA image
+        bits (int): Number of low bits rounded off in smooth areas
+    """
+    pixels = np.asarray(img).astype(np.int16)
+    rgb = pixels[..., :3]
+
+    # A pixel is kept exact when any neighbour differs by more than the rounding step
+    step = 1 << bits
+    diff = np.zeros(rgb.shape[:2], dtype=np.int16)
+    diff[:, 1:] = np.maximum(diff[:, 1:], np.abs(rgb[:, 1:] - rgb[:, :-1]).max(axis=2))
+    diff[:, :-1] = np.maximum(diff[:, :-1], np.abs(rgb[:, 1:] - rgb[:, :-1]).max(axis=2))
+    diff[1:, :] = np.maximum(diff[1:, :], np.abs(rgb[1:, :] - rgb[:-1, :]).max(axis=2))
+    diff[:-1, :] = np.maximum(diff[:-1, :], np.abs(rgb[1:, :] - rgb[:-1, :]).max(axis=2))
+    smooth = diff <= step
+
+    rounded = np.clip(((rgb + step // 2) >> bits) << bits, 0, 255)
+    pixels[..., :3] = np.where(smooth[..., None], rounded, rgb)
+    return Image.fromarray(pixels.astype(np.uint8), img.mode)
+
+
+def _encode(img, params):
+    buffer = io.BytesIO()
+    img.save(buffer, 'WEBP', **params)
+    return buffer.getvalue()
+
+
+def encode_webp(img, quality=85, mode=None, lossy_source=False):
+    """
+    Encode an image to WebP with the mode chosen from its content
+
+    Args:
+        img (PIL.Image): Image to encode
+        quality (int): Quality for lossy encodes (0-100)
+        mode (str): Force 'lossless' or 'lossy' instead of choosing per image
+        lossy_source (bool): The pixels were decoded from a lossy format such as JPEG
+
+    Returns:
+        tuple: (WebP bytes, decision dict with mode, reason, settings and statistics)
+    """
+    stats = image_statistics(img)
+    decision = choose_encoding(stats, quality, lossy_source)
+    if mode == 'lossless' and decision['mode'] == 'lossy':
+        decision.update(mode='lossless', reason='lossless requested', params=lossless_params(stats))
+    elif mode == 'lossy' and decision['mode'] != 'lossy':
+        decision.update(mode='lossy', reason='lossy requested', params=lossy_params(stats, quality))
+    decision['stats'] = stats
+
+    img = img.convert('RGB' if decision['drop_alpha'] else 'RGBA')
+    data = _encode(near_lossless(img) if decision['mode'] == 'near-lossless' else img, decision['params'])
+
+    # Lossless only pays off while it stays close to the lossy size
+    if mode is None and decision['mode'] != 'lossy':
+        fallback_params = lossy_params(stats, quality)
+        lossy = _encode(img, fallback_params)
+        limit = LOSSLESS_MAX_RATIO if decision['mode'] == 'lossless' else NEAR_LOSSLESS_MAX_RATIO
+        if len(data) > len(lossy) * limit:
+            decision.update(mode='lossy', params=fallback_params,
+                            reason=f"{decision['reason']}, but {decision['mode']} was "
+                                   f"{len(data) / len(lossy):.1f}x the lossy size")
+            data = lossy
+
+    return data, decision
+
+
+def describe_decision(decision):
+    """One-line summary of an encoder decision for console output"""
+    params = decision['params']
+    settings = f"method {params['method']}"
+    if not params['lossless']:
+        settings = f"quality {params['quality']}, {settings}"
+        if not decision['drop_alpha']:
+            settings += f", alpha quality {params['alpha_quality']}"
+    alpha = ", unused alpha dropped" if decision['drop_alpha'] and decision['stats']['has_alpha'] else ""
+    return f"{decision['mode']} ({decision['reason']}; {settings}{alpha})"
+
+
+if __name__ == "__main__":
+    print("WebP Encoder Selection")
+    print("======================")
+
+    path = input("Enter image path: ").strip()
+
+    if os.path.isfile(path):
+        with Image.open(path) as source:
+            data, result = encode_webp(source, lossy_source=source.format == 'JPEG')
+        print(f"\nStatistics: {result['stats']}")
+        print(f"Encoding: {describe_decision(result)}")
+        print(f"Size: {os.path.getsize(path)/1024:.1f}KB -> {len(data)/1024:.1f}KB")
+    else:
+        print(f"Error: '{path}' is not a file.")
@@ -0,0 +1,310 @@
+# Image Loading Priority Script
+# This script requires Python and Pillow
+# Install with: pip install Pillow
+
+import os
+import re
+from html.parser import HTMLParser
+
+from analyze_critical_path import MIN_LCP_IMAGE_AREA, image_dimensions
+from atomic_output import atomic_open
+from audit_image_sizes import VIEWPORT_WIDTH, rendered_width
+from audit_performance import find_pages, resolve_url
+
+"""
+Decides per page which images load eagerly, which one gets
+fetchpriority="high" and which are lazy-loaded, from the structure of the
+page rather than from file names.
+
+The <img> tags of a page are read in document order. The vertical position
+of each image is estimated by adding up the rendered heights of the images
+before it, taken from width/height/sizes attributes or, when the page does
+not declare a size, from the image file scaled to a 1440px wide viewport,
+plus a rough line count for the paragraphs and headings before it. An image
+is above the fold when it sits inside <header> or a hero section (an
+element whose class or id mentions hero, banner or masthead), or when the
+content before it adds up to less than one viewport height. Images in
+<footer> are always below the fold.
+
+Of the images above the fold, the one with the largest rendered area (at
+least 150×150) is the page's LCP candidate and the only one to get
+fetchpriority="high"; the others load eagerly at default priority. Header
+images (logos, icons) are site chrome and never the candidate, since their
+size is usually set by CSS. All images below the fold get loading="lazy". Images in <noscript> and
+<template> are not rendered and keep their attributes.
+"""
+
+# Height of the first screen in CSS pixels (desktop viewport of 1440×900)
+FOLD_HEIGHT = 900
+
+# Rendered height assumed for images whose size cannot be determined
+DEFAULT_IMAGE_HEIGHT = 150
+
+# Text blocks counted towards the page height, at this many characters per line and pixels per line
+TEXT_BLOCK_TAGS = ('p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'figcaption', 'dd')
+CHARACTERS_PER_LINE = 120
+LINE_HEIGHT = 24
+
+# Class or id words that mark a hero section
+HERO_PATTERN = re.compile(r'hero|banner|masthead', re.IGNORECASE)
+
+# Elements whose images are never rendered
+HIDDEN_TAGS = ('noscript', 'template')
+
+# Priorities from most to least urgent
+PRIORITY_ORDER = ('high', 'eager', 'lazy')
+
+LOADING_ATTRIBUTES = re.compile(
+    r'\s+(?:loading|fetchpriority)(?:\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s"\'=<>`]+))?(?=[\s/>])', re.IGNORECASE)
+
+
+class ImageLayoutParser(HTMLParser):
+    """Collects the <img> tags of a page in document order with their offsets and containing sections"""
+
+    def __init__(self, content):
+        super().__init__(convert_charrefs=True)
+        self.images = []
+        # Open header/hero/footer, text block and hidden elements: [tag, nesting depth of that tag name, kind]
+        self._open = []
+        # Characters of paragraph and heading text before the current position
+        self._text_lines = 0
+        self._line_starts = [0] + [match.end() for match in re.finditer('\n', content)]
+
+    def _section_kind(self, tag, attrs):
+        if tag in HIDDEN_TAGS:
+            return 'hidden'
+        if tag in ('header', 'footer'):
+            return tag
+        if tag in TEXT_BLOCK_TAGS:
+            return 'text'
+        marker = f"{attrs.get('class') or ''} {attrs.get('id') or ''}"
+        if HERO_PATTERN.search(marker):
+            return 'hero'
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'img':
+            line, column = self.getpos()
+            start = self._line_starts[line - 1] + column
+            raw = self.get_starttag_text()
+            kinds = {entry[2] for entry in self._open}
+            self.images.append({'attrs': attrs, 'start': start, 'end': start + len(raw), 'raw': raw,
+                                'text_height': self._text_lines * LINE_HEIGHT, 'hidden': 'hidden' in kinds,
+                                'in_header': 'header' in kinds, 'in_hero': 'hero' in kinds,
+                                'in_footer': 'footer' in kinds})
+            return
+
+        for entry in self._open:
+            if entry[0] == tag:
+                entry[1] += 1
+        kind = self._section_kind(tag, attrs)
+        if kind:
+            self._open.append([tag, 1, kind])
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closed elements never contain anything
+        if tag == 'img':
+            self.handle_starttag(tag, attrs)
+
+    def handle_data(self, data):
+        kinds = {entry[2] for entry in self._open}
+        text = ' '.join(data.split())
+        if text and 'text' in kinds and not kinds & {'hidden', 'header', 'footer'}:
+            self._text_lines += -(-len(text) // CHARACTERS_PER_LINE)
+
+    def handle_endtag(self, tag):
+        for entry in self._open:
+            if entry[0] == tag:
+                entry[1] -= 1
+        self._open = [entry for entry in self._open if entry[1] > 0]
+
+
+def _rendered_size(attrs, image_path):
+    """Estimated rendered (width, height) of an <img> in CSS pixels"""
+    intrinsic = image_dimensions(image_path) if image_path and os.path.exists(image_path) else None
+    width = rendered_width(attrs, intrinsic or (0, 0))
+    if width is None:
+        width = intrinsic[0] if intrinsic else None
+    width = min(width, VIEWPORT_WIDTH) if width else None
+
+    # The aspect ratio declared by the page wins over the file's
+    try:
+        declared = (float(attrs['width']), float(attrs['height']))
+    except (KeyError, ValueError):
+        declared = None
+    if width and declared and declared[0]:
+        height = width * declared[1] / declared[0]
+    elif width and intrinsic and intrinsic[0]:
+        height = width * intrinsic[1] / intrinsic[0]
+    else:
+        height = None
+    return width or 0, height or DEFAULT_IMAGE_HEIGHT
+
+
+def page_image_priorities(page_path, site_dir, content=None):
+    """
+    Decide the loading priority of every image on a page
+
+    Args:
+        page_path (str): HTML page
+        site_dir (str): Website root directory
+        content (str): Page content if already read
+
+    Returns:
+        list: One dict per <img> in document order with url, path, estimated top and size,
+              priority ('high', 'eager', 'lazy' or None for unrendered images) and the reason
+    """
+    if content is None:
+        with open(page_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    parser = ImageLayoutParser(content)
+    parser.feed(content)
+    parser.close()
+
+    image_height = 0.0
+    images = []
+    for image in parser.images:
+        url = image['attrs'].get('src') or ''
+        path, _ = resolve_url(url, page_path, site_dir) if url else (None, False)
+        top = image_height + image['text_height']
+        entry = dict(image, url=url, path=path, top=round(top), priority=None, reason='not rendered')
+        if image['hidden']:
+            images.append(entry)
+            continue
+
+        width, height = _rendered_size(image['attrs'], path)
+        entry.update(width=round(width), height=round(height), area=width * height)
+        if image['in_footer']:
+            entry.update(priority='lazy', reason='in footer')
+        elif image['in_header'] or image['in_hero']:
+            entry.update(priority='eager', reason=f"in {'header' if image['in_header'] else 'hero section'}")
+        elif top < FOLD_HEIGHT:
+            entry.update(priority='eager', reason=f"about {round(top)}px from the top")
+        else:
+            entry.update(priority='lazy', reason=f"below the fold (about {round(top)}px from the top)")
+        image_height += height
+        images.append(entry)
+
+    # The largest image on the first screen is the likely LCP element
+    candidates = [entry for entry in images if entry['priority'] == 'eager' and not entry['in_header']
+                  and entry['area'] >= MIN_LCP_IMAGE_AREA]
+    if candidates:
+        lcp = max(candidates, key=lambda entry: (entry['area'], -entry['start']))
+        lcp.update(priority='high', reason=f"LCP candidate, {lcp['reason']}")
+    return images
+
+
+def set_loading_attributes(tag, priority):
+    """Return an <img> tag with loading/fetchpriority set for a priority"""
+    tag = LOADING_ATTRIBUTES.sub('', tag)
+    if priority == 'lazy':
+        extra = ' loading="lazy"'
+    elif priority == 'high':
+        extra = ' fetchpriority="high"'
+    else:
+        return tag
+    end = re.search(r'\s*/?>$', tag)
+    return tag[:end.start()] + extra + tag[end.start():]
+
+
+def apply_image_priorities(page_path, site_dir):
+    """
+    Write the loading priorities into the <img> tags of a page
+
+    The page is only written when a tag changed.
+
+    Returns:
+        list: The decisions of page_image_priorities()
+    """
+    with open(page_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    images = page_image_priorities(page_path, site_dir, content)
+
+    parts = []
+    position = 0
+    for image in images:
+        if image['priority'] is None:
+            continue
+        tag = set_loading_attributes(image['raw'], image['priority'])
+        if tag != image['raw']:
+            parts.append(content[position:image['start']])
+            parts.append(tag)
+            position = image['end']
+    if parts:
+        parts.append(content[position:])
+        with atomic_open(page_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(parts))
+    return images
+
+
+def site_image_priorities(site_dir, scan=None, rewrite=False):
+    """
+    Decide the image loading priorities of every page of a site
+
+    Args:
+        site_dir (str): Website root directory
+        scan (SiteScan): File listing to use instead of scanning site_dir
+        rewrite (bool): Write the priorities into the pages' <img> tags
+
+    Returns:
+        dict: Page path -> list of image decisions
+    """
+    results = {}
+    for page in find_pages(site_dir, scan):
+        try:
+            if rewrite:
+                results[page] = apply_image_priorities(page, site_dir)
+            else:
+                results[page] = page_image_priorities(page, site_dir)
+        except Exception as e:
+            print(f"Error reading {page}: {e}")
+    return results
+
+
+def priorities_by_image(results, site_dir):
+    """
+    Most urgent priority of each image file over all pages
+
+    WebP and other versions of an image share the entry of its path without extension.
+
+    Returns:
+        dict: Image path without extension -> (priority, reason)
+    """
+    priorities = {}
+    for page, images in results.items():
+        for image in images:
+            if not image['priority'] or not image['path']:
+                continue
+            key = os.path.splitext(os.path.abspath(image['path']))[0]
+            current = priorities.get(key)
+            if current is None or PRIORITY_ORDER.index(image['priority']) < PRIORITY_ORDER.index(current[0]):
+                priorities[key] = (image['priority'], f"{image['reason']} on {os.path.relpath(page, site_dir)}")
+    return priorities
+
+
+def print_priorities(results, site_dir):
+    """Print the decisions per page"""
+    for page, images in results.items():
+        rendered = [image for image in images if image['priority']]
+        if not rendered:
+            continue
+        lazy = sum(1 for image in rendered if image['priority'] == 'lazy')
+        print(f"\n{os.path.relpath(page, site_dir)}: {len(rendered)} images, {lazy} lazy-loaded")
+        for image in rendered:
+            if image['priority'] != 'lazy':
+                label = 'fetchpriority=high' if image['priority'] == 'high' else 'eager'
+                print(f"  {label:<18} {image['url']} ({image['reason']})")
+
+
+if __name__ == "__main__":
+    print("Image Loading Priority")
+    print("======================")
+
+    directory = input("Enter website directory path (press Enter for current directory): ") or "."
+
+    if os.path.isdir(directory):
+        rewrite = input("Write loading/fetchpriority into the pages? (y/n, default: n): ").lower() == 'y'
+        print_priorities(site_image_priorities(directory, rewrite=rewrite), directory)
+    else:
+        print(f"Error: '{directory}' is not a valid directory.")
@@ -0,0 +1,562 @@
+# On-Demand Image Server Script
+# This script requires Python, Pillow and NumPy
+# Install with: pip install Pillow numpy
+
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, quote
+
+from PIL import Image, ImageOps, ImageFile, UnidentifiedImageError
+
+from artifact_cache import DEFAULT_CACHE_DIR, ArtifactCache, hash_bytes, hash_file
+from encoder_selection import SELECTION_VERSION, encode_webp
+from local_server import StaticServer, etag_matches, print_load_result, run_load
+from site_scanner import scan_site
+
+"""
+Resizes and encodes images when they are requested instead of
+pre-generating every width and format.
+
+The library part is the decode, resize and encode logic of the WebP
+conversion: fit_image() scales a decoded image the way convert_to_webp()
+does, and render_image() turns a source file into one variant (width,
+format, quality).
+
+The server part serves the site like local_server.py and answers
+
+    /img/assets/about.png?w=640&fmt=webp&q=80
+
+with the resized and encoded variant. fmt is webp, avif (when Pillow can
+encode it), jpeg, png or auto (the default), which picks AVIF or WebP from
+the Accept header and falls back to the source format. Widths are never
+upscaled. Each variant is rendered once in a pool of worker processes;
+identical requests that arrive while it is being rendered wait for the same
+render instead of starting their own. A source that cannot be decoded or
+encoded is not rendered again until it changes. Rendered variants are kept in a
+two-level LRU cache: a memory cache for the hottest variants and the
+shared artifact cache format on disk (in its own directory with its own size
+cap), so a restarted server does not render everything again.
+
+Counters for memory and disk hits, renders, coalesced requests and errors,
+the hit rate and latency percentiles are served as JSON at /_image-stats
+and printed when the server stops. Behind Apache the server can take the
+/img/ prefix with mod_proxy:
+
+    ProxyPass /img/ http://127.0.0.1:8001/img/
+"""
+
+# Images are capped at this width unless a width is requested (as in convert_to_webp())
+MAX_IMAGE_WIDTH = 1920
+
+# Largest width that can be requested
+MAX_REQUEST_WIDTH = 4096
+
+# Source images the server resizes
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# Output formats and their content types
+FORMAT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+# Pillow builds without libavif cannot encode AVIF
+AVIF_SUPPORTED = '.avif' in Image.registered_extensions()
+
+DEFAULT_PREFIX = '/img/'
+STATS_PATH = '/_image-stats'
+
+# Cache size limits
+MEMORY_CACHE_BYTES = 64 * 1024 * 1024
+DISK_CACHE_BYTES = 512 * 1024 * 1024
+
+# Latency samples kept for the percentiles
+LATENCY_SAMPLES = 10000
+
+# Variants remembered as failed, oldest dropped first
+MAX_FAILURES = 1024
+
+# Widths requested per image by the load test
+BENCH_WIDTHS = (320, 640, 1280)
+
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+
+def fit_image(img, resize=None, width=None):
+    """
+    Scale a decoded image for the web
+
+    Args:
+        img (PIL.Image): Decoded image
+        resize (tuple): Fit into this (width, height) box, keeping the aspect ratio
+        width (int): Scale to this width, never upscaling
+
+    Without resize or width, images wider than MAX_IMAGE_WIDTH are scaled down to it.
+
+    Returns:
+        PIL.Image: The scaled image (img itself when nothing changes)
+    """
+    if resize:
+        return ImageOps.contain(img, resize, method=Image.LANCZOS)
+    target = min(width or MAX_IMAGE_WIDTH, img.width)
+    if target >= img.width:
+        return img
+    return img.resize((target, max(1, round(img.height * target / img.width))), Image.LANCZOS)
+
+
+def encode_image(img, fmt='webp', quality=85, lossy_source=False):
+    """
+    Encode a decoded image to an output format
+
+    WebP uses the content-based encoder selection of encoder_selection.py.
+
+    Returns:
+        bytes: The encoded image
+    """
+    if fmt == 'webp':
+        return encode_webp(img, quality, lossy_source=lossy_source)[0]
+
+    buffer = io.BytesIO()
+    if fmt == 'avif':
+        img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        img.save(buffer, format='AVIF', quality=quality)
+    elif fmt == 'jpeg':
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # JPEG has no alpha; flatten onto white
+            rgba = img.convert('RGBA')
+            flattened = Image.new('RGB', rgba.size, (255, 255, 255))
+            flattened.paste(rgba, mask=rgba.getchannel('A'))
+            img = flattened
+        img.convert('RGB').save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        img.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+class RenderError(Exception):
+    """A source image could not be decoded or the variant could not be encoded"""
+
+
+def render_image(source_path, width=None, fmt='webp', quality=85):
+    """
+    Decode, resize and encode one variant of an image (runs in a worker process)
+
+    Errors reading the file are raised as they are; errors decoding or
+    encoding the image are raised as RenderError.
+
+    Args:
+        source_path (str): Source image
+        width (int): Output width (default: the source width, capped at MAX_IMAGE_WIDTH)
+        fmt (str): 'webp', 'avif', 'jpeg' or 'png'
+        quality (int): Quality for lossy formats (0-100)
+
+    Returns:
+        bytes: The encoded variant
+    """
+    with open(source_path, 'rb') as f:
+        source = f.read()
+    try:
+        with Image.open(io.BytesIO(source)) as img:
+            source_format = img.format
+            img = fit_image(img, width=width)
+            return encode_image(img, fmt, quality, lossy_source=source_format == 'JPEG')
+    except MemoryError:
+        raise
+    except UnidentifiedImageError:
+        raise RenderError("not a supported image file") from None
+    except Exception as e:
+        raise RenderError(str(e)) from None
+
+
+def source_format_name(path):
+    """Output format that keeps a source image's own format"""
+    ext = os.path.splitext(path)[1].lower()
+    return {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.webp': 'webp'}.get(ext, 'png')
+
+
+def parse_image_query(query, accept, source_path):
+    """
+    Read the variant parameters of an image request
+
+    Args:
+        query (str): URL query string (w, fmt, q)
+        accept (str): Accept request header, used for fmt=auto
+        source_path (str): Source image
+
+    Returns:
+        tuple: (width or None, format, quality, whether the format was negotiated)
+
+    Raises:
+        ValueError: For parameters out of range or unknown formats
+    """
+    params = {name: values[-1] for name, values in parse_qs(query).items()}
+
+    width = None
+    if params.get('w'):
+        width = int(params['w'])
+        if not 1 <= width <= MAX_REQUEST_WIDTH:
+            raise ValueError(f"w must be between 1 and {MAX_REQUEST_WIDTH}")
+
+    quality = int(params.get('q') or 85)
+    if not 1 <= quality <= 100:
+        raise ValueError("q must be between 1 and 100")
+
+    fmt = (params.get('fmt') or 'auto').lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    negotiated = fmt == 'auto'
+    if negotiated:
+        accept = accept.lower()
+        if AVIF_SUPPORTED and 'image/avif' in accept:
+            fmt = 'avif'
+        elif 'image/webp' in accept:
+            fmt = 'webp'
+        else:
+            fmt = source_format_name(source_path)
+    elif fmt not in FORMAT_TYPES or (fmt == 'avif' and not AVIF_SUPPORTED):
+        raise ValueError(f"Unsupported format: {fmt}")
+    return width, fmt, quality, negotiated
+
+
+def default_disk_cache(max_bytes=DISK_CACHE_BYTES):
+    """
+    Disk tier of the variant cache, next to the shared artifact cache
+
+    Returns:
+        ArtifactCache: Cache in <cache dir>/resized, or None when ALFAX10_CACHE_DIR is "off"
+    """
+    cache_dir = os.environ.get('ALFAX10_CACHE_DIR', DEFAULT_CACHE_DIR)
+    if cache_dir.lower() in ('off', 'none', '0', ''):
+        return None
+    return ArtifactCache(os.path.join(cache_dir, 'resized'), max_bytes)
+
+
+def _percentiles(samples):
+    """p50/p90/p99/max of latency samples in milliseconds"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+    pick = lambda p: round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 3)
+    return {'p50': pick(50), 'p90': pick(90), 'p99': pick(99), 'max': round(ordered[-1], 3)}
+
+
+class ImageServer(StaticServer):
+    """
+    Static server that also resizes and encodes images on demand
+
+    Args:
+        site_dir (str): Website root directory
+        htaccess_path (str): .htaccess file to mirror (default: <site_dir>/.htaccess)
+        workers (int): Worker processes for rendering (default: one per CPU)
+        memory_bytes (int): Size limit of the in-memory variant cache
+        disk_cache (ArtifactCache): Disk tier of the variant cache (default: default_disk_cache(), False to disable)
+        prefix (str): URL prefix of resized images
+    """
+
+    def __init__(self, site_dir, htaccess_path=None, workers=None, memory_bytes=MEMORY_CACHE_BYTES,
+                 disk_cache=None, prefix=DEFAULT_PREFIX):
+        super().__init__(site_dir, htaccess_path)
+        self.prefix = prefix
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.memory_cache = OrderedDict()
+        self.memory_cache_bytes = 0
+        self.memory_limit = memory_bytes
+        self.disk_cache = default_disk_cache() if disk_cache is None else disk_cache or None
+        # Variant key -> task rendering it, shared by identical concurrent requests
+        self.in_flight = {}
+        # Variant key -> error of a source that could not be decoded or encoded, so it is not decoded on every
+        # request. The key holds the source's mtime and size, so a changed source is rendered again
+        self.failures = OrderedDict()
+        # (path, mtime, size) -> content hash for disk cache keys
+        self.source_hashes = {}
+        self.stats.update({'image_requests': 0, 'memory_hits': 0, 'disk_hits': 0, 'renders': 0,
+                           'coalesced': 0, 'image_errors': 0})
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.render_latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def clear_caches(self):
+        """Drop the in-memory caches (the disk tier is kept)"""
+        super().clear_caches()
+        self.memory_cache.clear()
+        self.memory_cache_bytes = 0
+
+    async def stop(self):
+        await super().stop()
+        # Waiting in a thread lets the loop finish closing connections meanwhile
+        await asyncio.get_running_loop().run_in_executor(None, self.pool.shutdown)
+
+    def image_stats(self):
+        """
+        Cache and latency counters of the image endpoint
+
+        Returns:
+            dict: Counters, hit rate (share of image responses served without a new render)
+                  and latency percentiles in milliseconds for all image responses and for renders
+        """
+        stats = self.stats
+        served = stats['memory_hits'] + stats['disk_hits'] + stats['coalesced'] + stats['renders']
+        return {
+            **{name: stats[name] for name in ('image_requests', 'memory_hits', 'disk_hits', 'renders',
+                                              'coalesced', 'image_errors')},
+            'hit_rate': round((served - stats['renders']) / served, 3) if served else 0.0,
+            'memory_cache': {'entries': len(self.memory_cache), 'bytes': self.memory_cache_bytes,
+                             'max_bytes': self.memory_limit},
+            'latency_ms': _percentiles(self.latencies),
+            'render_latency_ms': _percentiles(self.render_latencies),
+        }
+
+    async def build_response(self, url_path, request_headers, query=''):
+        if url_path == STATS_PATH:
+            body = json.dumps(self.image_stats(), indent=2).encode('utf-8')
+            return 200, [('Content-Type', 'application/json'), ('Cache-Control', 'no-store')], body
+        if url_path.startswith(self.prefix):
+            return await self.image_response(url_path, request_headers, query)
+        return await super().build_response(url_path, request_headers, query)
+
+    async def image_response(self, url_path, request_headers, query):
+        """Build the response for a resized image request"""
+        started = time.perf_counter()
+        self.stats['image_requests'] += 1
+        path = self.resolve_path('/' + url_path[len(self.prefix):])
+        if path is None or not path.lower().endswith(SOURCE_EXTENSIONS):
+            return await self.not_found(request_headers)
+        try:
+            width, fmt, quality, negotiated = parse_image_query(query, request_headers.get('accept', ''), path)
+        except ValueError as e:
+            return 400, [('Content-Type', 'text/plain; charset=utf-8')], str(e).encode('utf-8')
+
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size, width, fmt, quality)
+        etag = f'"{hash_bytes(repr(key).encode("utf-8"))[:32]}"'
+        content_type = FORMAT_TYPES[fmt]
+        headers = [('Content-Type', content_type), ('ETag', etag)]
+        if negotiated:
+            headers.append(('Vary', 'Accept'))
+        expires = self.rules['expires_by_type'].get(content_type, self.rules['expires_default'])
+        if self.rules['expires_active'] and expires is not None:
+            headers.append(('Cache-Control', f'max-age={expires}'))
+
+        if 'if-none-match' in request_headers and etag_matches(request_headers['if-none-match'], etag):
+            self.stats['not_modified'] += 1
+            return 304, [h for h in headers if h[0] != 'Content-Type'], b''
+
+        if key in self.failures:
+            self.stats['image_errors'] += 1
+            return 500, [('Content-Type', 'text/plain; charset=utf-8')], b'Image could not be rendered'
+
+        data = self.memory_cache.get(key)
+        if data is not None:
+            self.memory_cache.move_to_end(key)
+            self.stats['memory_hits'] += 1
+            source = 'memory'
+        else:
+            task = self.in_flight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self.produce(key, path, stat, width, fmt, quality))
+                self.in_flight[key] = task
+                task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+                coalesced = False
+            else:
+                self.stats['coalesced'] += 1
+                coalesced = True
+            try:
+                # Shielded so a client disconnecting does not cancel the render other requests wait for
+                data, source = await asyncio.shield(task)
+            except Exception as e:
+                self.stats['image_errors'] += 1
+                # Only broken images are remembered; missing files, worker crashes and the like are retried
+                if isinstance(e, RenderError):
+                    if key not in self.failures:
+                        print(f"Error rendering {path}: {e}")
+                    self.remember_failure(key, str(e))
+                elif not coalesced:
+                    print(f"Error rendering {path}: {e}")
+                return 500, [('Content-Type', 'text/plain; charset=utf-8')], b'Image could not be rendered'
+            if coalesced:
+                source = 'coalesced'
+
+        self.latencies.append((time.perf_counter() - started) * 1000)
+        headers.append(('X-Cache', source))
+        return 200, headers, data
+
+    async def produce(self, key, path, stat, width, fmt, quality):
+        """
+        Get a variant from the disk cache or render it in the worker pool
+
+        Returns:
+            tuple: (bytes, 'disk' or 'render')
+        """
+        loop = asyncio.get_running_loop()
+        disk_key = None
+        if self.disk_cache:
+            fingerprint = (path, stat.st_mtime_ns, stat.st_size)
+            if fingerprint not in self.source_hashes:
+                self.source_hashes[fingerprint] = await loop.run_in_executor(None, hash_file, path)
+            disk_key = self.disk_cache.key(self.source_hashes[fingerprint], 'resize',
+                                           {'width': width, 'format': fmt, 'quality': quality,
+                                            'selection': SELECTION_VERSION, 'pillow': Image.__version__})
+            data = await loop.run_in_executor(None, self.disk_cache.fetch_bytes, disk_key)
+            if data is not None:
+                self.stats['disk_hits'] += 1
+                self.remember(key, data)
+                return data, 'disk'
+
+        render_started = time.perf_counter()
+        pool = self.pool
+        try:
+            data = await loop.run_in_executor(pool, render_image, path, width, fmt, quality)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed or out of memory); later renders get a new pool
+            if self.pool is pool:
+                print("Render worker pool broke, starting a new one")
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+                pool.shutdown(wait=False)
+            raise
+        self.render_latencies.append((time.perf_counter() - render_started) * 1000)
+        self.stats['renders'] += 1
+        if self.disk_cache:
+            await loop.run_in_executor(None, self.disk_cache.store_bytes, disk_key, data)
+        self.remember(key, data)
+        return data, 'render'
+
+    def remember_failure(self, key, error):
+        """Record a variant that failed to render, dropping the oldest records over MAX_FAILURES"""
+        self.failures[key] = error
+        self.failures.move_to_end(key)
+        while len(self.failures) > MAX_FAILURES:
+            self.failures.popitem(last=False)
+
+    def remember(self, key, data):
+        """Add a variant to the memory cache, evicting the least recently used ones over the limit"""
+        if len(data) > self.memory_limit:
+            return
+        self.memory_cache[key] = data
+        self.memory_cache_bytes += len(data)
+        while self.memory_cache_bytes > self.memory_limit:
+            _, evicted = self.memory_cache.popitem(last=False)
+            self.memory_cache_bytes -= len(evicted)
+
+
+def print_image_stats(stats):
+    """Print the cache and latency counters of an image server"""
+    latency = stats['latency_ms']
+    render = stats['render_latency_ms']
+    print(f"\nImage cache: {stats['image_requests']} requests, {stats['memory_hits']} memory hits, "
+          f"{stats['disk_hits']} disk hits, {stats['coalesced']} coalesced, {stats['renders']} renders, "
+          f"{stats['image_errors']} errors (hit rate {stats['hit_rate'] * 100:.1f}%)")
+    print(f"  Memory cache: {stats['memory_cache']['entries']} variants "
+          f"({stats['memory_cache']['bytes']/1024/1024:.1f}MB of {stats['memory_cache']['max_bytes']/1024/1024:.0f}MB)")
+    print(f"  Latency: p50 {latency['p50']:.2f}ms, p90 {latency['p90']:.2f}ms, p99 {latency['p99']:.2f}ms")
+    print(f"  Render time: p50 {render['p50']:.2f}ms, p90 {render['p90']:.2f}ms, max {render['max']:.2f}ms")
+
+
+def image_request_paths(site_dir, widths=BENCH_WIDTHS, fmt='webp', prefix=DEFAULT_PREFIX):
+    """URL paths of a set of variants of every source image in the site"""
+    site_dir = os.path.abspath(site_dir)
+    paths = []
+    for path in scan_site(site_dir).paths(('.png', '.jpg', '.jpeg')):
+        url = prefix + quote(os.path.relpath(path, site_dir).replace('\\', '/'))
+        paths += [f"{url}?w={width}&fmt={fmt}" for width in widths]
+    return paths
+
+
+async def serve_images(site_dir, host='127.0.0.1', port=8001, htaccess_path=None, workers=None,
+                       memory_bytes=MEMORY_CACHE_BYTES, disk_cache=None):
+    """Serve the site with on-demand image resizing until interrupted"""
+    server = ImageServer(site_dir, htaccess_path, workers, memory_bytes, disk_cache)
+    host, port = await server.start(host, port)
+    disk = server.disk_cache
+    print(f"Serving {server.site_dir} at http://{host}:{port}/")
+    print(f"  Resized images: http://{host}:{port}{server.prefix}<path>?w=640&fmt=webp")
+    print(f"  Counters: http://{host}:{port}{STATS_PATH}")
+    print(f"  Cache: {memory_bytes/1024/1024:.0f}MB in memory, "
+          f"{f'{disk.max_bytes/1024/1024:.0f}MB on disk in {disk.cache_dir}' if disk else 'no disk cache'}")
+    print("Press Ctrl+C to stop.")
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.stop()
+        print_image_stats(server.image_stats())
+
+
+async def benchmark_images(site_dir, connections=8, total_requests=1000, widths=BENCH_WIDTHS, fmt='webp',
+                           workers=None, memory_bytes=MEMORY_CACHE_BYTES, disk_cache=None):
+    """
+    Load-test the image endpoint with a cold and a warm run
+
+    The cold run starts with empty memory caches, so every variant is rendered
+    (or read from the disk cache) once and concurrent requests for it coalesce.
+    The warm run is served from memory.
+
+    Returns:
+        dict: {'cold': result, 'warm': result, 'images': image server counters}
+    """
+    server = ImageServer(site_dir, workers=workers, memory_bytes=memory_bytes, disk_cache=disk_cache)
+    host, port = await server.start('127.0.0.1', 0)
+    try:
+        paths = image_request_paths(site_dir, widths, fmt, server.prefix)
+        if not paths:
+            raise ValueError(f"No images found in {site_dir}")
+        print(f"Benchmarking {len(paths)} image variants with {connections} keep-alive connections...")
+
+        server.clear_caches()
+        cold = await run_load(host, port, paths, connections, total_requests)
+        print_load_result("Cold cache", cold)
+
+        warm = await run_load(host, port, paths, connections, total_requests)
+        print_load_result("Warm cache", warm)
+    finally:
+        await server.stop()
+
+    stats = server.image_stats()
+    print_image_stats(stats)
+    for result in (cold, warm):
+        result.pop('etags')
+    return {'cold': cold, 'warm': warm, 'images': stats}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Serve the site with on-demand image resizing")
+    subcommands = arg_parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subcommands.add_parser('serve', help="Serve the site and resize images on request")
+    serve_parser.add_argument('site_dir', nargs='?', default='.')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8001)
+    serve_parser.add_argument('--htaccess', help="Path to the .htaccess file (default: <site_dir>/.htaccess)")
+
+    bench_parser = subcommands.add_parser('bench', help="Load-test the image endpoint (cold and warm cache)")
+    bench_parser.add_argument('site_dir', nargs='?', default='.')
+    bench_parser.add_argument('--connections', type=int, default=8)
+    bench_parser.add_argument('--requests', type=int, default=1000)
+    bench_parser.add_argument('--format', default='webp', choices=sorted(FORMAT_TYPES))
+
+    for subparser in (serve_parser, bench_parser):
+        subparser.add_argument('--workers', type=int, help="Render processes (default: one per CPU)")
+        subparser.add_argument('--memory-mb', type=float, default=MEMORY_CACHE_BYTES / 1024 / 1024,
+                               help="Memory cache limit in megabytes")
+        subparser.add_argument('--disk-mb', type=float, default=DISK_CACHE_BYTES / 1024 / 1024,
+                               help="Disk cache limit in megabytes (0 disables the disk cache)")
+
+    args = arg_parser.parse_args()
+    if not os.path.isdir(args.site_dir):
+        print(f"Error: '{args.site_dir}' is not a valid directory.")
+        sys.exit(2)
+
+    memory_bytes = int(args.memory_mb * 1024 * 1024)
+    disk_cache = default_disk_cache(int(args.disk_mb * 1024 * 1024)) if args.disk_mb > 0 else False
+    try:
+        if args.command == 'serve':
+            asyncio.run(serve_images(args.site_dir, args.host, args.port, args.htaccess, args.workers,
+                                     memory_bytes, disk_cache))
+        else:
+            asyncio.run(benchmark_images(args.site_dir, args.connections, args.requests, fmt=args.format,
+                                         workers=args.workers, memory_bytes=memory_bytes, disk_cache=disk_cache))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
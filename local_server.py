@@ -0,0 +1,715 @@
+# Local Static Server and Load Generator Script
+# This script only requires Python (brotli responses need: pip install brotli)
+
+import os
+import re
+import sys
+import gzip
+import time
+import asyncio
+import argparse
+import mimetypes
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlparse, unquote
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from audit_performance import find_pages, parse_page, resolve_url
+
+"""
+Serves the website locally with the caching and compression rules of the
+.htaccess file written by generate_htaccess(), so their effect can be checked
+and measured without deploying to Apache.
+
+The server reads the .htaccess file and applies:
+- mod_expires: ExpiresDefault / ExpiresByType -> Expires and Cache-Control max-age
+- mod_deflate: AddOutputFilterByType DEFLATE -> gzip or brotli negotiation,
+  using precompressed .br/.gz siblings when they are up to date
+- mod_headers: Header set/append/add/unset, including <Files>/<FilesMatch> blocks;
+  Link headers on HTML pages are also sent ahead as a 103 Early Hints response
+- ErrorDocument for 404 responses
+
+It also answers conditional (If-None-Match, If-Modified-Since) and Range
+requests and keeps connections alive like Apache's KeepAlive settings.
+mod_rewrite rules are not emulated.
+
+The load generator replays the site's pages and assets over a pool of
+keep-alive connections and reports requests per second and latency
+percentiles for a cold run (empty caches) and a warm run (conditional
+requests against a populated server cache).
+"""
+
+SERVER_NAME = 'AlfaX10-Local'
+
+# Apache-style KeepAlive settings
+KEEP_ALIVE_TIMEOUT = 5
+MAX_KEEP_ALIVE_REQUESTS = 100
+MAX_CONNECTIONS = 256
+
+# Limit for on-the-fly compressed responses kept in memory
+COMPRESSION_CACHE_BYTES = 64 * 1024 * 1024
+
+# Seconds per unit in mod_expires "access plus ..." expressions
+EXPIRES_UNITS = {
+    'year': 365 * 86400,
+    'month': 30 * 86400,
+    'week': 7 * 86400,
+    'day': 86400,
+    'hour': 3600,
+    'minute': 60,
+    'second': 1,
+}
+
+# Types that mimetypes does not know on every platform
+EXTRA_MIME_TYPES = {
+    '.webp': 'image/webp',
+    '.avif': 'image/avif',
+    '.woff': 'font/woff',
+    '.woff2': 'font/woff2',
+    '.js': 'application/javascript',
+    '.mjs': 'application/javascript',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon',
+}
+
+# Precompressed sibling extension for each content coding
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+STATUS_REASONS = {
+    103: 'Early Hints',
+    200: 'OK',
+    206: 'Partial Content',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    416: 'Range Not Satisfiable',
+    500: 'Internal Server Error',
+}
+
+
+def parse_expires(expression):
+    """Convert an "access plus 1 year" style expression to seconds"""
+    words = expression.lower().split()
+    if words[:2] in (['access', 'plus'], ['now', 'plus'], ['modification', 'plus']):
+        words = words[2:]
+    seconds = 0
+    for amount, unit in zip(words[::2], words[1::2]):
+        seconds += int(amount) * EXPIRES_UNITS[unit.rstrip('s')]
+    return seconds
+
+
+def parse_htaccess(htaccess_path):
+    """
+    Read the caching, compression and header rules from an .htaccess file
+
+    Returns:
+        dict: expires_default, expires_by_type, compress_types, headers
+              (list of (files_match regex or None, action, name, value))
+              and error_documents
+    """
+    rules = {
+        'expires_active': False,
+        'expires_default': None,
+        'expires_by_type': {},
+        'compress_types': set(),
+        'headers': [],
+        'error_documents': {},
+    }
+    if not os.path.exists(htaccess_path):
+        return rules
+
+    files_match = None
+    with open(htaccess_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            match = re.match(r'<FilesMatch\s+"(.*)">', line, re.IGNORECASE)
+            if match:
+                files_match = re.compile(match.group(1), re.IGNORECASE)
+                continue
+            match = re.match(r'<Files\s+"?([^">]*)"?>', line, re.IGNORECASE)
+            if match:
+                files_match = re.compile('^' + re.escape(match.group(1)) + '$', re.IGNORECASE)
+                continue
+            if line.lower().startswith(('</filesmatch', '</files')):
+                files_match = None
+                continue
+
+            parts = line.split(None, 1)
+            directive = parts[0].lower()
+            args = parts[1] if len(parts) > 1 else ''
+
+            if directive == 'expiresactive':
+                rules['expires_active'] = args.strip().lower() == 'on'
+            elif directive == 'expiresdefault':
+                rules['expires_default'] = parse_expires(args.strip('"'))
+            elif directive == 'expiresbytype':
+                mime_type, expression = args.split(None, 1)
+                rules['expires_by_type'][mime_type.lower()] = parse_expires(expression.strip('"'))
+            elif directive == 'addoutputfilterbytype':
+                filters, *types = args.split()
+                if 'DEFLATE' in filters.upper().split(';'):
+                    rules['compress_types'].update(t.lower() for t in types)
+            elif directive == 'header':
+                match = re.match(r'(?:always\s+)?(set|append|add|unset|merge)\s+(\S+)\s*(?:"(.*)"|(\S+))?', args, re.IGNORECASE)
+                if match:
+                    value = match.group(3) if match.group(3) is not None else (match.group(4) or '')
+                    rules['headers'].append((files_match, match.group(1).lower(), match.group(2), value))
+            elif directive == 'errordocument':
+                code, target = args.split(None, 1)
+                rules['error_documents'][int(code)] = target.strip('"')
+
+    return rules
+
+
+def guess_type(path):
+    """Return the MIME type Apache would send for a file"""
+    ext = os.path.splitext(path)[1].lower()
+    return EXTRA_MIME_TYPES.get(ext) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def parse_accept_encoding(header):
+    """Return the set of content codings the client accepts (q > 0)"""
+    accepted = set()
+    for item in header.split(','):
+        parts = [p.strip() for p in item.split(';')]
+        coding = parts[0].lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range "bytes=" header
+
+    Returns:
+        tuple or None: (start, end) inclusive, None to ignore the header,
+                       or 'unsatisfiable'
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+    else:
+        suffix = int(match.group(2))
+        if suffix == 0:
+            return 'unsatisfiable'
+        start = max(0, size - suffix)
+        end = size - 1
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, min(end, size - 1)
+
+
+def etag_matches(header, etag):
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in header.split(',')]
+    return any(tag.lstrip('W/') == etag.lstrip('W/') for tag in candidates)
+
+
+class StaticServer:
+    """
+    asyncio HTTP/1.1 static file server applying .htaccess rules
+
+    Args:
+        site_dir (str): Website root directory
+        htaccess_path (str): .htaccess file to mirror (default: <site_dir>/.htaccess)
+    """
+
+    def __init__(self, site_dir, htaccess_path=None):
+        self.site_dir = os.path.abspath(site_dir)
+        self.rules = parse_htaccess(htaccess_path or os.path.join(self.site_dir, '.htaccess'))
+        self.compression_cache = OrderedDict()
+        self.compression_cache_bytes = 0
+        self.connections = asyncio.Semaphore(MAX_CONNECTIONS)
+        self.stats = {'requests': 0, 'connections': 0, 'compressed_on_the_fly': 0, 'precompressed': 0,
+                      'compression_cache_hits': 0, 'not_modified': 0, 'partial': 0, 'early_hints': 0}
+        self.server = None
+
+    def clear_caches(self):
+        """Drop the in-memory compression cache (simulates a cold server)"""
+        self.compression_cache.clear()
+        self.compression_cache_bytes = 0
+
+    async def start(self, host='127.0.0.1', port=8000):
+        """Start listening; returns the bound (host, port)"""
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        """Stop listening and close the server"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until it closes or idles out"""
+        async with self.connections:
+            self.stats['connections'] += 1
+            try:
+                for _ in range(MAX_KEEP_ALIVE_REQUESTS):
+                    try:
+                        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_TIMEOUT)
+                    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                        break
+
+                    keep_alive = await self.handle_request(head, writer)
+                    await writer.drain()
+                    if not keep_alive:
+                        break
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except ConnectionError:
+                    pass
+
+    async def handle_request(self, head, writer):
+        """Parse a request head and write the response; returns whether to keep the connection"""
+        self.stats['requests'] += 1
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            self.write_response(writer, 400, [], b'', False)
+            return False
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+        if method not in ('GET', 'HEAD'):
+            self.write_response(writer, 405, [('Allow', 'GET, HEAD')], b'', keep_alive)
+            return keep_alive
+
+        url = urlparse(target)
+        url_path = unquote(url.path)
+        if version == 'HTTP/1.1':
+            await self.send_early_hints(url_path, writer)
+
+        status, response_headers, body = await self.build_response(url_path, headers, url.query)
+        self.write_response(writer, status, response_headers, b'' if method == 'HEAD' else body,
+                            keep_alive, content_length=len(body))
+        return keep_alive
+
+    def write_response(self, writer, status, headers, body, keep_alive, content_length=None):
+        """Serialize an HTTP/1.1 response"""
+        lines = [f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}",
+                 f"Date: {formatdate(usegmt=True)}",
+                 f"Server: {SERVER_NAME}"]
+        lines += [f"{name}: {value}" for name, value in headers]
+        # A 304 has no body, and a Content-Length would have to be the one of the full response
+        if status != 304:
+            lines.append(f"Content-Length: {len(body) if content_length is None else content_length}")
+        if keep_alive:
+            lines.append("Connection: keep-alive")
+            lines.append(f"Keep-Alive: timeout={KEEP_ALIVE_TIMEOUT}, max={MAX_KEEP_ALIVE_REQUESTS}")
+        else:
+            lines.append("Connection: close")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+
+    async def send_early_hints(self, url_path, writer):
+        """Send the Link headers configured for an HTML page as a 103 interim response"""
+        path = self.resolve_path(url_path)
+        if path is None or guess_type(path) != 'text/html':
+            return
+        links = [value for name, value in self.apply_header_rules(path, []) if name.lower() == 'link']
+        if not links:
+            return
+        self.stats['early_hints'] += 1
+        lines = [f"HTTP/1.1 103 {STATUS_REASONS[103]}"] + [f"Link: {link}" for link in links]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+    def resolve_path(self, url_path):
+        """Map a URL path to a file inside the site directory (None if outside, hidden or missing)"""
+        local = os.path.normpath(os.path.join(self.site_dir, url_path.lstrip('/')))
+        if local != self.site_dir and not local.startswith(self.site_dir + os.sep):
+            return None
+        # Dotfiles and dot-directories (.git/, .htaccess, manifests) are never served
+        if any(part.startswith('.') for part in os.path.relpath(local, self.site_dir).split(os.sep) if part != '.'):
+            return None
+        if os.path.isdir(local):
+            local = os.path.join(local, 'index.html')
+        return local if os.path.isfile(local) else None
+
+    def apply_header_rules(self, path, headers):
+        """Apply mod_headers directives (in file order) to the response headers"""
+        filename = os.path.basename(path)
+        for files_match, action, name, value in self.rules['headers']:
+            if files_match is not None and not files_match.search(filename):
+                continue
+            # Connection handling belongs to the server's keep-alive logic
+            if name.lower() in ('connection', 'keep-alive'):
+                continue
+            existing = [i for i, (header, _) in enumerate(headers) if header.lower() == name.lower()]
+            if action == 'set':
+                headers[:] = [h for h in headers if h[0].lower() != name.lower()]
+                headers.append((name, value))
+            elif action == 'unset':
+                headers[:] = [h for h in headers if h[0].lower() != name.lower()]
+            elif action in ('append', 'merge') and existing:
+                index = existing[0]
+                current = headers[index][1]
+                if action == 'append' or value not in [v.strip() for v in current.split(',')]:
+                    headers[index] = (headers[index][0], f"{current}, {value}")
+            else:
+                headers.append((name, value))
+        return headers
+
+    def select_encoding(self, path, content_type, request_headers):
+        """
+        Pick the response content coding for a file
+
+        Returns:
+            tuple: (encoding or None, precompressed file path or None)
+        """
+        if content_type.split(';')[0] not in self.rules['compress_types']:
+            return None, None
+        accepted = parse_accept_encoding(request_headers.get('accept-encoding', ''))
+        mtime = os.path.getmtime(path)
+        for encoding in ('br', 'gzip'):
+            if encoding not in accepted:
+                continue
+            precompressed = path + ENCODING_SUFFIXES[encoding]
+            if os.path.isfile(precompressed) and os.path.getmtime(precompressed) >= mtime:
+                return encoding, precompressed
+            if encoding == 'gzip' or brotli is not None:
+                return encoding, None
+        return None, None
+
+    def compress(self, path, stat, encoding, data):
+        """Compress a file body on the fly, caching the result in memory"""
+        key = (path, stat.st_mtime_ns, stat.st_size, encoding)
+        cached = self.compression_cache.get(key)
+        if cached is not None:
+            self.compression_cache.move_to_end(key)
+            self.stats['compression_cache_hits'] += 1
+            return cached
+
+        if encoding == 'br':
+            body = brotli.compress(data, quality=5)
+        else:
+            body = gzip.compress(data, compresslevel=6, mtime=0)
+        self.stats['compressed_on_the_fly'] += 1
+
+        self.compression_cache[key] = body
+        self.compression_cache_bytes += len(body)
+        while self.compression_cache_bytes > COMPRESSION_CACHE_BYTES and self.compression_cache:
+            _, evicted = self.compression_cache.popitem(last=False)
+            self.compression_cache_bytes -= len(evicted)
+        return body
+
+    async def build_response(self, url_path, request_headers, query=''):
+        """Build (status, headers, body) for a GET request (static files ignore the query string)"""
+        path = self.resolve_path(url_path)
+        if path is None:
+            return await self.not_found(request_headers)
+
+        stat = os.stat(path)
+        content_type = guess_type(path)
+        headers = [('Content-Type', content_type + ('; charset=utf-8' if content_type.startswith('text/') else ''))]
+
+        # Validators follow Apache's default FileETag MTime Size
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns // 1000:x}"'
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+        encoding, precompressed = self.select_encoding(path, content_type, request_headers)
+        if content_type in self.rules['compress_types']:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if encoding:
+            # mod_deflate marks the compressed representation's ETag
+            etag = f'{etag[:-1]}-{encoding}"'
+            headers.append(('Content-Encoding', encoding))
+        else:
+            headers.append(('Accept-Ranges', 'bytes'))
+        headers.append(('ETag', etag))
+        headers.append(('Last-Modified', last_modified))
+
+        expires = self.rules['expires_by_type'].get(content_type, self.rules['expires_default'])
+        if self.rules['expires_active'] and expires is not None:
+            headers.append(('Cache-Control', f'max-age={expires}'))
+            headers.append(('Expires', formatdate(time.time() + expires, usegmt=True)))
+
+        headers = self.apply_header_rules(path, headers)
+
+        if 'if-none-match' in request_headers:
+            if etag_matches(request_headers['if-none-match'], etag):
+                self.stats['not_modified'] += 1
+                return 304, [h for h in headers if h[0].lower() not in ('content-type', 'content-encoding')], b''
+        elif 'if-modified-since' in request_headers:
+            try:
+                since = parsedate_to_datetime(request_headers['if-modified-since']).timestamp()
+                if int(stat.st_mtime) <= since:
+                    self.stats['not_modified'] += 1
+                    return 304, [h for h in headers if h[0].lower() not in ('content-type', 'content-encoding')], b''
+            except (TypeError, ValueError):
+                pass
+
+        loop = asyncio.get_running_loop()
+        if precompressed:
+            self.stats['precompressed'] += 1
+            body = await loop.run_in_executor(None, _read_file, precompressed)
+            return 200, headers, body
+
+        data = await loop.run_in_executor(None, _read_file, path)
+        if encoding:
+            return 200, headers, self.compress(path, stat, encoding, data)
+
+        # Byte ranges are only served for the identity representation
+        if 'range' in request_headers:
+            byte_range = parse_range(request_headers['range'], len(data))
+            if byte_range == 'unsatisfiable':
+                return 416, [('Content-Range', f'bytes */{len(data)}')], b''
+            if byte_range:
+                start, end = byte_range
+                self.stats['partial'] += 1
+                headers.append(('Content-Range', f'bytes {start}-{end}/{len(data)}'))
+                return 206, headers, data[start:end + 1]
+
+        return 200, headers, data
+
+    async def not_found(self, request_headers):
+        """Serve the configured 404 ErrorDocument (or a plain message)"""
+        error_document = self.rules['error_documents'].get(404)
+        if error_document and error_document.startswith('/'):
+            path = self.resolve_path(error_document)
+            if path:
+                with open(path, 'rb') as f:
+                    return 404, [('Content-Type', 'text/html; charset=utf-8')], f.read()
+        return 404, [('Content-Type', 'text/plain; charset=utf-8')], b'Not Found'
+
+
+def _read_file(path):
+    """Read a whole file (runs in the default executor)"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def site_request_paths(site_dir):
+    """List the URL paths of all pages and the local resources they reference"""
+    site_dir = os.path.abspath(site_dir)
+    paths = []
+    for page_path in find_pages(site_dir):
+        page_url = '/' + os.path.relpath(page_path, site_dir).replace('\\', '/')
+        if page_url not in paths:
+            paths.append(page_url)
+        for resource in parse_page(page_path).resources:
+            local_path, is_external = resolve_url(resource['url'], page_path, site_dir)
+            if is_external or local_path is None or not os.path.isfile(local_path):
+                continue
+            url = '/' + os.path.relpath(local_path, site_dir).replace('\\', '/')
+            if url not in paths:
+                paths.append(url)
+    return paths
+
+
+async def _send_request(reader, writer, host, path, request_headers):
+    """Send one GET request on a keep-alive connection and read the full response"""
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}", "Connection: keep-alive", "User-Agent: AlfaX10-LoadTest"]
+    lines += [f"{name}: {value}" for name, value in request_headers.items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    await writer.drain()
+
+    # Skip interim responses such as 103 Early Hints
+    while True:
+        head = await reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        status = int(status_line.split()[1])
+        if status >= 200:
+            break
+    headers = {}
+    for line in header_lines:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', '0')))
+    return status, headers, len(head) + len(body)
+
+
+async def run_load(host, port, paths, connections=8, total_requests=1000, etags=None,
+                   accept_encoding='br, gzip'):
+    """
+    Replay paths round-robin over a pool of keep-alive connections
+
+    Args:
+        host (str), port (int): Server address
+        paths (list): URL paths to request
+        connections (int): Number of concurrent keep-alive connections
+        total_requests (int): Requests to send in total
+        etags (dict): Optional path -> ETag map; sends If-None-Match (warm cache)
+        accept_encoding (str): Accept-Encoding header value
+
+    Returns:
+        dict: requests, elapsed seconds, requests per second, latency percentiles
+              in milliseconds, status counts, bytes received and the ETags seen
+    """
+    latencies = []
+    statuses = {}
+    seen_etags = {}
+    received = [0]
+    counter = iter(range(total_requests))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for index in counter:
+                path = paths[index % len(paths)]
+                request_headers = {'Accept-Encoding': accept_encoding}
+                if etags and path in etags:
+                    request_headers['If-None-Match'] = etags[path]
+                started = time.perf_counter()
+                try:
+                    status, headers, size = await _send_request(reader, writer, host, path, request_headers)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    # The server closed an idle or exhausted keep-alive connection; reconnect
+                    writer.close()
+                    reader, writer = await asyncio.open_connection(host, port)
+                    started = time.perf_counter()
+                    status, headers, size = await _send_request(reader, writer, host, path, request_headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+                received[0] += size
+                if 'etag' in headers:
+                    seen_etags[path] = headers['etag']
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return 0.0
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))], 3)
+
+    return {
+        'requests': len(latencies),
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {'p50': percentile(50), 'p90': percentile(90), 'p99': percentile(99),
+                       'max': round(latencies[-1], 3) if latencies else 0.0},
+        'statuses': statuses,
+        'bytes_received': received[0],
+        'etags': seen_etags,
+    }
+
+
+def print_load_result(label, result):
+    """Print a load test result"""
+    latency = result['latency_ms']
+    statuses = ', '.join(f"{status}: {count}" for status, count in sorted(result['statuses'].items()))
+    print(f"\n{label}:")
+    print(f"  {result['requests']} requests in {result['elapsed_seconds']:.2f}s ({result['requests_per_second']:.1f} req/s)")
+    print(f"  Latency: p50 {latency['p50']:.2f}ms, p90 {latency['p90']:.2f}ms, p99 {latency['p99']:.2f}ms, max {latency['max']:.2f}ms")
+    print(f"  Received: {result['bytes_received']/1024:.1f}KB, status codes: {statuses}")
+
+
+async def benchmark_site(site_dir, connections=8, total_requests=1000, htaccess_path=None):
+    """
+    Start a local server and measure a cold and a warm cache run
+
+    The cold run starts with empty server caches and sends no validators.
+    The warm run reuses the populated compression cache and sends the ETags
+    from the cold run, like a returning browser revalidating its cache.
+
+    Returns:
+        dict: {'cold': result, 'warm': result, 'server': server stats}
+    """
+    server = StaticServer(site_dir, htaccess_path)
+    host, port = await server.start('127.0.0.1', 0)
+    try:
+        paths = site_request_paths(site_dir)
+        if not paths:
+            raise ValueError(f"No pages found in {site_dir}")
+        print(f"Benchmarking {len(paths)} URLs with {connections} keep-alive connections...")
+
+        server.clear_caches()
+        cold = await run_load(host, port, paths, connections, total_requests)
+        print_load_result("Cold cache", cold)
+
+        warm = await run_load(host, port, paths, connections, total_requests, etags=cold['etags'])
+        print_load_result("Warm cache (revalidation)", warm)
+    finally:
+        await server.stop()
+
+    for result in (cold, warm):
+        result.pop('etags')
+    return {'cold': cold, 'warm': warm, 'server': dict(server.stats)}
+
+
+async def serve_site(site_dir, host='127.0.0.1', port=8000, htaccess_path=None):
+    """Serve the site until interrupted"""
+    server = StaticServer(site_dir, htaccess_path)
+    host, port = await server.start(host, port)
+    rules = server.rules
+    print(f"Serving {server.site_dir} at http://{host}:{port}/")
+    print(f"  {len(rules['expires_by_type'])} ExpiresByType rules, {len(rules['compress_types'])} compressed types, "
+          f"{len(rules['headers'])} header rules")
+    print("Press Ctrl+C to stop.")
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Local static server mirroring the generated .htaccess rules")
+    subcommands = arg_parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subcommands.add_parser('serve', help="Serve the site locally")
+    serve_parser.add_argument('site_dir', nargs='?', default='.')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--htaccess', help="Path to the .htaccess file (default: <site_dir>/.htaccess)")
+
+    bench_parser = subcommands.add_parser('bench', help="Run cold and warm cache load tests")
+    bench_parser.add_argument('site_dir', nargs='?', default='.')
+    bench_parser.add_argument('--connections', type=int, default=8)
+    bench_parser.add_argument('--requests', type=int, default=1000)
+    bench_parser.add_argument('--htaccess', help="Path to the .htaccess file (default: <site_dir>/.htaccess)")
+
+    args = arg_parser.parse_args()
+    if not os.path.isdir(args.site_dir):
+        print(f"Error: '{args.site_dir}' is not a valid directory.")
+        sys.exit(2)
+
+    try:
+        if args.command == 'serve':
+            asyncio.run(serve_site(args.site_dir, args.host, args.port, args.htaccess))
+        else:
+            asyncio.run(benchmark_site(args.site_dir, args.connections, args.requests, args.htaccess))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
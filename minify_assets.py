@@ -1,11 +1,72 @@
-# CSS and JavaScript Minifier Script
+# CSS, JavaScript and HTML Minifier Script
 # This script requires Node.js and the following packages:
 # npm install terser clean-css-cli
+# HTML minification only requires Python; image-set() rewriting of CSS also requires Pillow
 
 import os
 import subprocess
 import re
+import gzip
+import html
+import json
+import multiprocessing
 from datetime import datetime
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from atomic_output import atomic_open
+from audit_image_sizes import VARIANT_DENSITIES, generate_sized_variants, variant_path
+from audit_performance import find_pages, resolve_url, size_summary
+from site_scanner import HTML_OUTPUT_DIR, scan_site
+
+# Worker processes start from a fresh interpreter instead of a fork: the full optimization
+# starts pools from threads (see stage_scheduler.py), and a fork copies locks other threads hold
+POOL_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+# Elements whose content is copied byte for byte
+PRESERVE_WHITESPACE_TAGS = ('pre', 'textarea')
+
+# Whitespace next to these elements never renders
+BLOCK_TAGS = frozenset((
+    'html', 'head', 'body', 'title', 'meta', 'link', 'base',
+    'address', 'article', 'aside', 'blockquote', 'dd', 'details', 'dialog', 'div', 'dl', 'dt',
+    'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'header', 'hgroup', 'hr', 'li', 'main', 'nav', 'noscript', 'ol', 'option', 'p', 'section',
+    'pre', 'summary', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul', 'picture', 'source',
+))
+
+# Attribute values that are the default and can be dropped
+DEFAULT_ATTRIBUTES = {
+    ('script', 'type'): ('text/javascript',),
+    ('style', 'type'): ('text/css',),
+    ('link', 'type'): ('text/css',),
+    ('form', 'method'): ('get',),
+}
+
+ATTRIBUTE_PATTERN = re.compile(r'([^\s"\'>/=]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'=<>`]+)))?')
+UNQUOTED_VALUE = re.compile(r'^[^\s"\'=<>`]+$')
+
+HTML_CHUNK_SIZE = 64 * 1024
+
+# Attribute of each tag whose URL is pointed at an optimized version of the asset
+REFERENCE_ATTRIBUTES = {'link': 'href', 'script': 'src', 'img': 'src'}
+
+# CSS properties whose PNG/JPEG url() images are offered as image-set() with modern formats
+IMAGE_SET_PROPERTIES = ('background', 'background-image')
+IMAGE_SET_SOURCES = ('.png', '.jpg', '.jpeg')
+IMAGE_SET_SOURCE_TYPES = {'.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg'}
+
+# Modern versions offered ahead of the original, most efficient first
+IMAGE_SET_FORMATS = (('.avif', 'image/avif'), ('.webp', 'image/webp'))
+
+# Whitespace next to these characters is dropped when minifying CSS
+CSS_NO_SPACE_AFTER = '{};,:(>'
+CSS_NO_SPACE_BEFORE = '{};,)>!'
+CSS_NAME_CHAR = re.compile(r'[\w-]')
+CSS_PIXELS = re.compile(r'^([\d.]+)px$')
 
 def check_requirements():
     """Check if Node.js and required packages are installed"""
@@ -67,7 +128,7 @@ def minify_js(js_file, output_file=None):
         )
         
         # Write the minified content with the header comments
-        with open(output_file, 'w', encoding='utf-8') as f:
+        with atomic_open(output_file, 'w', encoding='utf-8') as f:
             f.write(header_comments + result.stdout)
         
         # Get file sizes for reporting
@@ -118,7 +179,7 @@ def minify_css(css_file, output_file=None):
         )
         
         # Write the minified content with the header comments
-        with open(output_file, 'w', encoding='utf-8') as f:
+        with atomic_open(output_file, 'w', encoding='utf-8') as f:
             f.write(header_comments + result.stdout)
         
         # Get file sizes for reporting
@@ -134,9 +195,10 @@ def minify_css(css_file, output_file=None):
         return False
 
 def process_directory(directory):
-    """Process all JS and CSS files in a directory"""
-    js_files = [f for f in os.listdir(directory) if f.endswith('.js') and not f.endswith('.min.js')]
-    css_files = [f for f in os.listdir(directory) if f.endswith('.css') and not f.endswith('.min.css')]
+    """Process all JS and CSS files in a directory and its subdirectories"""
+    scan = scan_site(directory)
+    js_files = [path for path in scan.paths(('.js',)) if not path.endswith('.min.js')]
+    css_files = [path for path in scan.paths(('.css',)) if not path.endswith('.min.css')]
     
     print(f"Found {len(js_files)} JavaScript files and {len(css_files)} CSS files to minify.")
     
@@ -144,71 +206,769 @@ def process_directory(directory):
     css_success = 0
     
     for js_file in js_files:
-        if minify_js(os.path.join(directory, js_file)):
+        if minify_js(js_file):
             js_success += 1
     
     for css_file in css_files:
-        if minify_css(os.path.join(directory, css_file)):
+        if minify_css(css_file):
             css_success += 1
     
     print(f"\nSummary: Successfully minified {js_success}/{len(js_files)} JS files and {css_success}/{len(css_files)} CSS files.")
     
+    print()
+    minify_html_pages(directory, scan=scan)
+    
     # Ask if user wants to update HTML files to reference minified versions
     if js_success > 0 or css_success > 0:
         update_html = input("\nDo you want to update HTML files to reference minified versions? (y/n): ")
         if update_html.lower() == 'y':
-            update_html_references(directory)
+            use_webp = input("Also point <img> tags at existing WebP versions? (y/n, default: n): ").lower() == 'y'
+            update_html_references(directory, webp=use_webp)
+
+class _CSSDeclaration:
+    """
+    Declaration with url() references, rewritten to image-set() when its rule closes
+
+    Args:
+        pieces (list): Text of the declaration; url() tokens are (token, url) tuples
+    """
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+
+    def render(self, image_set=None, size=None):
+        """Return the declaration, preceded by its url() form when it was rewritten"""
+        original = ''.join(piece if isinstance(piece, str) else piece[0] for piece in self.pieces)
+        replacements = {}
+        for piece in self.pieces:
+            if isinstance(piece, tuple) and image_set and piece[0] not in replacements:
+                candidates = image_set(piece[1], size)
+                if candidates:
+                    replacements[piece[0]] = f"image-set({','.join(candidates)})"
+        if not replacements:
+            return original, 0
+        modern = ''.join(piece if isinstance(piece, str) else replacements.get(piece[0], piece[0])
+                         for piece in self.pieces)
+        # Browsers without image-set() drop the second declaration and keep the first
+        return f"{original};{modern}", len(replacements)
+
+
+def _css_pixels(value):
+    """A CSS length in px as a number (None for other units and keywords)"""
+    match = CSS_PIXELS.match(value or '')
+    return float(match.group(1)) if match else None
+
+
+def rule_background_size(body):
+    """
+    Rendered size of a rule's background image from its declarations
+
+    background-size in px gives the size directly; cover and contain use the
+    rule's own width and height in px.
+
+    Args:
+        body (str): Minified declarations of the rule
+
+    Returns:
+        tuple: (width or None, height or None, 'fixed', 'cover' or 'contain') in CSS pixels,
+               or None when the rule does not determine the size
+    """
+    declarations = {}
+    for declaration in body.split(';'):
+        name, _, value = declaration.partition(':')
+        declarations[name.strip().lower()] = value.strip().lower()
+
+    parts = declarations.get('background-size', '').replace('!important', '').split()
+    if parts and parts[0] not in ('cover', 'contain'):
+        width = _css_pixels(parts[0])
+        height = _css_pixels(parts[1]) if len(parts) > 1 else None
+        return (width, height, 'fixed') if width or height else None
+
+    box = (_css_pixels(declarations.get('width')), _css_pixels(declarations.get('height')))
+    if parts and any(box):
+        return box + (parts[0],)
+    return None
+
+
+def minify_css_content(content, image_set=None):
+    """
+    Minify a stylesheet in one pass over its tokens
+
+    Comments are dropped and whitespace is collapsed; strings and url() tokens
+    are copied unchanged. With image_set, the url() references of background
+    and background-image declarations are rewritten in the same pass; each
+    rewritten declaration is preceded by its original as a fallback.
+
+    Args:
+        content (str): Stylesheet
+        image_set (callable): Called as image_set(url, size) with the rule's size from
+                              rule_background_size(); returns the image-set() candidates
+                              or None to keep the url()
+
+    Returns:
+        tuple: (minified CSS, number of url() references rewritten)
+    """
+    blocks = []          # Enclosing blocks: (pieces, kind)
+    pieces = []          # Finished statements of the current block
+    kind = 'top'         # 'top', 'at' (contains rules) or 'rule' (contains declarations)
+    statement = []       # Current statement; url() tokens of background declarations are tuples
+    last = ''
+    space = False
+    rewritten = 0
+    i = 0
+    length = len(content)
+
+    def statement_text():
+        return ''.join(part if isinstance(part, str) else part[0] for part in statement)
+
+    def emit(text, piece=None):
+        nonlocal last, space
+        if space and last and last not in CSS_NO_SPACE_AFTER and text[0] not in CSS_NO_SPACE_BEFORE \
+                and not (text[0] == ':' and kind == 'rule'):
+            statement.append(' ')
+        space = False
+        statement.append(piece or text)
+        last = text[-1]
+
+    def end_statement():
+        nonlocal statement
+        if any(isinstance(part, tuple) for part in statement):
+            pieces.append(_CSSDeclaration(statement))
+        elif statement:
+            pieces.append(''.join(statement))
+        statement = []
+
+    def render_block(block_pieces, closed=True):
+        nonlocal rewritten
+        # The last declaration of a block needs no semicolon
+        if closed and block_pieces and block_pieces[-1] == ';':
+            block_pieces = block_pieces[:-1]
+        body = ''.join(piece if isinstance(piece, str) else piece.render()[0] for piece in block_pieces)
+        size = rule_background_size(body) if image_set else None
+        parts = []
+        for piece in block_pieces:
+            if isinstance(piece, _CSSDeclaration):
+                text, count = piece.render(image_set, size)
+                rewritten += count
+                parts.append(text)
+            else:
+                parts.append(piece)
+        return ''.join(parts)
+
+    while i < length:
+        char = content[i]
+        if content.startswith('/*', i):
+            end = content.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+            space = True
+        elif char.isspace():
+            space = True
+            i += 1
+        elif char in '"\'':
+            end = i + 1
+            while end < length and content[end] != char:
+                end += 2 if content[end] == '\\' else 1
+            emit(content[i:end + 1])
+            i = end + 1
+        elif content[i:i + 4].lower() == 'url(' and (i == 0 or not CSS_NAME_CHAR.match(content[i - 1])):
+            end = i + 4
+            while end < length and content[end].isspace():
+                end += 1
+            if end < length and content[end] in '"\'':
+                quote = content[end]
+                start = end + 1
+                end = start
+                while end < length and content[end] != quote:
+                    end += 2 if content[end] == '\\' else 1
+                url = content[start:end]
+                value = content[start - 1:end + 1]
+                end = content.find(')', end + 1)
+            else:
+                close = content.find(')', end)
+                value = url = content[end:close if close != -1 else length].strip()
+                end = close
+            end = length if end == -1 else end
+            token = f"url({value})"
+            text = statement_text()
+            name, colon, declaration = text.partition(':')
+            if image_set and kind == 'rule' and colon and name.strip().lower() in IMAGE_SET_PROPERTIES \
+                    and 'image-set(' not in declaration.lower():
+                emit(token, (token, url))
+            else:
+                emit(token)
+            i = end + 1
+        elif char == ';':
+            end_statement()
+            if pieces and pieces[-1] != ';':
+                pieces.append(';')
+            last = ';'
+            space = False
+            i += 1
+        elif char == '{':
+            prelude = statement_text()
+            statement = []
+            blocks.append((pieces + [prelude], kind))
+            lowered = prelude.lstrip().lower()
+            kind = 'at' if lowered.startswith('@') and not lowered.startswith(('@font-face', '@page')) else 'rule'
+            pieces = []
+            last = '{'
+            space = False
+            i += 1
+        elif char == '}' and blocks:
+            end_statement()
+            body = render_block(pieces)
+            pieces, kind = blocks.pop()
+            pieces.append('{' + body + '}')
+            last = '}'
+            space = False
+            i += 1
+        else:
+            emit(char)
+            i += 1
+
+    end_statement()
+    while blocks:
+        # Unclosed blocks at the end of the file
+        body = render_block(pieces)
+        pieces, kind = blocks.pop()
+        pieces.append('{' + body)
+    return render_block(pieces, closed=False).strip(), rewritten
+
+
+def css_image_set(css_path, site_dir, generate=True, quality=85, cache=None):
+    """
+    Build the image_set callback of minify_css_content() for a stylesheet
+
+    A PNG or JPEG background image is offered as image-set() with its AVIF
+    and WebP versions (when they exist next to it) ahead of the original.
+    When the rule determines the rendered size, right-sized WebP variants for
+    1x and 2x displays are added (generated with audit_image_sizes.py when
+    generate is set) and every candidate gets its resolution, so a 2x screen
+    downloads the 2x variant rather than the full image.
+
+    Args:
+        css_path (str): Stylesheet the URLs are relative to
+        site_dir (str): Website root directory
+        generate (bool): Generate missing right-sized variants
+        quality (int): Quality of generated variants (0-100)
+        cache (ArtifactCache): Artifact cache for generated variants
+
+    Returns:
+        callable: image_set(url, size) -> list of candidate strings or None
+    """
+    css_dir = os.path.dirname(css_path)
+
+    def candidate_url(url, path):
+        if url.startswith('/'):
+            relative = '/' + os.path.relpath(path, site_dir)
+        else:
+            relative = os.path.relpath(path, css_dir)
+        return relative.replace(os.sep, '/')
+
+    def image_set(url, size):
+        path, external = resolve_url(url, css_path, site_dir)
+        if external or not path or not path.lower().endswith(IMAGE_SET_SOURCES) or not os.path.isfile(path):
+            return None
+        stem = os.path.splitext(path)[0]
+        original_type = IMAGE_SET_SOURCE_TYPES[os.path.splitext(path)[1].lower()]
+        types = [mime for _, mime in IMAGE_SET_FORMATS] + [original_type]
+        try:
+            with Image.open(path) as img:
+                intrinsic = img.size
+        except Exception as e:
+            print(f"  Skipping {url} in {os.path.basename(css_path)} ({e})")
+            return None
+
+        # (file, pixel width, type) of every version of the image
+        versions = [(stem + extension, intrinsic[0], mime) for extension, mime in IMAGE_SET_FORMATS
+                    if os.path.isfile(stem + extension)]
+        display_width = None
+        if size:
+            width, height, fit = size
+            scaled = height * intrinsic[0] / intrinsic[1] if height and intrinsic[1] else None
+            if fit == 'fixed' or not (width and scaled):
+                display_width = width or scaled
+            else:
+                display_width = min(width, scaled) if fit == 'contain' else max(width, scaled)
+        if display_width:
+            display_width = round(display_width)
+            if generate:
+                variants = generate_sized_variants(path, display_width, quality, cache)
+            else:
+                variants = [(display_width * density, variant_path(path, display_width * density))
+                            for density in VARIANT_DENSITIES]
+            versions += [(variant, width, 'image/webp') for width, variant in variants if os.path.isfile(variant)]
+        if not versions:
+            return None
+
+        candidates = []
+        seen = set()
+        ordered = sorted(versions, key=lambda version: (version[1], types.index(version[2])))
+        for file_path, pixel_width, mime in ordered + [(path, intrinsic[0], original_type)]:
+            density = round(pixel_width / display_width, 2) if display_width else 1
+            if (density, mime) in seen:
+                continue
+            seen.add((density, mime))
+            file_url = url if file_path == path else candidate_url(url, file_path)
+            resolution = f" {density:g}x" if display_width else ''
+            candidates.append(f'url("{file_url}"){resolution} type("{mime}")')
+        return candidates
+
+    return image_set
+
+
+def build_output_index(directory, scan=None, webp=False):
+    """
+    Map assets to the optimized versions that exist next to them, from one listing of the site
+
+    Args:
+        directory (str): Website root directory
+        scan (SiteScan): File listing to use instead of scanning directory
+        webp (bool): Also map PNG, JPEG and GIF images to their WebP versions
+
+    Returns:
+        dict: Absolute source path -> extension of its optimized version ('.min.css', '.min.js' or '.webp')
+    """
+    scan = scan or scan_site(directory)
+    available = {os.path.abspath(path) for path in scan.paths()}
+    index = {}
+    for path in scan.paths(('.css', '.js')):
+        root, extension = os.path.splitext(path)
+        if not root.endswith('.min') and os.path.abspath(root + '.min' + extension) in available:
+            index[os.path.abspath(path)] = '.min' + extension
+    if webp:
+        for path in scan.paths(('.png', '.jpg', '.jpeg', '.gif')):
+            if os.path.abspath(os.path.splitext(path)[0] + '.webp') in available:
+                index[os.path.abspath(path)] = '.webp'
+    return index
+
+def _attribute_value(raw, attribute):
+    """Match of an attribute in a start tag's text, with the value in group 1, 2 or 3 (by quoting)"""
+    return re.search(r'\s' + attribute + r'\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'=<>`]+))', raw, re.IGNORECASE)
+
+def _set_attribute(raw, attribute, value):
+    """Return a start tag's text with an attribute set to value, replacing it or adding it at the end"""
+    match = _attribute_value(raw, attribute)
+    if match:
+        group = next(number for number in (1, 2, 3) if match.group(number) is not None)
+        return raw[:match.start(group)] + value + raw[match.end(group):]
+    end = len(raw) - (2 if raw.endswith('/>') else 1)
+    head = raw[:end].rstrip()
+    return head + f' {attribute}="{value}"' + raw[len(head):]
+
+class ReferenceRewriter(HTMLParser):
+    """
+    Collects the edits that point a page's asset references at their optimized versions
 
-def update_html_references(directory):
-    """Update HTML files to reference minified CSS and JS files"""
-    html_files = [f for f in os.listdir(directory) if f.endswith('.html')]
+    Only the href of <link>, the src of <script> and, with images enabled, the
+    src of <img> outside <picture> are changed (a <picture> keeps its original
+    as the fallback). The only <link> pointed at a WebP image is an image
+    preload, whose type is set to match; icons and other image links keep the
+    formats their consumers expect. References in text, comments and scripts
+    are left alone.
+    """
+
+    def __init__(self, content, page_path, directory, index, images=False):
+        super().__init__(convert_charrefs=True)
+        self.page_path = page_path
+        self.directory = directory
+        self.index = index
+        self.images = images
+        self.edits = []
+        self.counts = {'css': 0, 'js': 0, 'images': 0}
+        self._picture_depth = 0
+        # Offsets of the line starts, to turn getpos() into an offset in content
+        self._line_starts = [0] + [match.end() for match in re.finditer('\n', content)]
+
+    def _rewrite_value(self, value):
+        """Return the value with the file's extension swapped, or None if there is no optimized version"""
+        local, _ = resolve_url(html.unescape(value), self.page_path, self.directory)
+        extension = self.index.get(os.path.abspath(local)) if local else None
+        if extension is None:
+            return None
+        path = re.split(r'[?#]', value, maxsplit=1)[0]
+        return os.path.splitext(path)[0] + extension + value[len(path):]
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'picture':
+            self._picture_depth += 1
+            return
+        attribute = REFERENCE_ATTRIBUTES.get(tag)
+        if attribute is None or (tag == 'img' and (not self.images or self._picture_depth)):
+            return
+
+        raw = self.get_starttag_text()
+        match = _attribute_value(raw, attribute)
+        if not match:
+            return
+        group = next(number for number in (1, 2, 3) if match.group(number) is not None)
+        new_value = self._rewrite_value(match.group(group))
+        if new_value is None:
+            return
+        extension = os.path.splitext(new_value.split('?')[0].split('#')[0])[1]
+
+        new_raw = raw[:match.start(group)] + new_value + raw[match.end(group):]
+        if extension == '.webp' and tag != 'img':
+            values = {name: (value or '').lower() for name, value in attrs}
+            if tag != 'link' or 'preload' not in values.get('rel', '').split() or values.get('as') != 'image':
+                return
+            new_raw = _set_attribute(new_raw, 'type', 'image/webp')
+        elif extension != '.webp' and tag == 'img':
+            return
+
+        line, column = self.getpos()
+        start = self._line_starts[line - 1] + column
+        self.edits.append((start, start + len(raw), new_raw))
+        self.counts['images' if extension == '.webp' else extension.lstrip('.')] += 1
+
+    def handle_endtag(self, tag):
+        if tag == 'picture' and self._picture_depth:
+            self._picture_depth -= 1
+
+def rewrite_page_references(page_path, directory, index, images=False):
+    """
+    Point one page at the optimized assets in a single parsing pass
+
+    The page is only written when a reference changed.
+
+    Returns:
+        dict: Number of CSS, JS and image references changed
+    """
+    with open(page_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    rewriter = ReferenceRewriter(content, page_path, directory, index, images)
+    rewriter.feed(content)
+    rewriter.close()
+    if not rewriter.edits:
+        return rewriter.counts
+
+    # Edits come in document order, so the page is rebuilt in one pass
+    parts = []
+    position = 0
+    for start, end, replacement in rewriter.edits:
+        parts.append(content[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(content[position:])
+    with atomic_open(page_path, 'w', encoding='utf-8') as f:
+        f.write(''.join(parts))
+    return rewriter.counts
+
+def update_html_references(directory, scan=None, webp=False, workers=None):
+    """
+    Update every HTML page of the site to reference minified CSS and JS files
+
+    Args:
+        directory (str): Website root directory
+        scan (SiteScan): File listing to use instead of scanning directory
+        webp (bool): Also point <img> tags outside <picture> and image preloads at existing WebP versions
+        workers (int): Number of worker processes (default: one per CPU)
+
+    Returns:
+        int: Number of pages rewritten
+    """
+    scan = scan or scan_site(directory)
+    html_files = find_pages(directory, scan)
     
     if not html_files:
         print("No HTML files found.")
-        return
+        return 0
     
-    print(f"Found {len(html_files)} HTML files to update.")
+    index = build_output_index(directory, scan, webp)
+    print(f"Found {len(html_files)} HTML files to update ({len(index)} assets have optimized versions).")
     
-    for html_file in html_files:
-        html_path = os.path.join(directory, html_file)
-        print(f"Processing {html_file}...")
-        
-        try:
-            with open(html_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Replace CSS references
-            css_replacements = 0
-            for css_match in re.finditer(r'<link\s+[^>]*href=["\'](.*?\.css)["\'][^>]*>', content):
-                css_file = css_match.group(1)
-                if '.min.css' not in css_file:
-                    min_css = css_file.replace('.css', '.min.css')
-                    if os.path.exists(os.path.join(directory, min_css.lstrip('/'))):
-                        content = content.replace(css_file, min_css)
-                        css_replacements += 1
-            
-            # Replace JS references
-            js_replacements = 0
-            for js_match in re.finditer(r'<script\s+[^>]*src=["\'](.*?\.js)["\'][^>]*>', content):
-                js_file = js_match.group(1)
-                if '.min.js' not in js_file:
-                    min_js = js_file.replace('.js', '.min.js')
-                    if os.path.exists(os.path.join(directory, min_js.lstrip('/'))):
-                        content = content.replace(js_file, min_js)
-                        js_replacements += 1
-            
-            # Write updated content back to file
-            with open(html_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            print(f"  ✓ Updated {html_file}: {css_replacements} CSS and {js_replacements} JS references")
-        
-        except Exception as e:
-            print(f"  × Error updating {html_file}: {e}")
+    updated = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT) as executor:
+        futures = [(html_file, executor.submit(rewrite_page_references, html_file, directory, index, webp))
+                   for html_file in html_files]
+        for html_file, future in futures:
+            name = os.path.relpath(html_file, directory)
+            try:
+                counts = future.result()
+            except Exception as e:
+                print(f"  × Error updating {name}: {e}")
+                continue
+            if any(counts.values()):
+                updated += 1
+                images = f" and {counts['images']} image" if webp else ""
+                print(f"  ✓ Updated {name}: {counts['css']} CSS, {counts['js']} JS{images} references")
+    
+    print(f"{updated} pages updated, {len(html_files) - updated} unchanged.")
+    return updated
+
+class HTMLMinifier(HTMLParser):
+    """
+    Streaming HTML minifier
+
+    Feed the page in chunks and collect the output with drain(). Whitespace is
+    collapsed, and removed entirely next to block-level elements. Comments
+    (except conditional comments) are dropped, and attribute quotes and default
+    attribute values are removed where that is safe. <pre>, <textarea>,
+    <script> and <style> contents are kept as they are, except JSON-LD, which
+    is compacted.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.output = []
+        self.text = []
+        self.preserve_depth = 0
+        self.foreign_depth = 0
+        self.in_head = False
+        self.previous_block = True
+        self.raw_tag = None
+        self.raw_type = None
+
+    def drain(self):
+        """Return and clear the output produced so far"""
+        chunk = ''.join(self.output)
+        self.output = []
+        return chunk
+
+    def close(self):
+        super().close()
+        self._flush_text(next_block=True)
+
+    def _flush_text(self, next_block):
+        """Emit the buffered text run, collapsing whitespace around it"""
+        if not self.text:
+            return
+        text = ''.join(self.text)
+        self.text = []
+
+        if self.preserve_depth:
+            self.output.append(text)
+            return
+
+        text = re.sub(r'\s+', ' ', text)
+        # Nothing in <head> renders, so whitespace between its elements can go
+        if self.in_head and not text.strip():
+            return
+        if self.previous_block:
+            text = text.lstrip(' ')
+        if next_block:
+            text = text.rstrip(' ')
+        if text:
+            self.output.append(text)
+            self.previous_block = False
+
+    def _attributes(self, tag, self_closing, closing_slash):
+        """
+        Serialize the attributes of the current tag from its source text
+
+        Args:
+            tag (str): Tag name
+            self_closing (bool): The parser read the tag as self-closing ("/>"); otherwise a trailing "/"
+                                 belongs to an unquoted value, as in <a href=foo/>
+            closing_slash (bool): The output keeps the "/" of a self-closing tag
+        """
+        raw = self.get_starttag_text()
+        raw = raw[1 + len(tag):].rstrip('>').rstrip()
+        if self_closing and raw.endswith('/'):
+            raw = raw[:-1]
+
+        attributes = []
+        for match in ATTRIBUTE_PATTERN.finditer(raw):
+            name = match.group(1)
+            value = next((group for group in match.group(2, 3, 4) if group is not None), None)
+            if value is None:
+                attributes.append(name)
+                continue
+            if name.lower() == 'class':
+                value = ' '.join(value.split())
+            if value.lower() in DEFAULT_ATTRIBUTES.get((tag, name.lower()), ()):
+                continue
+            attributes.append((name, value))
+
+        parts = []
+        for index, attribute in enumerate(attributes):
+            if isinstance(attribute, str):
+                parts.append(attribute)
+                continue
+            name, value = attribute
+            # A trailing unquoted value would swallow the "/" of a self-closing tag, and a value
+            # ending in "/" before ">" reads as a self-closing tag to some parsers
+            last_before_slash = closing_slash and index == len(attributes) - 1
+            if UNQUOTED_VALUE.match(value) and not last_before_slash and \
+                    not (value.endswith('/') and index == len(attributes) - 1):
+                parts.append(f'{name}={value}')
+            elif '"' in value:
+                parts.append(f"{name}='{value}'")
+            else:
+                parts.append(f'{name}="{value}"')
+        return ''.join(' ' + part for part in parts)
+
+    def _start(self, tag, attrs, self_closing):
+        block = tag in BLOCK_TAGS
+        self._flush_text(next_block=block)
+        if tag in ('head', 'body'):
+            self.in_head = tag == 'head'
+        foreign = self.foreign_depth or tag in ('svg', 'math')
+        slash = '/' if self_closing and foreign else ''
+        self.output.append(f'<{tag}{self._attributes(tag, self_closing, bool(slash))}{slash}>')
+        self.previous_block = block
+
+        if self_closing:
+            return
+        if foreign:
+            self.foreign_depth += 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth += 1
+        if tag in ('script', 'style'):
+            self.raw_tag = tag
+            self.raw_type = (dict(attrs).get('type') or '').strip().lower()
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs, self_closing=False)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs, self_closing=True)
+
+    def handle_endtag(self, tag):
+        if self.raw_tag == tag:
+            self._flush_raw()
+        else:
+            self._flush_text(next_block=tag in BLOCK_TAGS)
+        if tag == 'head':
+            self.in_head = False
+        if tag in PRESERVE_WHITESPACE_TAGS and self.preserve_depth:
+            self.preserve_depth -= 1
+        if self.foreign_depth:
+            self.foreign_depth -= 1
+        self.output.append(f'</{tag}>')
+        self.previous_block = tag in BLOCK_TAGS
+
+    def _flush_raw(self):
+        """Emit <script>/<style> content unchanged, compacting JSON-LD"""
+        content = ''.join(self.text)
+        self.text = []
+        if self.raw_type == 'application/ld+json':
+            try:
+                content = json.dumps(json.loads(content), ensure_ascii=False, separators=(',', ':'))
+                # Keep a "</script>" inside a string value from closing the element
+                content = content.replace('</', '<\\/')
+            except ValueError:
+                pass
+        self.output.append(content)
+        self.raw_tag = None
+        self.raw_type = None
+
+    def handle_data(self, data):
+        self.text.append(data)
+
+    def handle_entityref(self, name):
+        self.text.append(f'&{name};')
+
+    def handle_charref(self, name):
+        self.text.append(f'&#{name};')
+
+    def handle_comment(self, data):
+        # Conditional comments carry markup for old browsers
+        if data.startswith('[if') or data.startswith('<![endif'):
+            self._flush_text(next_block=False)
+            self.output.append(f'<!--{data}-->')
+
+    def handle_decl(self, decl):
+        self._flush_text(next_block=True)
+        self.output.append(f'<!{decl}>')
+        self.previous_block = True
+
+    def handle_pi(self, data):
+        self._flush_text(next_block=False)
+        self.output.append(f'<?{data}>')
+
+    def unknown_decl(self, data):
+        self._flush_text(next_block=False)
+        self.output.append(f'<![{data}]>')
+
+def minify_html(content):
+    """Minify an HTML document held in memory"""
+    minifier = HTMLMinifier()
+    minifier.feed(content)
+    minifier.close()
+    return minifier.drain()
+
+def minify_html_file(html_file, output_file):
+    """
+    Minify one HTML page, streaming it through the tokenizer in chunks
+
+    Returns:
+        dict: Source and output paths with raw and gzip sizes before and after
+    """
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    minifier = HTMLMinifier()
+    original = []
+    with open(html_file, 'r', encoding='utf-8') as source, atomic_open(output_file, 'w', encoding='utf-8') as target:
+        for chunk in iter(lambda: source.read(HTML_CHUNK_SIZE), ''):
+            original.append(chunk)
+            minifier.feed(chunk)
+            target.write(minifier.drain())
+        minifier.close()
+        target.write(minifier.drain())
+
+    with open(output_file, 'rb') as f:
+        minified = f.read()
+    original = ''.join(original).encode('utf-8')
+    return dict(source=html_file, output=output_file,
+                gzip_bytes_before=len(gzip.compress(original, mtime=0)),
+                gzip_bytes_after=len(gzip.compress(minified, mtime=0)),
+                **size_summary(len(original), len(minified)))
+
+def minify_html_pages(directory, output_dir=None, workers=None, report=None, scan=None):
+    """
+    Minify every HTML page of a site in parallel
+
+    Args:
+        directory (str): Website root directory
+        output_dir (str): Where minified pages are written, preserving folder structure (default: dist/ inside the site)
+        workers (int): Number of worker processes (default: one per CPU)
+        report (list): Optional list that receives a machine-readable size entry per page
+        scan (SiteScan): File listing to use instead of scanning directory
+
+    Returns:
+        int: Number of pages minified
+    """
+    output_dir = output_dir or os.path.join(directory, HTML_OUTPUT_DIR)
+    pages = [page for page in find_pages(directory, scan)
+             if not os.path.abspath(page).startswith(os.path.abspath(output_dir) + os.sep)]
+    if not pages:
+        print("No HTML files found.")
+        return 0
+
+    print(f"Minifying {len(pages)} HTML pages -> {output_dir}")
+    minified_count = 0
+    total_original_size = 0
+    total_minified_size = 0
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT) as executor:
+        futures = [(page, executor.submit(minify_html_file, page,
+                                          os.path.join(output_dir, os.path.relpath(page, directory))))
+                   for page in pages]
+        for page, future in futures:
+            try:
+                entry = future.result()
+            except Exception as e:
+                print(f"× Error minifying {page}: {e}")
+                continue
+            saved = entry['bytes_before'] - entry['bytes_after']
+            print(f"✓ {os.path.relpath(page, directory)}: {entry['bytes_before']:,} bytes → "
+                  f"{entry['bytes_after']:,} bytes ({saved:,} bytes saved, "
+                  f"gzip {entry['gzip_bytes_before']:,} → {entry['gzip_bytes_after']:,})")
+            total_original_size += entry['bytes_before']
+            total_minified_size += entry['bytes_after']
+            minified_count += 1
+            if report is not None:
+                report.append(dict(stage='minify-html', **entry))
+
+    if minified_count:
+        reduction = (1 - total_minified_size / total_original_size) * 100
+        print(f"HTML total: {total_original_size:,} bytes → {total_minified_size:,} bytes ({reduction:.1f}% reduction)")
+    return minified_count
 
 if __name__ == "__main__":
-    print("CSS and JavaScript Minifier")
-    print("==========================")
+    print("CSS, JavaScript and HTML Minifier")
+    print("=================================")
     
     if not check_requirements():
         exit(1)
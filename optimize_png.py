@@ -0,0 +1,431 @@
+# Lossless PNG Optimization Script
+# This script requires Python, Pillow and NumPy
+# Install with: pip install Pillow numpy
+
+import os
+import io
+import json
+import time
+import zlib
+import struct
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from atomic_output import atomic_open, atomic_write
+from audit_performance import size_summary
+from site_scanner import scan_site
+
+"""
+Lossless PNG optimizer for images that have to stay PNG (logos, social
+images, <picture> fallbacks). Every file is re-encoded from its decoded
+pixels: metadata chunks are dropped, the smallest color type and bit depth
+the pixels allow is chosen, and several PNG filters and zlib strategies are
+tried in parallel. A candidate is only kept when it decodes to exactly the
+same RGBA pixels as the original.
+
+Optimized files are recorded in a manifest so they are processed only once.
+"""
+
+# Manifest of already optimized PNGs (relative path -> hash of optimized file)
+MANIFEST_NAME = '.png_optimization_manifest.json'
+
+# zlib strategies tried for every candidate encoding
+ZLIB_STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'rle': zlib.Z_RLE,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'fixed': zlib.Z_FIXED,
+}
+
+# PNG row filters (type byte per the PNG spec) plus per-row adaptive selection
+PNG_FILTERS = ('none', 'sub', 'up', 'average', 'paeth', 'adaptive')
+
+# Only these modes are re-encoded. Pillow also opens 16-bit RGB/RGBA PNGs as 'RGB'/'RGBA'
+# (truncated to 8 bits), so those are found from the IHDR bit depth instead (see png_bit_depth)
+SUPPORTED_MODES = ('1', 'L', 'LA', 'P', 'PA', 'RGB', 'RGBA')
+
+# Offset of the bit depth byte in a PNG file: signature, chunk length and type, width and height
+IHDR_BIT_DEPTH_OFFSET = 24
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# PNG color types (IHDR) whose ICC profile has to be a gray one
+GRAY_COLOR_TYPES = (0, 4)
+
+# sRGB rendering intent and the gAMA value that goes with it (1/2.2 * 100000)
+SRGB_PERCEPTUAL = 0
+SRGB_GAMMA = 45455
+
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(source_dir):
+    """Load the PNG optimization manifest for a directory (empty if missing)"""
+    manifest_path = os.path.join(source_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(source_dir, manifest):
+    """Write the PNG optimization manifest for a directory"""
+    manifest_path = os.path.join(source_dir, MANIFEST_NAME)
+    with atomic_open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def _png_chunk(chunk_type, data):
+    """Build a single PNG chunk with length and CRC"""
+    crc = zlib.crc32(chunk_type + data) & 0xffffffff
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', crc)
+
+
+def _pack_bits(samples, bit_depth):
+    """Pack a (height, width) array of small integers into PNG rows"""
+    if bit_depth == 8:
+        return samples.astype(np.uint8)
+    height, width = samples.shape
+    per_byte = 8 // bit_depth
+    padded_width = -(-width // per_byte) * per_byte
+    padded = np.zeros((height, padded_width), dtype=np.uint8)
+    padded[:, :width] = samples
+    grouped = padded.reshape(height, padded_width // per_byte, per_byte)
+    shifts = (8 - bit_depth) - bit_depth * np.arange(per_byte, dtype=np.uint8)
+    return np.bitwise_or.reduce(grouped << shifts, axis=2).astype(np.uint8)
+
+
+def _smallest_depth(max_value):
+    """Smallest PNG bit depth (1, 2, 4 or 8) that can hold max_value"""
+    for depth in (1, 2, 4):
+        if max_value < (1 << depth):
+            return depth
+    return 8
+
+
+def _candidate_encodings(rgba):
+    """
+    Build the candidate PNG representations for an RGBA pixel array
+
+    Returns a list of dicts with the IHDR color type and bit depth, the
+    unfiltered scanlines, the filter stride in bytes and any PLTE/tRNS data.
+    """
+    height, width = rgba.shape[:2]
+    rgb = rgba[:, :, :3]
+    alpha = rgba[:, :, 3]
+    alpha_used = bool((alpha != 255).any())
+    is_gray = bool((rgba[:, :, 0] == rgba[:, :, 1]).all() and (rgba[:, :, 1] == rgba[:, :, 2]).all())
+
+    candidates = []
+
+    # Truecolor (drops the alpha channel when every pixel is opaque)
+    if alpha_used:
+        candidates.append({'name': 'rgba', 'color_type': 6, 'bit_depth': 8,
+                           'rows': rgba.reshape(height, width * 4), 'stride': 4})
+    else:
+        candidates.append({'name': 'rgb', 'color_type': 2, 'bit_depth': 8,
+                           'rows': np.ascontiguousarray(rgb).reshape(height, width * 3), 'stride': 3})
+
+    # Grayscale, with reduced bit depth when all levels fall on the smaller grid
+    if is_gray:
+        gray = rgba[:, :, 0]
+        if alpha_used:
+            gray_alpha = np.stack([gray, alpha], axis=2)
+            candidates.append({'name': 'gray+alpha', 'color_type': 4, 'bit_depth': 8,
+                               'rows': gray_alpha.reshape(height, width * 2), 'stride': 2})
+        else:
+            depth = 8
+            for candidate_depth in (1, 2, 4):
+                scale = 255 // ((1 << candidate_depth) - 1)
+                if not (gray % scale).any():
+                    depth = candidate_depth
+                    break
+            samples = gray // (255 // ((1 << depth) - 1))
+            candidates.append({'name': f'gray{depth}', 'color_type': 0, 'bit_depth': depth,
+                               'rows': _pack_bits(samples, depth), 'stride': 1})
+
+    # Palette when the image has at most 256 distinct RGBA colors
+    packed = np.ascontiguousarray(rgba).view(np.uint32).reshape(-1)
+    colors, inverse = np.unique(packed, return_inverse=True)
+    if len(colors) <= 256:
+        palette = colors.view(np.uint8).reshape(-1, 4)
+        # Put translucent entries first so the tRNS chunk stays short
+        order = np.argsort(palette[:, 3] == 255, kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        palette = palette[order]
+        indices = rank[inverse.reshape(-1)].reshape(height, width)
+        depth = _smallest_depth(len(palette) - 1)
+        translucent = int((palette[:, 3] != 255).sum())
+        candidates.append({
+            'name': f'palette{depth}',
+            'color_type': 3,
+            'bit_depth': depth,
+            'rows': _pack_bits(indices, depth),
+            'stride': 1,
+            'plte': palette[:, :3].tobytes(),
+            'trns': palette[:translucent, 3].tobytes() if translucent else None,
+        })
+
+    return candidates
+
+
+def _filter_rows(rows, stride, filter_name):
+    """
+    Apply a PNG filter to all scanlines at once
+
+    PNG filters are defined on the unfiltered bytes of the current and
+    previous scanline, so every row can be filtered in one vectorized step.
+    Returns the filtered scanlines with the filter type byte prepended.
+    """
+    rows = rows.astype(np.int16)
+    height, row_bytes = rows.shape
+    left = np.zeros_like(rows)
+    left[:, stride:] = rows[:, :-stride]
+    up = np.zeros_like(rows)
+    up[1:] = rows[:-1]
+    up_left = np.zeros_like(rows)
+    up_left[1:, stride:] = rows[:-1, :-stride]
+
+    def paeth():
+        estimate = left + up - up_left
+        dist_left = np.abs(estimate - left)
+        dist_up = np.abs(estimate - up)
+        dist_up_left = np.abs(estimate - up_left)
+        predictor = np.where((dist_left <= dist_up) & (dist_left <= dist_up_left), left,
+                             np.where(dist_up <= dist_up_left, up, up_left))
+        return rows - predictor
+
+    filters = {
+        'none': lambda: rows,
+        'sub': lambda: rows - left,
+        'up': lambda: rows - up,
+        'average': lambda: rows - (left + up) // 2,
+        'paeth': paeth,
+    }
+
+    if filter_name == 'adaptive':
+        # Pick the filter with the lowest sum of absolute signed bytes per row
+        filtered = np.stack([(filters[name]() & 0xff).astype(np.uint8)
+                             for name in ('none', 'sub', 'up', 'average', 'paeth')])
+        costs = np.abs(filtered.view(np.int8).astype(np.int32)).sum(axis=2)
+        filter_types = costs.argmin(axis=0).astype(np.uint8)
+        chosen = filtered[filter_types, np.arange(height)]
+    else:
+        filter_types = np.full(height, PNG_FILTERS.index(filter_name), dtype=np.uint8)
+        chosen = (filters[filter_name]() & 0xff).astype(np.uint8)
+
+    return np.concatenate([filter_types[:, None], chosen], axis=1).tobytes()
+
+
+def _compress(data, strategy):
+    """Deflate filtered scanlines with the given zlib strategy"""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _build_png(candidate, width, height, idat, color_chunks):
+    """Assemble a PNG file from a candidate encoding and its compressed data"""
+    ihdr = struct.pack('>IIBBBBB', width, height, candidate['bit_depth'], candidate['color_type'], 0, 0, 0)
+    png = PNG_SIGNATURE + _png_chunk(b'IHDR', ihdr)
+    for chunk in color_chunks:
+        png += chunk
+    if candidate.get('plte'):
+        png += _png_chunk(b'PLTE', candidate['plte'])
+    if candidate.get('trns'):
+        png += _png_chunk(b'tRNS', candidate['trns'])
+    png += _png_chunk(b'IDAT', idat)
+    png += _png_chunk(b'IEND', b'')
+    return png
+
+
+def png_bit_depth(png_path):
+    """Bit depth per sample from a PNG's IHDR chunk (None if the file is not a PNG)"""
+    with open(png_path, 'rb') as f:
+        header = f.read(IHDR_BIT_DEPTH_OFFSET + 1)
+    if len(header) <= IHDR_BIT_DEPTH_OFFSET or not header.startswith(PNG_SIGNATURE) or header[12:16] != b'IHDR':
+        return None
+    return header[IHDR_BIT_DEPTH_OFFSET]
+
+
+def _color_chunks(info, color_type):
+    """
+    Keep the chunks that affect how colors render; everything else is metadata
+
+    An ICC profile is only valid for the color type it was made for (gray or
+    RGB). When the chosen encoding switches between the two, the profile is
+    replaced by sRGB and gAMA chunks, which is how browsers show untagged
+    images anyway.
+    """
+    chunks = []
+    icc_profile = info.get('icc_profile')
+    profile_space = b'GRAY' if color_type in GRAY_COLOR_TYPES else b'RGB '
+    if icc_profile and icc_profile[16:20] == profile_space:
+        chunks.append(_png_chunk(b'iCCP', b'ICC Profile\x00\x00' + zlib.compress(icc_profile, 9)))
+    elif icc_profile:
+        chunks.append(_png_chunk(b'sRGB', bytes([SRGB_PERCEPTUAL])))
+        chunks.append(_png_chunk(b'gAMA', struct.pack('>I', SRGB_GAMMA)))
+    else:
+        if 'srgb' in info:
+            chunks.append(_png_chunk(b'sRGB', bytes([int(info['srgb'])])))
+        if 'gamma' in info:
+            chunks.append(_png_chunk(b'gAMA', struct.pack('>I', int(round(info['gamma'] * 100000)))))
+    return chunks
+
+
+def optimize_png_file(png_path, workers=None):
+    """
+    Losslessly re-encode a single PNG file in place
+
+    Args:
+        png_path (str): Path of the PNG file
+        workers (int): Number of threads used to try filter/strategy combinations
+
+    Returns:
+        tuple: (original_size, new_size, description of the winning encoding)
+               new_size equals original_size when the file was left unchanged
+    """
+    original_size = os.path.getsize(png_path)
+
+    with Image.open(png_path) as img:
+        if img.format != 'PNG':
+            raise ValueError("not a PNG file")
+        if getattr(img, 'is_animated', False):
+            return original_size, original_size, "animated PNG left unchanged"
+        if img.mode not in SUPPORTED_MODES:
+            return original_size, original_size, f"mode {img.mode} left unchanged"
+        # Re-encoding would drop the low 8 bits, which the RGBA comparison below cannot see
+        if png_bit_depth(png_path) == 16:
+            return original_size, original_size, "16-bit PNG left unchanged"
+        rgba = np.ascontiguousarray(np.asarray(img.convert('RGBA')))
+        info = dict(img.info)
+
+    height, width = rgba.shape[:2]
+    candidates = _candidate_encodings(rgba)
+    color_chunks = {candidate['color_type']: _color_chunks(info, candidate['color_type']) for candidate in candidates}
+
+    # Filter every candidate once, then compress each filtered buffer with every strategy
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        filtered = {
+            (idx, filter_name): executor.submit(_filter_rows, candidate['rows'], candidate['stride'], filter_name)
+            for idx, candidate in enumerate(candidates)
+            for filter_name in PNG_FILTERS
+        }
+        compressed = {
+            (idx, filter_name, strategy_name): executor.submit(_compress, future.result(), strategy)
+            for (idx, filter_name), future in filtered.items()
+            for strategy_name, strategy in ZLIB_STRATEGIES.items()
+        }
+        results = sorted(
+            ((len(future.result()), key, future.result()) for key, future in compressed.items()),
+            key=lambda item: item[0]
+        )
+
+    # Keep the smallest encoding that decodes to byte-identical pixels
+    for _, (idx, filter_name, strategy_name), idat in results:
+        candidate = candidates[idx]
+        png_data = _build_png(candidate, width, height, idat, color_chunks[candidate['color_type']])
+        if len(png_data) >= original_size:
+            break
+        with Image.open(io.BytesIO(png_data)) as check:
+            if not np.array_equal(np.asarray(check.convert('RGBA')), rgba):
+                continue
+
+        atomic_write(png_path, png_data)
+        return original_size, len(png_data), f"{candidate['name']}, {filter_name} filter, {strategy_name} strategy"
+
+    return original_size, original_size, "already optimal"
+
+
+def optimize_png(source_dir, workers=None, force=False, report=None, scan=None):
+    """
+    Losslessly optimize all PNG files in a directory (and its subdirectories)
+
+    Args:
+        source_dir (str): Directory to scan for PNG files
+        workers (int): Number of threads used per image (default: CPU count)
+        force (bool): Re-optimize files already recorded in the manifest
+        report (list): Optional list that receives a machine-readable size entry per optimized file
+        scan (SiteScan): File listing to use instead of scanning source_dir
+    """
+    success_count = 0
+    failure_count = 0
+    skipped_count = 0
+    total_size_before = 0
+    total_size_after = 0
+
+    start_time = time.time()
+    manifest = {} if force else load_manifest(source_dir)
+
+    print("\nScanning for PNG images...\n")
+    scan = scan or scan_site(source_dir)
+    for png_path in scan.paths(('.png',)):
+        rel_path = os.path.relpath(png_path, source_dir).replace('\\', '/')
+
+        # Skip files whose current content is a recorded optimizer output
+        entry = manifest.get(rel_path)
+        if entry and entry.get('sha256') == file_sha256(png_path):
+            print(f"Skipping {png_path} (already optimized)")
+            skipped_count += 1
+            continue
+
+        try:
+            original_size, new_size, details = optimize_png_file(png_path, workers)
+            total_size_before += original_size
+            total_size_after += new_size
+
+            manifest[rel_path] = {
+                'sha256': file_sha256(png_path),
+                'original_size': entry.get('original_size', original_size) if entry else original_size,
+                'size': new_size,
+            }
+
+            size_reduction = (1 - (new_size / original_size)) * 100
+            print(f"Optimized: {png_path} ({details})")
+            print(f"  Size: {original_size/1024:.1f}KB -> {new_size/1024:.1f}KB ({size_reduction:.1f}% reduction)")
+            if report is not None:
+                report.append(dict(stage='png', source=png_path, output=png_path, encoding=details,
+                                   **size_summary(original_size, new_size)))
+            success_count += 1
+        except Exception as e:
+            print(f"Error optimizing {png_path}: {e}")
+            failure_count += 1
+
+    save_manifest(source_dir, manifest)
+
+    elapsed_time = time.time() - start_time
+
+    print(f"\nPNG optimization complete in {elapsed_time:.1f} seconds!")
+    print(f"Successfully optimized: {success_count} images")
+    print(f"Failed optimizations: {failure_count} images")
+    print(f"Skipped (already optimized): {skipped_count} images")
+
+    if success_count > 0 and total_size_before > 0:
+        total_reduction = (1 - (total_size_after / total_size_before)) * 100
+        print(f"\nTotal size reduction: {total_size_before/1024/1024:.2f}MB -> {total_size_after/1024/1024:.2f}MB ({total_reduction:.1f}% reduction)")
+
+    return success_count, failure_count, skipped_count
+
+
+if __name__ == "__main__":
+    print("Lossless PNG Optimizer")
+    print("======================")
+
+    directory = input("Enter directory path (press Enter for current directory): ") or "."
+
+    if os.path.isdir(directory):
+        optimize_png(directory)
+    else:
+        print(f"Error: '{directory}' is not a valid directory.")
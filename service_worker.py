@@ -0,0 +1,321 @@
+# Service Worker Generator Script
+# This script only requires Python
+
+import os
+import re
+import json
+
+from artifact_cache import hash_bytes, hash_file
+from atomic_output import atomic_open
+from audit_performance import find_pages, parse_page, resolve_url
+
+"""
+Generates sw.js, a service worker that serves repeat visits from the Cache
+Storage API instead of the network, and registers it from every page.
+
+The precache manifest maps each URL of the optimized asset set (the pages
+and the stylesheets, scripts, images and icons they load) to a revision
+derived from its content hash. On install the worker compares the new
+manifest with the ones stored by its predecessors and downloads only the
+assets whose revision changed, copying the rest from the older cache.
+
+Every generated worker has its own revision and its own precache and runtime
+caches, so installing a new worker never changes the cache the active one
+serves from; the older caches are deleted when the new worker activates.
+Fingerprinted URLs (a content hash in the file name or a version in the
+query string) are served cache-first, other images, CSS and JS
+stale-while-revalidate, and pages network-first with the cache as the
+offline fallback.
+
+The manifest of the last generated worker is kept in precache-manifest.json
+so each run reports which assets an update will download.
+"""
+
+SERVICE_WORKER_NAME = 'sw.js'
+MANIFEST_NAME = 'precache-manifest.json'
+
+# Files larger than this are left to the runtime cache instead of being downloaded on install
+MAX_PRECACHE_FILE_BYTES = 512 * 1024
+
+# Resources from the page parser that are worth precaching
+PRECACHE_KINDS = ('stylesheet', 'script', 'image', 'preload', 'icon')
+
+REGISTRATION_ID = 'sw-register'
+REGISTRATION_SNIPPET = (f'<script id="{REGISTRATION_ID}">'
+                        "if ('serviceWorker' in navigator) {{ window.addEventListener('load', function () {{ "
+                        "navigator.serviceWorker.register('/{worker}'); }}); }}"
+                        '</script>\n')
+
+SERVICE_WORKER_TEMPLATE = """/* Service worker generated by service_worker.py - regenerate instead of editing */
+const CACHE_PREFIX = 'alfax10-';
+const REVISION = '{revision}';
+const PRECACHE = `${{CACHE_PREFIX}}precache-${{REVISION}}`;
+const RUNTIME = `${{CACHE_PREFIX}}runtime-${{REVISION}}`;
+const MANIFEST_KEY = '/__precache-manifest';
+
+// URL -> content revision of every precached asset
+const PRECACHE_MANIFEST = {manifest};
+
+// Fingerprinted URLs (a content hash in the file name or a version in the query) never change
+const FINGERPRINTED = /(?:[.-][0-9a-f]{{8,}}(?:\\.[a-z0-9]+)+$)|(?:[?&](?:v|ver|version|rev|hash)=)/i;
+const STATIC_ASSET = /\\.(?:webp|avif|png|jpe?g|gif|svg|ico|css|js|woff2?|ttf|otf)$/;
+
+self.addEventListener('install', (event) => {{
+  event.waitUntil((async () => {{
+    // Each revision installs into its own cache; the caches of the active worker are only read
+    const cache = await caches.open(PRECACHE);
+    const previous = {{}};
+    for (const name of await caches.keys()) {{
+      if (name === PRECACHE || !name.startsWith(`${{CACHE_PREFIX}}precache`)) {{
+        continue;
+      }}
+      const stored = await (await caches.open(name)).match(MANIFEST_KEY);
+      const revisions = stored ? await stored.json() : {{}};
+      for (const url of Object.keys(revisions)) {{
+        if (revisions[url] === PRECACHE_MANIFEST[url]) {{
+          previous[url] = name;
+        }}
+      }}
+    }}
+
+    // Assets whose revision is unchanged are copied from an older cache; only the others are downloaded
+    await Promise.all(Object.keys(PRECACHE_MANIFEST).map(async (url) => {{
+      if (previous[url]) {{
+        const cached = await (await caches.open(previous[url])).match(url);
+        if (cached) {{
+          await cache.put(url, cached);
+          return;
+        }}
+      }}
+      const response = await fetch(new Request(url, {{ cache: 'reload' }}));
+      if (!response.ok) {{
+        throw new Error(`Precaching ${{url}} failed with status ${{response.status}}`);
+      }}
+      await cache.put(url, response);
+    }}));
+
+    await cache.put(MANIFEST_KEY, new Response(JSON.stringify(PRECACHE_MANIFEST),
+      {{ headers: {{ 'Content-Type': 'application/json' }} }}));
+    await self.skipWaiting();
+  }})());
+}});
+
+self.addEventListener('activate', (event) => {{
+  event.waitUntil((async () => {{
+    // Drop the precache and runtime caches of older revisions
+    const names = await caches.keys();
+    await Promise.all(names.map((name) => {{
+      if (name.startsWith(CACHE_PREFIX) && name !== PRECACHE && name !== RUNTIME) {{
+        return caches.delete(name);
+      }}
+      return null;
+    }}));
+    await self.clients.claim();
+  }})());
+}});
+
+function cacheKey(request) {{
+  // The query string is kept: /app.js?v=2 and /app.js are different resources
+  const url = new URL(request.url);
+  const path = url.pathname.endsWith('/') ? url.pathname + 'index.html' : url.pathname;
+  return path + url.search;
+}}
+
+async function cached(key) {{
+  // Runtime entries are newer than the precached copy of the same URL
+  const runtime = await (await caches.open(RUNTIME)).match(key);
+  return runtime || (await caches.open(PRECACHE)).match(key);
+}}
+
+async function fetchAndStore(request, key) {{
+  const response = await fetch(request);
+  if (response.ok) {{
+    const cache = await caches.open(RUNTIME);
+    await cache.put(key, response.clone());
+  }}
+  return response;
+}}
+
+async function cacheFirst(request) {{
+  const key = cacheKey(request);
+  return (await cached(key)) || fetchAndStore(request, key);
+}}
+
+async function networkFirst(request) {{
+  const key = cacheKey(request);
+  try {{
+    return await fetchAndStore(request, key);
+  }} catch (error) {{
+    const fallback = await cached(key);
+    if (fallback) {{
+      return fallback;
+    }}
+    throw error;
+  }}
+}}
+
+async function staleWhileRevalidate(event) {{
+  const key = cacheKey(event.request);
+  const stored = await cached(key);
+  const network = fetchAndStore(event.request, key);
+  if (stored) {{
+    event.waitUntil(network.catch(() => null));
+    return stored;
+  }}
+  return network;
+}}
+
+self.addEventListener('fetch', (event) => {{
+  const request = event.request;
+  const url = new URL(request.url);
+  if (request.method !== 'GET' || url.origin !== self.location.origin) {{
+    return;
+  }}
+
+  if (request.mode === 'navigate' || (request.headers.get('Accept') || '').includes('text/html')) {{
+    event.respondWith(networkFirst(request));
+  }} else if (FINGERPRINTED.test(url.pathname + url.search)) {{
+    event.respondWith(cacheFirst(request));
+  }} else if (STATIC_ASSET.test(url.pathname)) {{
+    event.respondWith(staleWhileRevalidate(event));
+  }}
+}});
+"""
+
+
+def site_url_path(path, site_dir):
+    """Root-relative URL of a local file"""
+    return '/' + os.path.relpath(path, site_dir).replace(os.sep, '/')
+
+
+def collect_precache_assets(site_dir, scan=None):
+    """
+    Return the local files to precache: every page and the resources it loads
+
+    Files over MAX_PRECACHE_FILE_BYTES are skipped; the runtime cache picks
+    them up on first use instead.
+    """
+    assets = set()
+    for page in find_pages(site_dir, scan):
+        assets.add(os.path.normpath(page))
+        for resource in parse_page(page).resources:
+            if resource['kind'] not in PRECACHE_KINDS:
+                continue
+            local_path, external = resolve_url(resource['url'], page, site_dir)
+            if local_path and not external and os.path.isfile(local_path):
+                assets.add(os.path.normpath(local_path))
+
+    return sorted(path for path in assets
+                  if os.path.basename(path) != SERVICE_WORKER_NAME
+                  and os.path.getsize(path) <= MAX_PRECACHE_FILE_BYTES)
+
+
+def build_precache_manifest(site_dir, scan=None):
+    """Map the root-relative URL of every precached asset to a short content hash"""
+    return {site_url_path(path, site_dir): hash_file(path)[:16]
+            for path in collect_precache_assets(site_dir, scan)}
+
+
+def worker_revision(manifest):
+    """
+    Short revision that names the caches of a worker
+
+    It covers the manifest and the worker template, so a changed template
+    also gets fresh caches.
+    """
+    return hash_bytes((SERVICE_WORKER_TEMPLATE + json.dumps(manifest, sort_keys=True)).encode('utf-8'))[:12]
+
+
+def register_service_worker(site_dir, worker_name=SERVICE_WORKER_NAME, scan=None):
+    """
+    Add the registration snippet before </body> of every page that does not have it yet
+
+    Returns:
+        int: Number of pages updated
+    """
+    snippet = REGISTRATION_SNIPPET.format(worker=worker_name)
+    updated = 0
+    for page in find_pages(site_dir, scan):
+        with open(page, 'r', encoding='utf-8') as f:
+            content = f.read()
+        if f'id="{REGISTRATION_ID}"' in content:
+            continue
+
+        match = None
+        for match in re.finditer(r'[ \t]*</body>', content, flags=re.IGNORECASE):
+            pass
+        if match is None:
+            print(f"Skipping {page} (no </body> tag)")
+            continue
+
+        indent = re.match(r'[ \t]*', match.group(0)).group(0)
+        content = content[:match.start()] + indent + '    ' + snippet + content[match.start():]
+        with atomic_open(page, 'w', encoding='utf-8') as f:
+            f.write(content)
+        updated += 1
+    return updated
+
+
+def generate_service_worker(site_dir, register=True, scan=None):
+    """
+    Write sw.js with the current precache manifest and register it from every page
+
+    Args:
+        site_dir (str): Website root directory
+        register (bool): Insert the registration snippet into pages that lack it
+        scan (SiteScan): File listing to use instead of scanning site_dir; sw.js is added to it
+
+    Returns:
+        str: Path of the generated service worker
+    """
+    if register:
+        updated = register_service_worker(site_dir, scan=scan)
+        print(f"Service worker registration added to {updated} pages")
+
+    # Built after registration, which changes the pages' hashes
+    manifest = build_precache_manifest(site_dir, scan)
+
+    manifest_path = os.path.join(site_dir, MANIFEST_NAME)
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+
+    changed = [url for url, revision in manifest.items() if previous.get(url) != revision]
+    removed = [url for url in previous if url not in manifest]
+
+    worker_path = os.path.join(site_dir, SERVICE_WORKER_NAME)
+    with atomic_open(worker_path, 'w', encoding='utf-8') as f:
+        f.write(SERVICE_WORKER_TEMPLATE.format(revision=worker_revision(manifest),
+                                               manifest=json.dumps(manifest, indent=2)))
+    with atomic_open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    if scan is not None:
+        scan.add(worker_path)
+        scan.add(manifest_path)
+
+    total_bytes = sum(os.path.getsize(os.path.join(site_dir, url.lstrip('/'))) for url in manifest)
+    changed_bytes = sum(os.path.getsize(os.path.join(site_dir, url.lstrip('/'))) for url in changed)
+    print(f"Service worker written to: {worker_path}")
+    print(f"Precache manifest: {len(manifest)} assets ({total_bytes/1024:.1f}KB)")
+    if previous:
+        print(f"Changed since the last build: {len(changed)} assets ({changed_bytes/1024:.1f}KB), "
+              f"removed: {len(removed)}")
+        for url in changed:
+            print(f"  ~ {url}")
+        for url in removed:
+            print(f"  - {url}")
+
+    return worker_path
+
+
+if __name__ == "__main__":
+    print("Service Worker Generator")
+    print("========================")
+
+    directory = input("Enter website directory path (press Enter for current directory): ") or "."
+
+    if os.path.isdir(directory):
+        generate_service_worker(directory)
+    else:
+        print(f"Error: '{directory}' is not a valid directory.")
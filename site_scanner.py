@@ -0,0 +1,317 @@
+# Site Scanner Script
+# This script only requires Python
+
+import os
+import re
+import time
+from collections import namedtuple
+
+"""
+Lists the files of a website once so every optimization step can work from
+the same typed file listing instead of walking the tree itself.
+
+The tree is read with os.scandir. Directories that never hold site sources
+(version control, node_modules, build and output directories, hidden
+directories) are not entered, and .gitignore / .optimizeignore files are
+honored with git's pattern rules: '*', '?', '[...]' and '**' wildcards,
+'!' negation, a trailing '/' for directories only, and patterns containing
+a '/' anchored to the directory of the ignore file. Output directories
+passed as exclude are skipped as well, so generated files are never fed
+back in as inputs.
+
+Steps that create files register them with SiteScan.add(), which applies
+the same rules, so later steps see them without rescanning.
+"""
+
+# Minified pages are written here (relative to the site) with the same file names, so URLs
+# do not change (see minify_assets.minify_html_pages)
+HTML_OUTPUT_DIR = 'dist'
+
+# Directories that are never site sources: dist/ holds minified copies of the pages (only
+# precompression reads them, see convert_to_webp.precompress_paths), optimized_assets/ is
+# the default output directory of convert_to_webp.py
+SKIPPED_DIRS = ('.git', 'node_modules', '__pycache__', HTML_OUTPUT_DIR, 'optimized_assets')
+
+# Files with .gitignore-style patterns, read in every directory of the site
+IGNORE_FILES = ('.gitignore', '.optimizeignore')
+
+ScannedFile = namedtuple('ScannedFile', ['path', 'rel_path', 'extension'])
+
+
+def _translate_pattern(pattern):
+    """Translate the body of a gitignore pattern into a regular expression"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(parts)
+
+
+def parse_ignore_line(line, base=''):
+    """
+    Parse one line of an ignore file
+
+    Args:
+        line (str): Line of a .gitignore-style file
+        base (str): Directory of the ignore file relative to the site root ('' for the root)
+
+    Returns:
+        tuple: (base, compiled regex, negate, directories only) or None for blank lines and comments
+    """
+    line = line.rstrip('\n\r')
+    if not line.endswith('\\ '):
+        line = line.rstrip()
+    if not line or line.startswith('#'):
+        return None
+
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+
+    # A slash anywhere but at the end anchors the pattern to the ignore file's directory
+    anchored = '/' in line
+    body = _translate_pattern(line.lstrip('/'))
+    regex = re.compile(('^' if anchored else '^(?:.*/)?') + body + '$')
+    return (base, regex, negate, dir_only)
+
+
+def load_ignore_rules(directory, base=''):
+    """Read the ignore rules of every ignore file in a directory"""
+    rules = []
+    for name in IGNORE_FILES:
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                rule = parse_ignore_line(line, base)
+                if rule:
+                    rules.append(rule)
+    return rules
+
+
+def is_ignored(rel_path, is_dir, rules):
+    """
+    Whether a path is ignored by a list of rules (the last matching rule wins)
+
+    Args:
+        rel_path (str): Path relative to the site root with forward slashes
+        is_dir (bool): Whether the path is a directory
+        rules (list): Rules returned by parse_ignore_line(), outermost ignore file first
+    """
+    ignored = False
+    for base, regex, negate, dir_only in rules:
+        if dir_only and not is_dir:
+            continue
+        if base:
+            if not rel_path.startswith(base + '/'):
+                continue
+            candidate = rel_path[len(base) + 1:]
+        else:
+            candidate = rel_path
+        if regex.match(candidate):
+            ignored = not negate
+    return ignored
+
+
+class SiteScan:
+    """
+    Typed file listing of a website produced by scan_site()
+
+    Args:
+        root (str): Website root directory
+        exclude (list): Absolute paths of excluded output directories
+    """
+
+    def __init__(self, root, exclude=()):
+        self.root = root
+        self.exclude = set(exclude)
+        self.rules = []
+        self.directory_count = 0
+        self.ignored_count = 0
+        self.elapsed = 0.0
+        self._files = {}
+
+    def _rel_path(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def _skipped_dir(self, name, abs_path):
+        return name in SKIPPED_DIRS or name.startswith('.') or abs_path in self.exclude
+
+    def _append(self, path, rel_path):
+        self._files[os.path.abspath(path)] = ScannedFile(path, rel_path, os.path.splitext(path)[1].lower())
+
+    def files(self, extensions=None):
+        """
+        Return the scanned files, optionally only those with the given extensions
+
+        Args:
+            extensions (tuple): Lower-case extensions such as ('.png', '.jpg')
+        """
+        # A copy of the listing, so steps running in other threads can add files meanwhile
+        entries = list(self._files.values())
+        if extensions is None:
+            return entries
+        if isinstance(extensions, str):
+            extensions = (extensions,)
+        return [entry for entry in entries if entry.extension in extensions]
+
+    def paths(self, extensions=None):
+        """Return the paths of the scanned files, optionally filtered by extension"""
+        return [entry.path for entry in self.files(extensions)]
+
+    def add(self, path):
+        """
+        Register a file created after the scan (e.g. a converted image)
+
+        Files in skipped, excluded or ignored locations are not added.
+
+        Returns:
+            bool: Whether the file is now part of the listing
+        """
+        abs_path = os.path.abspath(path)
+        rel_path = self._rel_path(abs_path)
+        if rel_path.startswith('../'):
+            return False
+
+        # Every parent directory has to be one the scan would have entered
+        parts = rel_path.split('/')
+        current = os.path.abspath(self.root)
+        for depth, name in enumerate(parts[:-1]):
+            current = os.path.join(current, name)
+            if self._skipped_dir(name, current) or is_ignored('/'.join(parts[:depth + 1]), True, self.rules):
+                return False
+        if is_ignored(rel_path, False, self.rules):
+            return False
+
+        self._append(path, rel_path)
+        return True
+
+    def remove(self, path):
+        """Drop a file that a step deleted"""
+        self._files.pop(os.path.abspath(path), None)
+
+    def subset(self, paths):
+        """
+        Return a listing with the same root and rules holding only the given files
+
+        Used to hand a slice of the site to a step, e.g. one image per batch task.
+        Existing files under the root that the listing skips (the minified pages in
+        dist/ for precompression) are included as given.
+        """
+        scan = SiteScan(self.root, self.exclude)
+        scan.rules = self.rules
+        for path in paths:
+            entry = self._files.get(os.path.abspath(path))
+            if entry:
+                scan._files[os.path.abspath(path)] = entry
+            elif os.path.isfile(path) and not self._rel_path(os.path.abspath(path)).startswith('../'):
+                scan._append(path, self._rel_path(os.path.abspath(path)))
+        return scan
+
+    def __len__(self):
+        return len(self._files)
+
+
+def scan_site(source_dir, exclude=None):
+    """
+    List the files of a website in one pass
+
+    Files are listed directory by directory in sorted order, the files of a
+    directory before those of its subdirectories.
+
+    Args:
+        source_dir (str): Website root directory
+        exclude (list): Output directories to skip (e.g. the WebP output directory)
+
+    Returns:
+        SiteScan: Typed file listing
+    """
+    start_time = time.time()
+    scan = SiteScan(source_dir, [os.path.abspath(path) for path in exclude or () if path])
+
+    stack = [(source_dir, '')]
+    while stack:
+        directory, rel_dir = stack.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Skipping {directory} ({e})")
+            continue
+        scan.directory_count += 1
+
+        # Rules of an ignore file apply to its directory and everything below it
+        if any(entry.name in IGNORE_FILES for entry in entries):
+            scan.rules.extend(load_ignore_rules(directory, rel_dir))
+
+        subdirectories = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if scan._skipped_dir(entry.name, os.path.abspath(entry.path)) or \
+                        is_ignored(rel_path, True, scan.rules):
+                    scan.ignored_count += 1
+                    continue
+                subdirectories.append((entry.path, rel_path))
+            elif is_ignored(rel_path, False, scan.rules):
+                scan.ignored_count += 1
+            else:
+                scan._append(entry.path, rel_path)
+
+        # Reversed so the stack pops subdirectories in sorted order
+        stack.extend(reversed(subdirectories))
+
+    scan.elapsed = time.time() - start_time
+    return scan
+
+
+if __name__ == "__main__":
+    print("Site Scanner")
+    print("============")
+
+    directory = input("Enter website directory path (press Enter for current directory): ") or "."
+
+    if os.path.isdir(directory):
+        site_scan = scan_site(directory)
+        counts = {}
+        for entry in site_scan.files():
+            counts[entry.extension or '(none)'] = counts.get(entry.extension or '(none)', 0) + 1
+        print(f"\nScanned {len(site_scan)} files in {site_scan.directory_count} directories "
+              f"in {site_scan.elapsed:.2f} seconds ({site_scan.ignored_count} entries ignored)\n")
+        for extension, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+            print(f"{extension:<10} {count:>6}")
+    else:
+        print(f"Error: '{directory}' is not a valid directory.")
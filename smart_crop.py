@@ -0,0 +1,363 @@
+# Smart Crop Script
+# This script requires Python, Pillow and NumPy
+# Install with: pip install Pillow numpy
+
+import os
+import io
+import math
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from artifact_cache import get_default_cache, hash_file
+from atomic_output import atomic_open
+from audit_performance import size_summary
+from site_scanner import scan_site
+
+"""
+Generates fixed-aspect card and thumbnail variants from master images.
+
+Instead of letterboxing (ImageOps.contain) or hand-made crops, the crop
+window is chosen from a saliency map: edge energy of the luminance plus a
+little colorfulness, computed on a small downsampled copy of the image so
+it stays cheap. The window with the most saliency is cut from the
+full-resolution master and resized to exactly the display size.
+
+For a master named tahaqqaq.webp the variants are tahaqqaq-card.webp and
+tahaqqaq-thumb.webp. Designed variants (a tahaqqaq-card.png, or a WebP of
+another size) are kept and never overwritten.
+"""
+
+# Variant name -> display size (width, height) in CSS pixels
+CROP_VARIANTS = {
+    'card': (400, 250),
+    'thumb': (160, 160),
+}
+
+# Directories (relative to the site) whose images are masters for variants
+VARIANT_DIRECTORIES = ('Featured_Projects',)
+
+MASTER_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# Longest side of the downsampled copy the saliency map is computed on
+SALIENCY_SIZE = 128
+
+# Edge bars: lines in which this share of the pixels is within BAR_TOLERANCE (0-1) of the line's
+# median color, running in from an edge for at most BAR_MAX_FRACTION of the image
+BAR_UNIFORMITY = 0.85
+BAR_TOLERANCE = 0.1
+BAR_MAX_FRACTION = 0.12
+
+# Share of the saliency left outside the window at either end, and the margin around the rest
+MASS_QUANTILE = 0.05
+CROP_MARGIN = 0.08
+
+# Smallest window as a share of the largest one that fits, and how far past the image a window
+# may reach on a plain background
+MIN_CROP_SCALE = 0.6
+MAX_PAD_FACTOR = 1.35
+
+# Bump when the crop selection changes so cached variants are regenerated
+SMART_CROP_VERSION = 2
+
+
+def _uniform_share(rgb, axis):
+    """Share of the pixels of each row (axis=1) or column (axis=0) close to that line's median color"""
+    median = np.median(rgb, axis=axis, keepdims=True)
+    close = np.abs(rgb - median).max(axis=2) <= BAR_TOLERANCE
+    return close.mean(axis=axis)
+
+
+def _border_bars(uniform):
+    """Mask of the nearly uniform lines that run in from either edge (status, navigation and tool bars)"""
+    bars = np.zeros(len(uniform), dtype=bool)
+    limit = max(1, int(len(uniform) * BAR_MAX_FRACTION))
+    for order in (range(len(uniform)), range(len(uniform) - 1, -1, -1)):
+        run = []
+        for index in order:
+            if len(run) >= limit or uniform[index] < BAR_UNIFORMITY:
+                break
+            run.append(index)
+        if run:
+            # The line where the bar meets the content only has the bar's edge
+            run.append(order[len(run)] if len(run) < len(uniform) else run[-1])
+            bars[run] = True
+    return bars
+
+
+def saliency_map(img):
+    """
+    Compute a saliency map on a downsampled copy of an image
+
+    Bars along the edges of the image (the status and navigation bars of a
+    phone screenshot, a tool bar) are not part of the subject and get no
+    saliency: a bar is a run of rows or columns from an edge in which nearly
+    every pixel has the same color, apart from a few icons.
+
+    Args:
+        img (PIL.Image): Source image
+
+    Returns:
+        tuple: (saliency as a 2D float array, scale factor from map to image pixels)
+    """
+    small = img.copy()
+    small.draft('RGB', (SALIENCY_SIZE, SALIENCY_SIZE))
+    small.thumbnail((SALIENCY_SIZE, SALIENCY_SIZE), Image.BILINEAR)
+    scale = img.width / small.width
+
+    rgba = np.asarray(small.convert('RGBA'), dtype=np.float32) / 255.0
+    rgb, alpha = rgba[..., :3], rgba[..., 3]
+    luma = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    # Edge energy: gradient magnitude of the luminance
+    gy, gx = np.gradient(luma)
+    energy = np.hypot(gx, gy)
+
+    # Colorful regions (logos, UI screenshots) attract attention even when flat
+    saturation = rgb.max(axis=2) - rgb.min(axis=2)
+
+    saliency = (energy / (energy.max() or 1.0)) + 0.25 * saturation
+    # Transparent areas are never interesting
+    saliency *= alpha
+
+    # Smooth with a 3x3 box filter so isolated noisy pixels do not win
+    padded = np.pad(saliency, 1, mode='edge')
+    saliency = sum(padded[dy:dy + saliency.shape[0], dx:dx + saliency.shape[1]]
+                   for dy in range(3) for dx in range(3)) / 9.0
+
+    saliency[_border_bars(_uniform_share(rgb, 1)), :] = 0.0
+    saliency[:, _border_bars(_uniform_share(rgb, 0))] = 0.0
+    return saliency, scale
+
+
+def background_color(img):
+    """
+    Color of the image's border if it is a plain background
+
+    Returns:
+        tuple: Color in the image's mode, or None when the border is not nearly uniform
+    """
+    small = img.copy()
+    small.thumbnail((SALIENCY_SIZE, SALIENCY_SIZE), Image.BILINEAR)
+    rgba = np.asarray(small.convert('RGBA'), dtype=np.float32) / 255.0
+    border = np.concatenate((rgba[0], rgba[-1], rgba[:, 0], rgba[:, -1]))
+    median = np.median(border, axis=0)
+    if (np.abs(border - median).max(axis=1) <= BAR_TOLERANCE).mean() < BAR_UNIFORMITY:
+        return None
+    color = tuple(int(round(value * 255)) for value in median)
+    return color[:len(img.getbands())] if img.mode in ('RGB', 'RGBA') else color[0]
+
+
+def _mass_extent(profile):
+    """Centroid and the span holding all but MASS_QUANTILE of the saliency at either end of a profile"""
+    cumulative = np.cumsum(profile) / profile.sum()
+    low = int(np.searchsorted(cumulative, MASS_QUANTILE))
+    high = int(np.searchsorted(cumulative, 1.0 - MASS_QUANTILE)) + 1
+    centroid = float((profile * (np.arange(len(profile)) + 0.5)).sum() / profile.sum())
+    return centroid, low, high
+
+
+def _place(center, low, high, length, image_length):
+    """Start of a window of the given length centred on center, moved to cover [low, high] and kept in the image"""
+    start = center - length / 2
+    if length >= high - low:
+        start = min(max(start, high - length), low)
+    if length >= image_length:
+        return (image_length - length) / 2
+    return min(max(start, 0.0), image_length - length)
+
+
+def find_crop_box(img, size):
+    """
+    Choose the crop window with the target aspect ratio around the salient part of the image
+
+    The window is centred on the saliency's centroid and sized to hold all but
+    the outer MASS_QUANTILE of it on each side, plus a margin: smaller than the
+    image when the subject is small (but at least MIN_CROP_SCALE of the largest
+    window), and never larger than the largest window that fits, except on a
+    plain background. There it may grow by up to MAX_PAD_FACTOR, and the part
+    outside the image is filled with the background color (see smart_crop), so
+    a square logo keeps its top and bottom in a wide card.
+
+    Args:
+        img (PIL.Image): Source image
+        size (tuple): Target (width, height)
+
+    Returns:
+        tuple: Crop box (left, upper, right, lower) in image pixels; it extends past the
+               image only when the background is plain
+    """
+    target_aspect = size[0] / size[1]
+    saliency, scale = saliency_map(img)
+    map_height, map_width = saliency.shape
+
+    largest_width = min(map_width, map_height * target_aspect)
+    if saliency.sum() <= 0:
+        width = largest_width
+        center_x, low_x, high_x = map_width / 2, 0, map_width
+        center_y, low_y, high_y = map_height / 2, 0, map_height
+    else:
+        center_x, low_x, high_x = _mass_extent(saliency.sum(axis=0))
+        center_y, low_y, high_y = _mass_extent(saliency.sum(axis=1))
+        width = max(high_x - low_x, (high_y - low_y) * target_aspect) * (1 + 2 * CROP_MARGIN)
+        width = max(width, MIN_CROP_SCALE * largest_width)
+        if width > largest_width and not (width <= largest_width * MAX_PAD_FACTOR
+                                          and background_color(img) is not None):
+            width = largest_width
+    height = width / target_aspect
+
+    left = _place(center_x, low_x, high_x, width, map_width) * scale
+    top = _place(center_y, low_y, high_y, height, map_height) * scale
+    return (left, top, left + width * scale, top + height * scale)
+
+
+def smart_crop(img, size):
+    """
+    Crop an image to the target aspect ratio around its salient region and resize it
+
+    Args:
+        img (PIL.Image): Source image
+        size (tuple): Output (width, height)
+    """
+    left, top, right, bottom = find_crop_box(img, size)
+    pad_x = max(0, math.ceil(-left), math.ceil(right - img.width))
+    pad_y = max(0, math.ceil(-top), math.ceil(bottom - img.height))
+    if pad_x or pad_y:
+        # The window reaches past a plain background; extend the background
+        canvas = Image.new(img.mode, (img.width + 2 * pad_x, img.height + 2 * pad_y), background_color(img))
+        canvas.paste(img, (pad_x, pad_y))
+        img = canvas
+        left, top, right, bottom = left + pad_x, top + pad_y, right + pad_x, bottom + pad_y
+    return img.resize(size, Image.LANCZOS, box=(left, top, right, bottom))
+
+
+def is_variant(path, variants=CROP_VARIANTS):
+    """Whether a file name is a generated (or hand-made) variant rather than a master"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return any(stem.endswith(f"-{name}") for name in variants)
+
+
+def is_hand_made(variant_path, size):
+    """
+    Whether a variant path belongs to a designed variant that must not be overwritten
+
+    That is the case when a PNG or JPEG of the same name exists (its WebP is the
+    converted design) or when the existing WebP does not have the generated size.
+    """
+    stem = os.path.splitext(variant_path)[0]
+    if any(os.path.exists(stem + ext) for ext in MASTER_EXTENSIONS[:3]):
+        return True
+    if not os.path.exists(variant_path):
+        return False
+    try:
+        with Image.open(variant_path) as img:
+            return img.size != tuple(size)
+    except Exception:
+        return True
+
+
+def generate_variants(source_dir, variants=CROP_VARIANTS, directories=VARIANT_DIRECTORIES,
+                      quality=85, report=None, cache=None, scan=None):
+    """
+    Generate smart-cropped WebP variants for every master image
+
+    Args:
+        source_dir (str): Website root directory
+        variants (dict): Variant name -> (width, height)
+        directories (tuple): Directories (relative to source_dir) that hold master images
+        quality (int): Quality of the WebP variants (0-100)
+        report (list): Optional list that receives a machine-readable size entry per variant
+        cache (ArtifactCache): Artifact cache to consult before cropping (default: shared cache, False to disable)
+        scan (SiteScan): File listing to use instead of scanning source_dir
+    """
+    if cache is None:
+        cache = get_default_cache()
+
+    print("\nGenerating smart-cropped variants...\n")
+    start_time = time.time()
+    generated_count = 0
+    skipped_count = 0
+    failure_count = 0
+
+    scan = scan or scan_site(source_dir)
+    for directory in directories:
+        master_dir = directory.strip('/').replace(os.sep, '/')
+        for entry in scan.files(MASTER_EXTENSIONS):
+            master_path = entry.path
+            file = os.path.basename(master_path)
+            if os.path.dirname(entry.rel_path) != master_dir or is_variant(file, variants):
+                continue
+
+            stem = os.path.splitext(master_path)[0]
+            # A PNG master and its converted WebP share variant names; prefer the original
+            if file.lower().endswith('.webp') and any(os.path.exists(stem + ext) for ext in MASTER_EXTENSIONS[:3]):
+                continue
+
+            master_mtime = os.path.getmtime(master_path)
+            master_hash = None
+
+            for name, size in variants.items():
+                variant_path = f"{stem}-{name}.webp"
+                # Generated crops are only written as new files: a hand-made variant is never replaced
+                if is_hand_made(variant_path, size):
+                    print(f"Keeping hand-made {os.path.basename(variant_path)}")
+                    skipped_count += 1
+                    continue
+                if os.path.exists(variant_path) and os.path.getmtime(variant_path) >= master_mtime:
+                    skipped_count += 1
+                    continue
+
+                try:
+                    cache_key = None
+                    if cache:
+                        master_hash = master_hash or hash_file(master_path)
+                        cache_key = cache.key(master_hash, 'smart-crop', {
+                            'size': list(size), 'quality': quality,
+                            'version': SMART_CROP_VERSION, 'pillow': Image.__version__})
+
+                    if not (cache and cache.fetch(cache_key, variant_path)):
+                        with Image.open(master_path) as img:
+                            img = ImageOps.exif_transpose(img)
+                            if img.mode not in ('RGB', 'RGBA'):
+                                img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+                            variant = smart_crop(img, size)
+
+                        buffer = io.BytesIO()
+                        variant.save(buffer, 'WEBP', quality=quality, method=6)
+                        with atomic_open(variant_path, 'wb') as f:
+                            f.write(buffer.getvalue())
+                        if cache:
+                            cache.store_bytes(cache_key, buffer.getvalue())
+
+                    original_size = os.path.getsize(master_path)
+                    new_size = os.path.getsize(variant_path)
+                    scan.add(variant_path)
+                    print(f"Generated: {variant_path} ({size[0]}×{size[1]}, {new_size/1024:.1f}KB)")
+                    if report is not None:
+                        report.append(dict(stage='smart-crop', source=master_path, output=variant_path,
+                                           **size_summary(original_size, new_size)))
+                    generated_count += 1
+                except Exception as e:
+                    print(f"Error generating {variant_path}: {e}")
+                    failure_count += 1
+
+    elapsed_time = time.time() - start_time
+    print(f"\nGenerated {generated_count} variants in {elapsed_time:.1f} seconds")
+    print(f"Skipped (up to date): {skipped_count}")
+    if failure_count:
+        print(f"Failed: {failure_count}")
+
+    return generated_count
+
+
+if __name__ == "__main__":
+    print("Smart Crop Variant Generator")
+    print("============================")
+
+    directory = input("Enter website directory path (press Enter for current directory): ") or "."
+
+    if os.path.isdir(directory):
+        generate_variants(directory)
+    else:
+        print(f"Error: '{directory}' is not a valid directory.")
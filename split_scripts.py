@@ -0,0 +1,769 @@
+# JavaScript Code Splitting Script
+# This script only requires Python
+
+import os
+import re
+import json
+import hashlib
+from collections import namedtuple
+
+from atomic_output import atomic_open
+from audit_performance import find_pages
+
+"""
+Splits scripts.js into a small critical chunk and lazily loaded chunks.
+
+The script is tokenized (strings, template literals, regular expressions
+and comments are recognized, so they are never mistaken for code) and cut
+into top-level statements. Function, class and variable declarations
+become units of a dependency graph; the calls inside the
+DOMContentLoaded listeners are the entry points. Each entry is assigned a
+chunk:
+
+    critical     changes the page as soon as it runs (DOM writes outside event listeners),
+                 including the data it needs (e.g. translations), so the first paint is
+                 already in the visitor's language
+    interaction  only registers event listeners; loaded on the first user
+                 interaction or when the browser is idle
+    idle         already deferred with setTimeout by the author; loaded when the browser is idle
+
+Every declaration goes to the first chunk that needs it, and later chunks
+load the earlier ones they depend on. Chunks are minified by a whitespace
+and comment stripper that keeps line breaks wherever automatic semicolon
+insertion could depend on them. Every chunk file name, the critical one
+included, contains a content hash, so the output is deterministic and can
+be cached forever: a new build gets new names instead of changing files
+that browsers keep as immutable.
+"""
+
+CHUNK_ORDER = ('critical', 'interaction', 'idle')
+
+# Property accesses and calls that change what the user sees
+DOM_MUTATIONS = frozenset((
+    'textContent', 'innerHTML', 'innerText', 'outerHTML', 'setAttribute', 'removeAttribute',
+    'classList', 'style', 'appendChild', 'append', 'prepend', 'insertBefore', 'removeChild',
+    'replaceChild', 'replaceWith', 'insertRule', 'insertAdjacentHTML', 'scrollTo', 'scrollIntoView',
+    'title', 'dir', 'lang', 'src', 'value', 'hidden', 'disabled',
+))
+
+# Callbacks passed to these run later, not while the entry runs
+DEFERRING_CALLS = frozenset(('addEventListener', 'setTimeout', 'setInterval', 'requestAnimationFrame',
+                             'requestIdleCallback', 'then', 'catch', 'finally'))
+
+# Statements that may not be followed by a line break without changing their meaning
+RESTRICTED_KEYWORDS = frozenset(('return', 'throw', 'break', 'continue', 'yield', 'async', 'let'))
+
+# A "/" after these words starts a regular expression, not a division
+REGEX_KEYWORDS = frozenset(('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                            'void', 'throw', 'instanceof', 'yield', 'await'))
+
+# Chunk files of any run: <stem>.<chunk>.<content hash>.min.js
+CHUNK_FILE = r'\.(?:%s)\.[0-9a-f]{10}\.min\.js'
+
+Token = namedtuple('Token', 'kind text')
+
+PUNCTUATOR = re.compile(r'>>>=|\.\.\.|===|!==|\*\*=|<<=|>>=|>>>|&&=|\|\|=|\?\?=|=>|==|!=|<=|>=|&&|\|\||'
+                        r'\?\?|\?\.(?!\d)|\+\+|--|\+=|-=|\*=|/=|%=|&=|\|=|\^=|\*\*|<<|>>|[{}()\[\];,<>+\-*/%&|^!~?:=.@#]')
+NUMBER = re.compile(r'0[xXbBoO][\da-fA-F_]+n?|(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?n?')
+NAME = re.compile(r'[\w$\u0080-\uffff]+')
+WHITESPACE = re.compile(r'\s+')
+
+LOADER_TEMPLATE = """(function () {
+  var chunks = %s;
+  var script = document.currentScript;
+  var base = script ? script.src.slice(0, script.src.lastIndexOf('/') + 1) : '';
+  var loading = {};
+
+  function load(name) {
+    if (!loading[name]) {
+      var chunk = chunks[name];
+      loading[name] = Promise.all(chunk.requires.map(load)).then(function () {
+        return new Promise(function (resolve, reject) {
+          var element = document.createElement('script');
+          element.src = base + chunk.src;
+          element.onload = resolve;
+          element.onerror = reject;
+          document.head.appendChild(element);
+        });
+      });
+    }
+    return loading[name];
+  }
+
+  function whenIdle(callback) {
+    if ('requestIdleCallback' in window) {
+      requestIdleCallback(callback, { timeout: 3000 });
+    } else {
+      setTimeout(callback, 1);
+    }
+  }
+
+  function onInteraction(name) {
+    var events = ['pointerdown', 'keydown', 'touchstart', 'scroll', 'wheel', 'focusin'];
+    var pending = [];
+    var started = false;
+    function start() {
+      if (started) return;
+      started = true;
+      events.forEach(function (type) { removeEventListener(type, start, true); });
+      load(name).then(function () {
+        document.removeEventListener('click', hold, true);
+        // Replay clicks that arrived before the handlers existed
+        pending.forEach(function (target) { if (target.isConnected) target.click(); });
+      }, function () {
+        document.removeEventListener('click', hold, true);
+      });
+    }
+    function hold(event) {
+      if (!started || !event.isTrusted) return;
+      event.preventDefault();
+      event.stopImmediatePropagation();
+      pending.push(event.target);
+    }
+    events.forEach(function (type) { addEventListener(type, start, { capture: true, passive: true }); });
+    document.addEventListener('click', hold, true);
+    whenIdle(start);
+  }
+
+  function schedule() {
+    Object.keys(chunks).forEach(function (name) {
+      var trigger = chunks[name].trigger;
+      if (trigger === 'interaction') {
+        onInteraction(name);
+      } else if (document.readyState === 'complete') {
+        whenIdle(function () { load(name); });
+      } else {
+        addEventListener('load', function () { whenIdle(function () { load(name); }); });
+      }
+    });
+  }
+
+  if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', schedule);
+  } else {
+    schedule();
+  }
+})();
+"""
+
+
+def _scan_string(src, i):
+    """Index after the string literal starting at src[i]"""
+    quote = src[i]
+    i += 1
+    while i < len(src):
+        if src[i] == '\\':
+            i += 2
+            continue
+        if src[i] == quote or src[i] == '\n':
+            return i + 1
+        i += 1
+    return i
+
+
+def _scan_template(src, i):
+    """Index after the template literal starting at src[i], including nested ${...} expressions"""
+    i += 1
+    while i < len(src):
+        if src[i] == '\\':
+            i += 2
+            continue
+        if src[i] == '`':
+            return i + 1
+        if src.startswith('${', i):
+            _, i = _tokenize(src, i + 2, stop_at_brace=True)
+            continue
+        i += 1
+    return i
+
+
+def _scan_regex(src, i):
+    """Index after the regular expression literal starting at src[i]"""
+    i += 1
+    in_class = False
+    while i < len(src):
+        char = src[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            i += 1
+            break
+        elif char == '\n':
+            break
+        i += 1
+    match = NAME.match(src, i)
+    return match.end() if match else i
+
+
+def _regex_allowed(previous):
+    """Whether a "/" after the previous significant token starts a regular expression"""
+    if previous is None:
+        return True
+    if previous.kind == 'name':
+        return previous.text in REGEX_KEYWORDS
+    if previous.kind in ('number', 'string', 'template', 'regex'):
+        return False
+    return previous.text not in (')', ']', '}')
+
+
+def _tokenize(src, i=0, stop_at_brace=False):
+    """
+    Tokenize src from index i
+
+    With stop_at_brace, stops after the "}" that closes a template
+    substitution and returns the index after it.
+    """
+    tokens = []
+    previous = None
+    depth = 0
+    while i < len(src):
+        char = src[i]
+        if char.isspace():
+            end = WHITESPACE.match(src, i).end()
+            tokens.append(Token('ws', src[i:end]))
+            i = end
+            continue
+        if src.startswith('//', i):
+            end = src.find('\n', i)
+            end = len(src) if end == -1 else end
+            tokens.append(Token('comment', src[i:end]))
+            i = end
+            continue
+        if src.startswith('/*', i):
+            end = src.find('*/', i + 2)
+            end = len(src) if end == -1 else end + 2
+            tokens.append(Token('comment', src[i:end]))
+            i = end
+            continue
+
+        if char in ('"', "'"):
+            end = _scan_string(src, i)
+            token = Token('string', src[i:end])
+        elif char == '`':
+            end = _scan_template(src, i)
+            token = Token('template', src[i:end])
+        elif char == '/' and _regex_allowed(previous):
+            end = _scan_regex(src, i)
+            token = Token('regex', src[i:end])
+        elif char.isdigit() or (char == '.' and i + 1 < len(src) and src[i + 1].isdigit()):
+            end = NUMBER.match(src, i).end()
+            token = Token('number', src[i:end])
+        elif NAME.match(src, i):
+            end = NAME.match(src, i).end()
+            token = Token('name', src[i:end])
+        else:
+            match = PUNCTUATOR.match(src, i)
+            end = match.end() if match else i + 1
+            token = Token('punct', src[i:end])
+            if token.text == '{':
+                depth += 1
+            elif token.text == '}':
+                if stop_at_brace and depth == 0:
+                    return tokens, end
+                depth -= 1
+
+        tokens.append(token)
+        previous = token
+        i = end
+    return tokens, i
+
+
+def tokenize(src):
+    """Split JavaScript source into tokens (kind, text); concatenating the texts gives src back"""
+    return _tokenize(src)[0]
+
+
+def _significant(tokens):
+    return [token for token in tokens if token.kind not in ('ws', 'comment')]
+
+
+def _ends_expression(token):
+    return token.kind in ('name', 'number', 'string', 'template', 'regex') or \
+        token.text in (')', ']', '}', '++', '--')
+
+
+def minify_tokens(tokens):
+    """
+    Join tokens without comments and with as little whitespace as possible
+
+    A line break is kept only where automatic semicolon insertion could
+    depend on it, so the result parses exactly like the input.
+    """
+    output = []
+    previous = None
+    space = newline = False
+    for token in tokens:
+        if token.kind in ('ws', 'comment'):
+            if '\n' in token.text:
+                newline = True
+            else:
+                space = True
+            continue
+
+        if previous is not None and (space or newline):
+            wordy_left = previous.kind in ('name', 'number', 'regex')
+            wordy_right = token.kind in ('name', 'number')
+            if newline and (previous.text in RESTRICTED_KEYWORDS or
+                            (_ends_expression(previous) and
+                             (token.kind in ('name', 'number', 'string', 'regex') or token.text in ('++', '--')))):
+                output.append('\n')
+            elif wordy_left and wordy_right:
+                output.append(' ')
+            elif previous.text[-1] in '+-' and token.text[0] == previous.text[-1]:
+                output.append(' ')
+            elif previous.kind == 'number' and token.text.startswith('.'):
+                output.append(' ')
+
+        output.append(token.text)
+        previous = token
+        space = newline = False
+    return ''.join(output)
+
+
+def split_statements(tokens):
+    """Group a token list into statements (each a token list including leading comments)"""
+    statements = []
+    current = []
+    depth = 0
+    significant = [index for index, token in enumerate(tokens) if token.kind not in ('ws', 'comment')]
+    next_significant = dict(zip(significant, significant[1:] + [None]))
+
+    for index, token in enumerate(tokens):
+        current.append(token)
+        if token.kind in ('ws', 'comment'):
+            continue
+        if token.kind == 'punct':
+            if token.text in ('(', '[', '{'):
+                depth += 1
+            elif token.text in (')', ']', '}'):
+                depth -= 1
+        if depth != 0:
+            continue
+
+        following = next_significant[index]
+        if token.text == ';':
+            end = True
+        elif following is None:
+            end = True
+        else:
+            between = ''.join(t.text for t in tokens[index + 1:following])
+            sig = _significant(current)
+            declaration_block = token.text == '}' and sig[0].text in ('function', 'async', 'class')
+            # A line break ends the statement when the next line cannot continue it
+            end = declaration_block or ('\n' in between and _ends_expression(token) and
+                                        tokens[following].kind == 'name' and
+                                        tokens[following].text not in ('in', 'of', 'instanceof'))
+        if end:
+            statements.append(current)
+            current = []
+
+    if _significant(current):
+        statements.append(current)
+    elif current and statements:
+        statements[-1].extend(current)
+    return statements
+
+
+def _matching(sig, open_index):
+    """Index of the bracket closing sig[open_index]"""
+    pairs = {'(': ')', '[': ']', '{': '}'}
+    opener = sig[open_index].text
+    depth = 0
+    for index in range(open_index, len(sig)):
+        if sig[index].text == opener:
+            depth += 1
+        elif sig[index].text == pairs[opener]:
+            depth -= 1
+            if depth == 0:
+                return index
+    return len(sig) - 1
+
+
+def _references(sig):
+    """Identifiers a statement refers to (property names excluded; template substitutions included)"""
+    names = set()
+    for index, token in enumerate(sig):
+        if token.kind == 'name' and not (index and sig[index - 1].text in ('.', '?.')):
+            names.add(token.text)
+        elif token.kind == 'template':
+            for expression in re.findall(r'\$\{(.*?)\}', token.text, flags=re.DOTALL):
+                names.update(_references(_significant(tokenize(expression))))
+    return names
+
+
+def _declared_name(sig):
+    """Name declared by a top-level statement, or None"""
+    start = 1 if sig[0].text == 'async' else 0
+    if sig[start].text == 'function':
+        index = start + 1
+        if index < len(sig) and sig[index].text == '*':
+            index += 1
+        return sig[index].text if index < len(sig) and sig[index].kind == 'name' else None
+    if sig[0].text == 'class' and len(sig) > 1:
+        return sig[1].text
+    if sig[0].text in ('const', 'let', 'var') and len(sig) > 2 and sig[1].kind == 'name' and \
+            sig[2].text in ('=', ';'):
+        # Only simple single declarations; "const a = 1, b = 2" stays in the critical chunk
+        depth = 0
+        for token in sig[2:]:
+            if token.text in ('(', '[', '{'):
+                depth += 1
+            elif token.text in (')', ']', '}'):
+                depth -= 1
+            elif token.text == ',' and depth == 0:
+                return None
+        return sig[1].text
+    return None
+
+
+def _listener_body(tokens, event):
+    """Tokens of the callback body if the statement is document/window.addEventListener(event, function)"""
+    positions = [index for index, token in enumerate(tokens) if token.kind not in ('ws', 'comment')]
+    sig = [tokens[index] for index in positions]
+    texts = [token.text for token in sig[:5]]
+    if len(sig) < 6 or texts[0] not in ('document', 'window') or texts[1:4] != ['.', 'addEventListener', '('] or \
+            sig[4].kind != 'string' or sig[4].text[1:-1] != event:
+        return None
+    close = _matching(sig, 3)
+    for index in range(5, close):
+        if sig[index].text == '{':
+            return tokens[positions[index] + 1:positions[_matching(sig, index)]]
+    return None
+
+
+def _immediate_tokens(body):
+    """
+    Tokens of a function body that run when the function is called
+
+    Arguments of addEventListener/setTimeout/... calls run later and are
+    dropped, as are nested function declarations that are only called from them.
+    """
+    nested = {}
+    immediate = []
+    index = 0
+    while index < len(body):
+        token = body[index]
+        if token.kind == 'name' and token.text in DEFERRING_CALLS and \
+                index + 1 < len(body) and body[index + 1].text == '(':
+            index = _matching(body, index + 1) + 1
+            continue
+        if token.text == 'function' and index + 1 < len(body) and body[index + 1].kind == 'name' and \
+                (index == 0 or body[index - 1].text in (';', '{', '}')):
+            open_index = next(i for i in range(index, len(body)) if body[i].text == '{')
+            close = _matching(body, open_index)
+            nested[body[index + 1].text] = body[open_index + 1:close]
+            index = close + 1
+            continue
+        immediate.append(token)
+        index += 1
+
+    # Nested helpers called right away run right away too
+    called = {token.text for token in immediate if token.kind == 'name'}
+    seen = set()
+    while called & (set(nested) - seen):
+        for name in sorted(called & (set(nested) - seen)):
+            seen.add(name)
+            helper = _immediate_tokens(nested[name])
+            immediate.extend(helper)
+            called |= {token.text for token in helper if token.kind == 'name'}
+    return immediate
+
+
+def _mutates_dom(tokens, units, visited):
+    """Whether running these tokens changes the page, following calls into top-level functions"""
+    for index, token in enumerate(tokens):
+        if token.kind != 'name':
+            continue
+        if index and tokens[index - 1].text in ('.', '?.') and token.text in DOM_MUTATIONS:
+            # Reading element.value or element.style is fine; assigning or calling is not
+            following = tokens[index + 1].text if index + 1 < len(tokens) else ''
+            if token.text in ('classList', 'style') or following in ('=', '(', '+=', '-='):
+                return True
+        if token.text in units and token.text not in visited and units[token.text]['function_body'] is not None:
+            visited.add(token.text)
+            if _mutates_dom(_immediate_tokens(units[token.text]['function_body']), units, visited):
+                return True
+    return False
+
+
+def analyze_script(source):
+    """
+    Build the declaration graph and classify the entry statements of a script
+
+    Returns:
+        tuple: (units by name, ordered list of all top-level statements as dicts, entries as dicts)
+    """
+    statements = []
+    units = {}
+    entries = []
+
+    for tokens in split_statements(tokenize(source)):
+        sig = _significant(tokens)
+        if not sig:
+            continue
+        statement = {'tokens': tokens, 'sig': sig, 'name': _declared_name(sig), 'container': False}
+        statements.append(statement)
+
+        if statement['name']:
+            body = None
+            if 'function' in (sig[0].text, sig[1].text if len(sig) > 1 else ''):
+                open_index = next(i for i, token in enumerate(sig) if token.text == '{')
+                body = sig[open_index + 1:_matching(sig, open_index)]
+            units[statement['name']] = dict(statement, function_body=body,
+                                            references=_references(sig[1:]))
+            continue
+
+        listener = _listener_body(tokens, 'DOMContentLoaded')
+        if listener is not None:
+            statement['container'] = True
+            for entry_tokens in split_statements(listener):
+                entry_sig = _significant(entry_tokens)
+                if entry_sig:
+                    entries.append({'tokens': entry_tokens, 'sig': entry_sig,
+                                    'references': _references(entry_sig),
+                                    'local': _declared_name(entry_sig)})
+
+    # Transitive dependencies on top-level declarations
+    def dependencies(references):
+        found = set()
+        stack = [name for name in references if name in units]
+        while stack:
+            name = stack.pop()
+            if name in found:
+                continue
+            found.add(name)
+            stack.extend(ref for ref in units[name]['references'] if ref in units and ref not in found)
+        return found
+
+    local_names = {entry['local'] for entry in entries if entry['local']}
+    for entry in entries:
+        entry['dependencies'] = dependencies(entry['references'])
+        sig = entry['sig']
+        if entry['local'] or entry['references'] & (local_names - {entry['local']}):
+            # Locals of the listener and the statements that use them stay together
+            entry['chunk'] = 'critical'
+        elif sig[0].text in ('setTimeout', 'requestIdleCallback'):
+            entry['chunk'] = 'idle'
+        elif _mutates_dom(_immediate_tokens(sig), units, set()):
+            entry['chunk'] = 'critical'
+        else:
+            entry['chunk'] = 'interaction'
+
+    for statement in statements:
+        if not statement['name'] and not statement['container']:
+            statement['dependencies'] = dependencies(_references(statement['sig']))
+
+    return units, statements, entries
+
+
+def plan_chunks(units, statements, entries):
+    """
+    Assign every declaration to the first chunk that needs it
+
+    Returns:
+        dict: chunk name -> {'units': [...], 'entries': [...], 'requires': [...]}
+    """
+    owner = {}
+    chunks = {name: {'units': [], 'entries': [], 'requires': set()} for name in CHUNK_ORDER}
+
+    # Top-level code outside the listeners runs as soon as the script does
+    for statement in statements:
+        if not statement['name'] and not statement['container']:
+            for name in statement['dependencies']:
+                owner.setdefault(name, 'critical')
+
+    for chunk_name in CHUNK_ORDER:
+        for entry in entries:
+            if entry['chunk'] != chunk_name:
+                continue
+            chunks[chunk_name]['entries'].append(entry)
+            for name in entry['dependencies']:
+                owner.setdefault(name, chunk_name)
+                if owner[name] not in ('critical', chunk_name):
+                    chunks[chunk_name]['requires'].add(owner[name])
+
+    # Declarations nobody calls keep their place in the critical chunk (they may be used by pages)
+    for name in units:
+        owner.setdefault(name, 'critical')
+    for statement in statements:
+        if statement['name']:
+            chunks[owner[statement['name']]]['units'].append(statement)
+
+    # A unit's own dependencies must already be loaded when its chunk runs
+    for name, chunk_name in owner.items():
+        for reference in units[name]['references']:
+            if reference in owner and owner[reference] not in ('critical', chunk_name) and \
+                    CHUNK_ORDER.index(owner[reference]) < CHUNK_ORDER.index(chunk_name):
+                chunks[chunk_name]['requires'].add(owner[reference])
+
+    for chunk in chunks.values():
+        chunk['requires'] = sorted(chunk['requires'], key=CHUNK_ORDER.index)
+    return chunks
+
+
+def _statement_source(tokens):
+    """Minified statement, terminated so that the next statement cannot continue it"""
+    code = minify_tokens(tokens)
+    return code if code.endswith(';') else code + ';'
+
+
+def _chunk_source(chunk):
+    """Minified source of a lazy chunk: its declarations, then its entries in a function scope"""
+    parts = [_statement_source(unit['tokens']) for unit in chunk['units']]
+    if chunk['entries']:
+        body = ''.join(_statement_source(entry['tokens']) for entry in chunk['entries'])
+        parts.append(f"(function(){{{body}}})();")
+    return '\n'.join(parts) + '\n'
+
+
+def split_script(script_path, rewrite_pages=False, site_dir=None, scan=None):
+    """
+    Split a script into a critical chunk and lazily loaded chunks next to it
+
+    Args:
+        script_path (str): Path of the script to split (e.g. scripts.js)
+        rewrite_pages (bool): Point pages at the critical chunk where that is safe
+        site_dir (str): Website root for page rewriting (default: the script's directory)
+        scan (SiteScan): File listing of site_dir; chunks are added to it and removed chunks dropped
+
+    Returns:
+        dict: Chunk file names, triggers and byte counts
+    """
+    with open(script_path, 'r', encoding='utf-8') as f:
+        source = f.read()
+
+    units, statements, entries = analyze_script(source)
+    chunks = plan_chunks(units, statements, entries)
+
+    directory = os.path.dirname(os.path.abspath(script_path))
+    stem = os.path.splitext(os.path.basename(script_path))[0]
+
+    def chunk_file_name(chunk_name, content):
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:10]
+        return f"{stem}.{chunk_name}.{digest}.min.js"
+
+    # Lazy chunks first: the critical chunk's loader needs their hashed file names
+    manifest = {}
+    outputs = {}
+    for chunk_name in CHUNK_ORDER[1:]:
+        chunk = chunks[chunk_name]
+        if not chunk['units'] and not chunk['entries']:
+            continue
+        content = _chunk_source(chunk)
+        file_name = chunk_file_name(chunk_name, content)
+        outputs[chunk_name] = (file_name, content)
+        manifest[chunk_name] = {'src': file_name, 'trigger': chunk_name,
+                                'requires': [name for name in chunk['requires'] if name in CHUNK_ORDER[1:]]}
+
+    critical = chunks['critical']
+    other_statements = [statement for statement in statements
+                        if not statement['name'] and not statement['container']]
+    parts = [_statement_source(unit['tokens']) for unit in critical['units']]
+    parts.extend(_statement_source(statement['tokens']) for statement in other_statements)
+    if manifest:
+        parts.append(minify_tokens(tokenize(LOADER_TEMPLATE % json.dumps(manifest, sort_keys=True))))
+    if critical['entries']:
+        body = ''.join(_statement_source(entry['tokens']) for entry in critical['entries'])
+        parts.append(f"document.addEventListener('DOMContentLoaded',function(){{{body}}});")
+    critical_content = '\n'.join(parts) + '\n'
+    critical_name = chunk_file_name('critical', critical_content)
+    outputs['critical'] = (critical_name, critical_content)
+
+    # Remove chunks of earlier runs
+    current = {file_name for file_name, _ in outputs.values()}
+    old_chunk = re.compile(re.escape(stem) + CHUNK_FILE % '|'.join(CHUNK_ORDER) + '$')
+    for file_name in os.listdir(directory):
+        if old_chunk.match(file_name) and file_name not in current:
+            os.remove(os.path.join(directory, file_name))
+            if scan is not None:
+                scan.remove(os.path.join(directory, file_name))
+
+    for file_name, content in outputs.values():
+        with atomic_open(os.path.join(directory, file_name), 'w', encoding='utf-8') as f:
+            f.write(content)
+        if scan is not None:
+            scan.add(os.path.join(directory, file_name))
+
+    original_bytes = len(source.encode('utf-8'))
+    summary = {'source': script_path, 'original_bytes': original_bytes, 'chunks': {}}
+    print(f"\nSplitting {script_path} ({original_bytes:,} bytes)\n")
+    for chunk_name in CHUNK_ORDER:
+        if chunk_name not in outputs:
+            continue
+        file_name, content = outputs[chunk_name]
+        size = len(content.encode('utf-8'))
+        names = [unit['name'] for unit in chunks[chunk_name]['units']]
+        summary['chunks'][chunk_name] = {'file': file_name, 'bytes': size, 'declarations': names,
+                                         'requires': chunks[chunk_name]['requires']}
+        print(f"{chunk_name:<12} {file_name:<40} {size:>8,} bytes  {', '.join(names) or '-'}")
+
+    # The critical chunk is the only one parsed before the page is interactive; lazy chunks wait for
+    # an interaction or idle time
+    critical_bytes = summary['chunks']['critical']['bytes']
+    saved = original_bytes - critical_bytes
+    summary['initial_parse_bytes'] = critical_bytes
+    summary['initial_parse_bytes_saved'] = saved
+    print(f"\nParsed on initial load: {critical_bytes:,} bytes instead of {original_bytes:,} "
+          f"({saved:,} bytes, {saved / original_bytes * 100:.1f}% less main-thread parsing)")
+
+    if rewrite_pages:
+        moved = {name for chunk_name in CHUNK_ORDER[1:] for name in
+                 (unit['name'] for unit in chunks[chunk_name]['units'])}
+        summary['pages'] = rewrite_script_references(site_dir or directory, os.path.basename(script_path),
+                                                     critical_name, moved, scan)
+    return summary
+
+
+def rewrite_script_references(site_dir, script_name, critical_name, moved_names, scan=None):
+    """
+    Point <script src> and preload links at the critical chunk
+
+    References to the full script and to the critical chunk of an earlier
+    run are updated. Pages whose inline scripts use a declaration that moved
+    to a lazy chunk load the full script.
+
+    Returns:
+        list: Pages that were rewritten
+    """
+    rewritten = []
+    stem = os.path.splitext(script_name)[0]
+    reference = re.compile(r'((?:src|href)=["\'](?:\./|/)?)(?:' + re.escape(script_name) + '|' +
+                           re.escape(stem) + CHUNK_FILE % 'critical' + r')(["\'?#])')
+    for page in find_pages(site_dir, scan):
+        with open(page, 'r', encoding='utf-8') as f:
+            content = f.read()
+        if not reference.search(content):
+            continue
+
+        inline = ' '.join(re.findall(r'<script(?![^>]*\bsrc=)[^>]*>(.*?)</script>', content, flags=re.DOTALL))
+        used = {token.text for token in tokenize(inline) if token.kind == 'name'} & moved_names
+        target = script_name if used else critical_name
+        if used:
+            print(f"Keeping {script_name} in {page} (inline scripts use {', '.join(sorted(used))})")
+
+        updated = reference.sub(lambda match: match.group(1) + target + match.group(2), content)
+        if updated == content:
+            continue
+        with atomic_open(page, 'w', encoding='utf-8') as f:
+            f.write(updated)
+        print(f"Updated {page} to load {target}")
+        rewritten.append(page)
+    return rewritten
+
+
+if __name__ == "__main__":
+    print("JavaScript Code Splitter")
+    print("========================")
+
+    path = input("Enter script path (press Enter for scripts.js): ") or "scripts.js"
+
+    if os.path.isfile(path):
+        rewrite = input("Point pages at the critical chunk where safe? (y/n, default: n): ").lower() == 'y'
+        split_script(path, rewrite_pages=rewrite)
+    else:
+        print(f"Error: '{path}' is not a file.")
@@ -0,0 +1,314 @@
+# Stage Scheduler Script
+# This script only requires Python
+
+import os
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+"""
+Runs the steps of an optimization as a graph of stages instead of one
+after another.
+
+Every stage declares the resources it reads and writes, such as 'images',
+'webp' or 'pages'. The graph comes from the order of the stages and those
+declarations: a stage waits for an earlier stage when one writes something
+the other reads or writes. Stages that share nothing run at the same time
+on a pool of threads, and the results are the same as running the list in
+order.
+
+A stage can also stream one of its inputs. It then starts as soon as the
+stage writing that resource has started and receives the items (e.g. each
+WebP file) as they are written, instead of waiting for the whole step.
+
+While the stages run, their console output is prefixed with the stage name.
+At the end the schedule is printed with the critical path: the chain of
+stages, each waiting for the one before it, that ended last and so set the
+total time of the run.
+"""
+
+# End of a stream of items
+_END = object()
+
+
+class Stage:
+    """
+    One step of a pipeline
+
+    Args:
+        name (str): Name in the log, the schedule and the build history
+        run (callable): Does the work. It is called with emit= when a later stage streams one of
+                        its outputs, and with items= when it streams an input itself
+        inputs (tuple): Resources the stage reads, e.g. ('pages', 'images')
+        outputs (tuple): Resources the stage writes
+        stream (str): Input whose items are handed over one at a time as they are written
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), stream=None):
+        self.name = name
+        self.run = run
+        self.inputs = set(inputs)
+        self.outputs = set(outputs)
+        self.stream = stream
+
+
+def stage_dependencies(stages):
+    """
+    Work out which earlier stages each stage has to wait for
+
+    A stage depends on an earlier one that writes a resource it reads or
+    writes, or that reads a resource it writes. A dependency that only
+    concerns the stage's streamed input is a streaming one.
+
+    Returns:
+        dict: Stage name -> list of (earlier stage name, streamed) tuples
+    """
+    dependencies = {}
+    for index, stage in enumerate(stages):
+        if stage.name in dependencies:
+            raise ValueError(f"Duplicate stage name: {stage.name}")
+        if stage.stream and stage.stream not in stage.inputs:
+            raise ValueError(f"{stage.name} streams {stage.stream}, which is not one of its inputs")
+
+        dependencies[stage.name] = []
+        for earlier in stages[:index]:
+            shared = (earlier.outputs & (stage.inputs | stage.outputs)) | (earlier.inputs & stage.outputs)
+            if shared:
+                dependencies[stage.name].append((earlier.name, shared == {stage.stream}))
+
+        # Only the last stage writing the streamed resource feeds the stream; earlier ones are waited for
+        streamed = [index for index, (_, is_streamed) in enumerate(dependencies[stage.name]) if is_streamed]
+        if stage.stream and not streamed:
+            raise ValueError(f"No earlier stage writes {stage.stream}, which {stage.name} streams")
+        for index in streamed[:-1]:
+            dependencies[stage.name][index] = (dependencies[stage.name][index][0], False)
+    return dependencies
+
+
+class _StageOutput:
+    """
+    Console stream that prefixes each line printed by a stage with its name
+
+    Lines are collected per thread, so the output of stages running at the
+    same time is interleaved line by line and never within a line. Blank lines
+    of stages are dropped.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def set_stage(self, name):
+        self._local.stage = name
+        self._local.line = ''
+
+    def write(self, text):
+        stage = getattr(self._local, 'stage', None)
+        if stage is None:
+            with self._lock:
+                return self.stream.write(text)
+
+        self._local.line += text
+        *lines, self._local.line = self._local.line.split('\n')
+        lines = [line for line in lines if line.strip()]
+        if lines:
+            with self._lock:
+                self.stream.write(''.join(f"[{stage}] {line}\n" for line in lines))
+        return len(text)
+
+    def flush_stage(self):
+        """Write what is left of the current stage's last line"""
+        if getattr(self._local, 'line', '').strip():
+            self.write('\n')
+        self._local.stage = None
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def run_stages(stages, workers=None):
+    """
+    Run the stages of a pipeline, each as soon as the stages it depends on allow
+
+    A stage that raises is reported as failed and the stages depending on it
+    are skipped; independent stages still run.
+
+    Args:
+        stages (list): Stage objects in the order a sequential run would use
+        workers (int): Stages that can run at the same time (default: one per CPU). Streaming stages
+                       mostly wait for their items and are not counted
+
+    Returns:
+        dict: Stage name -> result dict with status ('done', 'failed' or 'skipped'),
+              start and end time, seconds and error
+    """
+    workers = workers or os.cpu_count() or 1
+    dependencies = stage_dependencies(stages)
+    results = {stage.name: {'stage': stage.name, 'status': 'pending', 'start': None, 'end': None,
+                            'seconds': 0.0, 'error': None} for stage in stages}
+
+    # Queues of the streaming stages, fed by the stage writing the streamed resource
+    consumers = {}
+    streams = {}
+    for stage in stages:
+        for name, streamed in dependencies[stage.name]:
+            if streamed:
+                streams[stage.name] = queue.Queue()
+                consumers.setdefault(name, []).append(streams[stage.name])
+
+    output = _StageOutput(sys.stdout)
+
+    def execute(stage):
+        output.set_stage(stage.name)
+        results[stage.name]['start'] = time.time()
+        feeds = consumers.get(stage.name, [])
+        kwargs = {}
+        if feeds:
+            def emit(item):
+                for feed in feeds:
+                    feed.put(item)
+            kwargs['emit'] = emit
+        if stage.name in streams:
+            kwargs['items'] = iter(streams[stage.name].get, _END)
+        try:
+            stage.run(**kwargs)
+        finally:
+            # Streaming stages finish with whatever was written, even if this stage failed
+            for feed in feeds:
+                feed.put(_END)
+            results[stage.name]['end'] = time.time()
+            output.flush_stage()
+
+    def state(stage):
+        statuses = [(results[name]['status'], streamed) for name, streamed in dependencies[stage.name]]
+        if any(status in ('failed', 'skipped') for status, _ in statuses):
+            return 'skip'
+        if all(status == 'done' or (streamed and status == 'running') for status, streamed in statuses):
+            return 'ready'
+        return 'waiting'
+
+    def busy():
+        return sum(1 for stage in running.values() if stage.name not in streams)
+
+    pending = list(stages)
+    running = {}
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=workers + len(streams)) as executor:
+            try:
+                while pending or running:
+                    # Skipping a stage can make later ones skip too, so check until nothing changes
+                    changed = True
+                    while changed:
+                        changed = False
+                        for stage in list(pending):
+                            ready = state(stage)
+                            if ready == 'skip':
+                                results[stage.name]['status'] = 'skipped'
+                                pending.remove(stage)
+                                print(f"Skipping {stage.name} (a stage it depends on did not complete)")
+                                changed = True
+                            elif ready == 'ready' and (stage.name in streams or busy() < workers):
+                                results[stage.name]['status'] = 'running'
+                                running[executor.submit(execute, stage)] = stage
+                                pending.remove(stage)
+                                changed = True
+
+                    if not running:
+                        break
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        stage = running.pop(future)
+                        result = results[stage.name]
+                        result['seconds'] = result['end'] - result['start']
+                        try:
+                            future.result()
+                            result['status'] = 'done'
+                            print(f"✓ {stage.name} finished in {result['seconds']:.1f}s")
+                        except Exception as e:
+                            result['status'] = 'failed'
+                            result['error'] = str(e)
+                            print(f"× {stage.name} failed: {e}")
+            except KeyboardInterrupt:
+                # Threads cannot be stopped; no new stages are started
+                print(f"\nWaiting for the running stages to finish: {', '.join(stage.name for stage in running.values())}")
+                raise
+    finally:
+        sys.stdout = output.stream
+    return results
+
+
+def critical_path(stages, results):
+    """
+    Find the chain of stages that set the total time of a run
+
+    Starting from the stage that ended last, each step goes back to the
+    dependency that ended last, which is the one the stage was waiting for.
+
+    Returns:
+        list: (stage name, seconds it added to the run) tuples, first stage first
+    """
+    dependencies = stage_dependencies(stages)
+    ended = {name: result for name, result in results.items() if result['end'] is not None}
+    if not ended:
+        return []
+
+    run_start = min(result['start'] for result in ended.values())
+    path = []
+    name = max(ended, key=lambda stage_name: ended[stage_name]['end'])
+    while name:
+        previous = [dependency for dependency, _ in dependencies[name] if dependency in ended]
+        previous = max(previous, key=lambda stage_name: ended[stage_name]['end'], default=None)
+        path.append((name, ended[name]['end'] - (ended[previous]['end'] if previous else run_start)))
+        name = previous
+    return path[::-1]
+
+
+def print_schedule(stages, results):
+    """
+    Print when each stage ran and the critical path of the run
+
+    Returns:
+        list: The critical path (see critical_path)
+    """
+    path = critical_path(stages, results)
+    on_path = {name for name, _ in path}
+    started = [result['start'] for result in results.values() if result['start'] is not None]
+    run_start = min(started) if started else time.time()
+    wall = max((result['end'] for result in results.values() if result['end'] is not None), default=run_start) - run_start
+
+    print(f"\n{'Stage':<16}  {'Start':>7}  {'Time':>7}  Status")
+    for stage in stages:
+        result = results[stage.name]
+        marker = ' *' if stage.name in on_path else ''
+        if result['start'] is None:
+            print(f"{stage.name:<16}  {'-':>7}  {'-':>7}  {result['status']}")
+        else:
+            print(f"{stage.name:<16}  {result['start'] - run_start:>6.1f}s  {result['seconds']:>6.1f}s  "
+                  f"{result['status']}{marker}")
+
+    busy = sum(result['seconds'] for result in results.values())
+    print(f"\nWall time {wall:.1f}s for {busy:.1f}s of stage time ({busy / wall if wall else 1:.1f}x overlap)")
+    if path:
+        print("Critical path (*): " + " → ".join(f"{name} +{seconds:.1f}s" for name, seconds in path))
+    return path
+
+
+if __name__ == "__main__":
+    from convert_to_webp import full_optimization_stages
+
+    print("Stage Scheduler")
+    print("===============")
+    print("\nStages of the full optimization and what each waits for:\n")
+
+    stages = full_optimization_stages(".", quality=85, site_url="https://www.alfax10.com")
+    for name, waits_for in stage_dependencies(stages).items():
+        waits = ', '.join(f"{dependency} (streamed)" if streamed else dependency for dependency, streamed in waits_for)
+        print(f"{name:<16} {waits or '-'}")
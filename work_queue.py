@@ -0,0 +1,375 @@
+# Distributed Work Queue Script
+# This script requires Python, Pillow and NumPy (brotli output needs: pip install brotli)
+# Install with: pip install Pillow numpy
+
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from contextlib import closing
+
+from audit_performance import size_summary, write_json_report
+from batch_optimize import find_sites, plan_site_tasks, run_task
+from convert_to_webp import precompress_paths
+from site_scanner import scan_site
+
+"""
+Spreads the optimization of large sites over many worker processes on any
+number of machines through a durable queue in an SQLite file.
+
+A coordinator scans each site and enqueues its tasks (the same tasks as
+batch_optimize.py: one per image, one per stylesheet or script, groups of
+pages, and a final precompression task per site). Workers claim one task
+at a time with a lease, renew the lease with a heartbeat while they work,
+and write the result back. A task whose lease runs out, because its worker
+crashed or its host went away, is claimed again by another worker; failed
+tasks are retried up to a limit and then marked as failed. A site's
+precompression task is only handed out once all its other tasks are done.
+
+The queue file and the sites go on storage every host can reach. Site
+paths are stored relative to the queue file, so hosts may mount the share
+at different places. The database uses SQLite's rollback journal rather
+than WAL, since WAL does not work across hosts on network filesystems.
+
+    python work_queue.py enqueue /shared/queue.sqlite /shared/sites/
+    python work_queue.py work /shared/queue.sqlite --processes 8   # on each host
+    python work_queue.py status /shared/queue.sqlite --report queue_report.json
+
+Several worker processes on one machine sharing the queue file stand in
+for a cluster when testing.
+"""
+
+# Seconds a claimed task stays reserved without a heartbeat
+DEFAULT_LEASE_SECONDS = 120
+
+# Attempts per task before it is marked as failed
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Seconds an idle worker waits before looking for claimable tasks again
+POLL_SECONDS = 2.0
+
+# Tasks of a later phase wait until every earlier-phase task of the site is done
+PHASES = {'webp': 0, 'minify': 0, 'minify-html': 0, 'precompress': 1}
+
+
+def connect(queue_path):
+    """Open the queue database, creating its tables on first use"""
+    db = sqlite3.connect(queue_path, timeout=60, isolation_level=None)
+    db.row_factory = sqlite3.Row
+    db.execute('PRAGMA journal_mode=DELETE')
+    db.execute('CREATE TABLE IF NOT EXISTS tasks ('
+               'id INTEGER PRIMARY KEY, site TEXT NOT NULL, stage TEXT NOT NULL, paths TEXT, '
+               'quality INTEGER NOT NULL, phase INTEGER NOT NULL, position INTEGER NOT NULL, '
+               'status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, '
+               'worker TEXT, lease_expires REAL, result TEXT, error TEXT, '
+               'created REAL NOT NULL, finished REAL)')
+    db.execute('CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, phase, position)')
+    return db
+
+
+def _site_path(queue_path, site):
+    """Resolve a site path stored relative to the queue file"""
+    return os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(queue_path)), site))
+
+
+def enqueue_sites(queue_path, site_dirs, quality=85):
+    """
+    Scan sites and add their tasks to the queue
+
+    Args:
+        queue_path (str): Queue database file on storage shared by all workers
+        site_dirs (list): Website root directories
+        quality (int): Quality of WebP images (0-100)
+
+    Returns:
+        int: Number of tasks added
+    """
+    queue_dir = os.path.dirname(os.path.abspath(queue_path))
+    added = 0
+    with closing(connect(queue_path)) as db:
+        for site_dir in site_dirs:
+            site = os.path.relpath(os.path.abspath(site_dir), queue_dir)
+            tasks = [(stage, [os.path.relpath(path, site_dir) for path in paths])
+                     for stage, paths in plan_site_tasks(site_dir, scan_site(site_dir))]
+            # Precompression covers whatever text files the site has once the other tasks are done
+            tasks.append(('precompress', None))
+
+            now = time.time()
+            db.execute('BEGIN IMMEDIATE')
+            db.executemany('INSERT INTO tasks (site, stage, paths, quality, phase, position, status, created) '
+                           'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                           [(site, stage, json.dumps(paths) if paths is not None else None, quality,
+                             PHASES[stage], position, 'pending', now)
+                            for position, (stage, paths) in enumerate(tasks)])
+            db.execute('COMMIT')
+            print(f"Queued {len(tasks)} tasks for {site_dir}")
+            added += len(tasks)
+    return added
+
+
+def claim_task(db, worker, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Lease the next claimable task
+
+    Tasks are handed out by their position within their site, so the sites
+    of a queue progress side by side. Expired leases are claimable again.
+
+    Returns:
+        sqlite3.Row: The claimed task, or None if nothing is claimable right now
+    """
+    now = time.time()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        while True:
+            task = db.execute(
+                "SELECT * FROM tasks t WHERE (t.status = 'pending' OR (t.status = 'leased' AND t.lease_expires < ?)) "
+                "AND NOT EXISTS (SELECT 1 FROM tasks d WHERE d.site = t.site AND d.phase < t.phase "
+                "AND d.status IN ('pending', 'leased')) "
+                "ORDER BY t.position, t.id LIMIT 1", (now,)).fetchone()
+            if task is None:
+                db.execute('COMMIT')
+                return None
+            if task['attempts'] >= max_attempts:
+                # Its last worker lost the lease
+                db.execute("UPDATE tasks SET status = 'failed', finished = ?, "
+                           "error = COALESCE(error, 'lease expired') WHERE id = ?", (now, task['id']))
+                continue
+            db.execute("UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                       "WHERE id = ?", (worker, now + lease_seconds, task['id']))
+            db.execute('COMMIT')
+            return db.execute('SELECT * FROM tasks WHERE id = ?', (task['id'],)).fetchone()
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+
+
+def _heartbeat(queue_path, task_id, worker, lease_seconds, stop):
+    """Extend a task's lease until stop is set"""
+    with closing(connect(queue_path)) as db:
+        while not stop.wait(lease_seconds / 3):
+            db.execute('UPDATE tasks SET lease_expires = ? WHERE id = ? AND worker = ? AND status = ?',
+                       (time.time() + lease_seconds, task_id, worker, 'leased'))
+
+
+def execute_task(queue_path, task, scans):
+    """
+    Run a claimed task
+
+    Args:
+        queue_path (str): Queue database file
+        task (sqlite3.Row): Claimed task
+        scans (dict): Site scans kept by this worker between tasks
+
+    Returns:
+        dict: Result of batch_optimize.run_task()
+    """
+    site_dir = _site_path(queue_path, task['site'])
+    if task['paths'] is None:
+        # The precompression task covers the text files the site has by now, minified pages included
+        scan = scan_site(site_dir)
+        if task['stage'] == 'precompress':
+            scan = scan.subset(precompress_paths(site_dir, scan))
+    else:
+        paths = [os.path.join(site_dir, path) for path in json.loads(task['paths'])]
+        scan = scans[site_dir].subset(paths) if site_dir in scans else None
+        # Rescan when the kept listing predates files this task needs
+        if scan is None or len(scan) < len(paths):
+            scans[site_dir] = scan_site(site_dir)
+            scan = scans[site_dir].subset(paths)
+    return run_task(site_dir, task['stage'], scan, task['quality'])
+
+
+def run_worker(queue_path, worker=None, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Claim and run tasks until the queue is drained
+
+    Args:
+        queue_path (str): Queue database file
+        worker (str): Worker name recorded on its tasks (default: host:pid)
+        lease_seconds (int): Lease length; the heartbeat renews it every third of that
+        max_attempts (int): Attempts per task before it is marked as failed
+
+    Returns:
+        int: Number of tasks this worker completed
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    scans = {}
+    completed = 0
+
+    with closing(connect(queue_path)) as db:
+        while True:
+            task = claim_task(db, worker, lease_seconds, max_attempts)
+            if task is None:
+                # Other workers may still fail or lose their tasks, which then become claimable
+                busy = db.execute("SELECT COUNT(*) FROM tasks WHERE status IN ('pending', 'leased')").fetchone()[0]
+                if not busy:
+                    break
+                time.sleep(POLL_SECONDS)
+                continue
+
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=_heartbeat, daemon=True,
+                                         args=(queue_path, task['id'], worker, lease_seconds, stop))
+            heartbeat.start()
+            try:
+                result = execute_task(queue_path, task, scans)
+            except Exception as e:
+                result = {'report': [], 'outputs': [], 'errors': [f"{task['stage']} failed: {e}"], 'seconds': 0.0}
+            finally:
+                stop.set()
+                heartbeat.join()
+
+            # A retry only helps while attempts are left; the last error is kept either way
+            if not result['errors']:
+                status = 'done'
+            elif task['attempts'] < max_attempts:
+                status = 'pending'
+            else:
+                status = 'failed'
+            updated = db.execute('UPDATE tasks SET status = ?, result = ?, error = ?, finished = ? '
+                                 'WHERE id = ? AND worker = ? AND status = ?',
+                                 (status, json.dumps(result), '; '.join(result['errors']) or None,
+                                  time.time() if status != 'pending' else None, task['id'], worker, 'leased'))
+            if not updated.rowcount:
+                print(f"{worker}: lease on task {task['id']} was lost, result discarded")
+                continue
+
+            label = f"{task['site']} {task['stage']} #{task['id']}"
+            if status == 'done':
+                completed += 1
+                print(f"✓ {worker}: {label} ({result['seconds']:.1f}s)")
+            else:
+                print(f"× {worker}: {label} {'will be retried' if status == 'pending' else 'failed'}: "
+                      f"{result['errors'][0]}")
+    return completed
+
+
+def run_workers(queue_path, processes=None, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Run several worker processes on this machine against the same queue
+
+    Returns:
+        int: Number of worker processes that exited with an error
+    """
+    processes = processes or os.cpu_count() or 1
+    print(f"Starting {processes} workers on {socket.gethostname()}...")
+    workers = [multiprocessing.Process(target=run_worker, args=(queue_path, None, lease_seconds, max_attempts))
+               for _ in range(processes)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    return sum(1 for process in workers if process.exitcode)
+
+
+def queue_report(queue_path):
+    """
+    Summarize the queue: task counts by status and byte totals per site
+
+    Returns:
+        dict: Report with a section per site and overall totals
+    """
+    sites = {}
+    with closing(connect(queue_path)) as db:
+        for task in db.execute('SELECT * FROM tasks ORDER BY site, id'):
+            site = sites.setdefault(task['site'], {'site': _site_path(queue_path, task['site']), 'tasks': {},
+                                                   'attempts': 0, 'worker_seconds': 0.0, 'stages': {},
+                                                   'errors': []})
+            site['tasks'][task['status']] = site['tasks'].get(task['status'], 0) + 1
+            site['attempts'] += task['attempts']
+            if task['status'] == 'failed':
+                site['errors'].append(f"{task['stage']} #{task['id']}: {task['error']}")
+            if task['status'] != 'done' or not task['result']:
+                continue
+            result = json.loads(task['result'])
+            site['worker_seconds'] += result['seconds']
+            for entry in result['report']:
+                totals = site['stages'].setdefault(entry['stage'], {'files': 0, 'bytes_before': 0, 'bytes_after': 0})
+                totals['files'] += 1
+                totals['bytes_before'] += entry['bytes_before']
+                totals['bytes_after'] += entry['bytes_after']
+
+    for site in sites.values():
+        site['worker_seconds'] = round(site['worker_seconds'], 2)
+        for totals in site['stages'].values():
+            totals.update(size_summary(totals['bytes_before'], totals['bytes_after']))
+        # Precompressed copies sit next to their sources, so they are not counted in the site total
+        optimized = [totals for stage, totals in site['stages'].items() if stage not in ('gzip', 'br')]
+        site.update(size_summary(sum(totals['bytes_before'] for totals in optimized),
+                                 sum(totals['bytes_after'] for totals in optimized)))
+
+    counts = {}
+    for site in sites.values():
+        for status, count in site['tasks'].items():
+            counts[status] = counts.get(status, 0) + count
+    return {
+        'queue': os.path.abspath(queue_path),
+        'generated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'tasks': counts,
+        **size_summary(sum(site['bytes_before'] for site in sites.values()),
+                       sum(site['bytes_after'] for site in sites.values())),
+        'sites': list(sites.values()),
+    }
+
+
+def print_status(report):
+    """Print the task counts and savings of a queue report"""
+    counts = report['tasks']
+    print(f"Queue {report['queue']}: " + ', '.join(f"{counts.get(status, 0)} {status}"
+                                                   for status in ('pending', 'leased', 'done', 'failed')))
+    for site in report['sites']:
+        done = site['tasks'].get('done', 0)
+        total = sum(site['tasks'].values())
+        print(f"  {site['site']}: {done}/{total} tasks done, {site['bytes_before']:,} bytes → "
+              f"{site['bytes_after']:,} bytes ({site['reduction_percent']}% reduction), "
+              f"{site['worker_seconds']:.1f}s of worker time")
+        for error in site['errors']:
+            print(f"    × {error}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Distribute site optimization over workers on many machines")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = commands.add_parser('enqueue', help="Scan sites and queue their tasks")
+    enqueue_parser.add_argument('queue', help="Queue database file on shared storage")
+    enqueue_parser.add_argument('paths', nargs='+',
+                                help="Site directories, or parent directories whose subdirectories are sites")
+    enqueue_parser.add_argument('--quality', type=int, default=85, help="WebP quality (0-100, default: 85)")
+
+    work_parser = commands.add_parser('work', help="Claim and run tasks until the queue is drained")
+    work_parser.add_argument('queue', help="Queue database file on shared storage")
+    work_parser.add_argument('--processes', type=int, help="Worker processes on this machine (default: one per CPU)")
+    work_parser.add_argument('--lease', type=int, default=DEFAULT_LEASE_SECONDS,
+                             help=f"Lease length in seconds (default: {DEFAULT_LEASE_SECONDS})")
+    work_parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                             help=f"Attempts per task before it fails (default: {DEFAULT_MAX_ATTEMPTS})")
+
+    status_parser = commands.add_parser('status', help="Show progress and savings")
+    status_parser.add_argument('queue', help="Queue database file")
+    status_parser.add_argument('--report', help="Also write the summary as a JSON report")
+    args = arg_parser.parse_args()
+
+    if args.command != 'enqueue' and not os.path.exists(args.queue):
+        print(f"Error: queue '{args.queue}' does not exist.")
+        sys.exit(2)
+
+    if args.command == 'enqueue':
+        site_dirs = find_sites(args.paths)
+        if not site_dirs:
+            print("Error: no website directories found.")
+            sys.exit(2)
+        print(f"{enqueue_sites(args.queue, site_dirs, args.quality)} tasks queued in {args.queue}")
+    elif args.command == 'work':
+        sys.exit(1 if run_workers(args.queue, args.processes, args.lease, args.max_attempts) else 0)
+    else:
+        summary = queue_report(args.queue)
+        print_status(summary)
+        if args.report:
+            print(f"Report written to: {write_json_report(args.report, summary)}")
+        sys.exit(1 if summary['tasks'].get('failed') else 0)